@@ -0,0 +1,11 @@
+// line/reservationLink.js
+// 予約フォームの URL に、お客様の LINE のIDを署名付きで付ける (?uid=<ID>.<署名>)。
+// 予約フォーム (yoyaku/validation.py の verify_line_user_id) は、同じチャネルシークレットで署名を確かめたIDだけを使います。
+const crypto = require('crypto');
+
+module.exports = (formUrl, userId, channelSecret = process.env.LINE_CHANNEL_SECRET) => {
+  const signature = crypto.createHmac('sha256', channelSecret).update(userId).digest('hex');
+  const url = new URL(formUrl);
+  url.searchParams.set('uid', `${userId}.${signature}`);
+  return url.toString();
+};
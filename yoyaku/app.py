@@ -1,19 +1,32 @@
 # app.py (フルバージョン - .env対応、日本語コメント付き)
 
-from flask import Flask, render_template, request, flash, redirect, url_for, session
+from flask import Flask, Blueprint, render_template, request, flash, redirect, url_for, session, Response, stream_with_context, jsonify, g, abort
 import datetime
 import os # 「オペレーティングシステム」とやり取りするための基本的な機能を提供します (環境変数を読むのに使います)
 import json
+import hashlib
+import hmac
+import threading
+import time
 import holidays
 
-# Google Calendar API関連のインポート
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-
 # python-dotenvライブラリから load_dotenv という機能を読み込みます
 from dotenv import load_dotenv
 
+# 予約フォームの入力チェック (validation.py)
+from validation import ReservationRejected
+
+# 予約システムの共通部品 (core フォルダー): カレンダーの読み書き、空席計算、席のルールなど
+from core import CALENDAR_ERRORS, CircuitBreaker, CircuitOpenError, calculate_vacancy, fetch_events
+from core.jst_time import epoch_minute, jst_today, jst_epoch_minute, jst_datetime, rfc3339_utc
+from core.seat_policy import COUNTER, TABLE, AVAILABLE, FULL, check_availability, usage_for
+
+# お店ごとの設定 (tenants.py): カレンダー・席数・営業時間・定休日など
+from tenants import load_tenants
+
+# アクセスの記録 (traffic_log.py): 負荷試験 (replay_traffic.py) で送り直すため
+from traffic_log import TrafficRecorder
+
 # load_dotenv() を呼び出すことで、同じフォルダにある .env ファイルを探し、
 # その中に書かれている「変数名=値」の情報を「環境変数」としてプログラムが使えるように読み込みます。
 # Flaskアプリの本体 (app = Flask(...)) を作るよりも前に実行するのが一般的です。
@@ -23,16 +36,8 @@ app = Flask(__name__)
 
 # --- 設定値を .env ファイルから読み込む ---
 # os.getenv('環境変数名') で、指定した名前の環境変数の値を取得します。
-CALENDAR_ID = os.getenv('CALENDAR_ID')
-# Googleカレンダーのどのカレンダーを使うかを指定するIDです。
-
-SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE')
-# Googleサービスアカウントの秘密鍵ファイル（JSON形式）の名前（またはパス）です。
-
-# os.getenv() で取得できる値は「文字列」なので、数値として使いたい場合は int() で変換します。
-# もし .env に変数がなかった場合のデフォルト値も指定できます (例: '11')。
-TOTAL_COUNTER_SEATS = int(os.getenv('TOTAL_COUNTER_SEATS', '11')) # カウンターの総席数
-TOTAL_TABLE_UNITS = int(os.getenv('TOTAL_TABLE_UNITS', '2'))   # テーブルの総卓数
+# お店ごとの設定 (CALENDAR_ID, SERVICE_ACCOUNT_FILE, TOTAL_COUNTER_SEATS, SHOP_HOLIDAYS など) は
+# tenants.py で店舗ごとに読み込みます (1店舗だけの場合は、これまで通り .env に書くだけで動きます)。
 
 # Flaskのデバッグモードを .env ファイルで制御します。
 FLASK_DEBUG_MODE = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
@@ -40,10 +45,23 @@ FLASK_DEBUG_MODE = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
 # ↓↓↓ SECRET_KEY の読み込みを追加 ↓↓↓
 FLASK_SECRET_KEY = os.getenv('FLASK_SECRET_KEY')
 
-# ↓↓↓ 新しいお店情報を .env から読み込み ↓↓↓
-SHOP_PHONE_NUMBER = os.getenv('SHOP_PHONE_NUMBER', "お店の電話番号までお問い合わせください")
-SHOP_OPENING_HOURS = os.getenv('SHOP_OPENING_HOURS', "お問い合わせください") # デフォルト値
-SHOP_HOLIDAYS = os.getenv('SHOP_HOLIDAYS', "お問い合わせください")         # デフォルト値
+# --- 空席状況のリアルタイム配信 (Server-Sent Events) ---
+# 予約フォームを開いている間に空き状況が変わったら、選択中の日付の時間枠ごとの受付可能人数を送ります。
+# 接続はボードの更新を待って眠っているだけなので、gevent などの軽量スレッドのワーカー
+# (例: gunicorn -k gevent) で動かせば、1ワーカーで数百の接続を抱えても負担は小さく済みます。
+SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', '25')) # 無通信で切断されないための送信間隔
+RESERVATION_DURATION_MINUTES = 120 # 1組あたりの利用時間 (2時間)
+
+# --- キャンセル待ち ---
+# 満席でお断りしたご予約 (お電話番号をいただいたもの) をキャンセル待ちとして店舗ごとに受け付けます。
+# ボードで予約のキャンセルが見つかると、空いた席に収まるキャンセル待ちを選んでログに出します (お店からお電話でご案内)。
+# キャンセルを見つけるために、カレンダーの変更分を読みに行く間隔 (秒)。0 で無効
+WAITLIST_SYNC_SECONDS = float(os.getenv('WAITLIST_SYNC_SECONDS', '60'))
+
+# --- アクセスの記録 (負荷試験用) ---
+# ファイル名を書くと、予約フォームのページと予約の送信へのアクセスを記録します (お名前と電話番号は別の値に置き換えます)。
+# 記録したファイルは replay_traffic.py で再生できます。空なら記録しません
+TRAFFIC_LOG_FILE = os.getenv('TRAFFIC_LOG_FILE')
 
 # --------------------------------------
 # ↓↓↓ FlaskアプリにSECRET_KEYを設定する処理を追加 ↓↓↓
@@ -56,137 +74,104 @@ else:
     print("FLASK_SECRET_KEY を .env ファイルから読み込みました。")
 # --------------------------------------
 
-# --- Google Calendar API スコープ ---
-SCOPES = ['https://www.googleapis.com/auth/calendar'] # カレンダーの読み書き両方の権限
-service = None # Google Calendar APIと通信するためのオブジェクトを格納するグローバル変数
+# --- お店 (店舗) ごとの設定とカレンダーとの接続 ---
+# 店舗ごとに、カレンダーのクライアント (core/calendar_client.py の create_calendar_client())、空席状況ボード、
+# キャンセル待ち、予約フォームのページのキャッシュを持ちます。認証情報と Calendar API との通信は
+# 同じ鍵ファイルを使う店舗の間で共有します。タイムアウトやサーキットブレーカーの設定は .env から読みます
+# (CALENDAR_API_TIMEOUT_SECONDS, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)。
+# CALENDAR_BACKEND=fake にすると、動作確認用の偽物のカレンダー (core/fake_calendar.py) を使います。
+# Flaskアプリが起動する際に、一度だけ全店舗のGoogleカレンダーの認証処理を実行します。
+tenants = load_tenants(duration_minutes=RESERVATION_DURATION_MINUTES)
 
-def authenticate_with_service_account():
-    """サービスアカウントを使ってGoogle Calendar APIの認証を行い、サービスオブジェクトを設定する"""
-    global service # この関数内でグローバル変数 service の値を変更することを宣言
+if TRAFFIC_LOG_FILE:
+    TrafficRecorder(TRAFFIC_LOG_FILE, os.getenv('TRAFFIC_LOG_SALT')).install(app)
 
-    if not SERVICE_ACCOUNT_FILE:
-        print("◆◆◆ エラー: .envファイルに SERVICE_ACCOUNT_FILE が設定されていません。 ◆◆◆")
-        return
-    if not CALENDAR_ID: # CALENDAR_IDも認証に直接は使わないが、後の処理で必須なのでチェック
-        print("◆◆◆ エラー: .envファイルに CALENDAR_ID が設定されていません。 ◆◆◆")
-        return
 
-    try:
-        creds = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        service = build('calendar', 'v3', credentials=creds)
-        print("★★★ Google Calendar API サービスアカウントでの認証成功 ★★★")
-    except FileNotFoundError:
-        print(f"◆◆◆ エラー: サービスアカウントキーファイル '{SERVICE_ACCOUNT_FILE}' が見つかりません。◆◆◆")
-        print(f"   .envファイルの設定と、ファイルの配置場所を確認してください。")
-        service = None
-    except Exception as e:
-        print(f"◆◆◆ サービスアカウントでの認証中に予期せぬエラーが発生しました: {e} ◆◆◆")
-        service = None
-
-# Flaskアプリが起動する際に、一度だけGoogleカレンダーの認証処理を実行します。
-authenticate_with_service_account()
-
-
-def calculate_vacancy(target_datetime_start_jp, target_datetime_end_jp, calendar_service):
+def sync_cancellations():
     """
-    指定された日時の既存予約から、カウンターとテーブルの空き状況を計算する関数。
+    全店舗について、キャンセル待ちのある日付の前回以降に変更された予定だけ (キャンセルを含む) をカレンダーから読み、
+    ボードに反映する (キャンセルが見つかると Tenant.offer_freed_seats が呼ばれます)。
+    1つのスレッドで全店舗を順に見て、動かし続けます。
     """
-    global CALENDAR_ID, TOTAL_COUNTER_SEATS, TOTAL_TABLE_UNITS # .envから読み込んだグローバル変数を使用
+    # 時計のずれを見込んで1分前から読む (同じ変更を2回反映しても結果は変わりません)
+    synced_from = {tenant.tenant_id: epoch_minute(datetime.datetime.now(datetime.timezone.utc)) - 1 for tenant in tenants}
+    while True:
+        time.sleep(WAITLIST_SYNC_SECONDS)
+        for tenant in tenants:
+            if tenant.calendar_client is None:
+                continue
+            tenant.waitlist.purge_before(jst_today().isoformat()) # 過ぎた日付のキャンセル待ちは消す
+            dates = tenant.waitlist.dates()
+            started = epoch_minute(datetime.datetime.now(datetime.timezone.utc)) - 1
+            if not dates:
+                synced_from[tenant.tenant_id] = started
+                continue
+            try:
+                changes = tenant.calendar_client.list_events(
+                    jst_epoch_minute(dates[0], 0), jst_epoch_minute(dates[-1], 24 * 60),
+                    show_deleted=True, updated_min=rfc3339_utc(synced_from[tenant.tenant_id]))
+            except (CircuitOpenError,) + CALENDAR_ERRORS as error:
+                print(f"[{tenant.tenant_id}] キャンセル待ちのための変更確認に失敗しました: {error}")
+                continue
+            synced_from[tenant.tenant_id] = started
+            tenant.occupancy_board.apply_changes(changes)
 
-    print(f"\n--- 空き状況計算開始 ({target_datetime_start_jp.strftime('%Y-%m-%d %H:%M')} JST) ---")
 
-    time_offset = datetime.timedelta(hours=9)
-    start_time_utc = target_datetime_start_jp - time_offset
-    end_time_utc = target_datetime_end_jp - time_offset
-    time_min_utc_iso = start_time_utc.isoformat() + 'Z'
-    time_max_utc_iso = end_time_utc.isoformat() + 'Z'
+if WAITLIST_SYNC_SECONDS > 0 and any(tenant.calendar_client is not None for tenant in tenants):
+    threading.Thread(target=sync_cancellations, name='waitlist-sync', daemon=True).start()
 
-    print(f"検索期間 (UTC): {time_min_utc_iso} から {time_max_utc_iso}")
 
-    if calendar_service is None: # 認証失敗などで service が None の場合の対策
-        print("◆◆◆ calculate_vacancyエラー: Calendar APIサービスが利用できません。 ◆◆◆")
-        return -1, -1
+# --- 店舗ごとのページ ---
+# 同じページを2か所に用意します: / (ホスト名で店舗を決め、当てはまらなければ既定の店舗) と /<店舗ID>/
+shop = Blueprint('shop', __name__)
 
-    try:
-        events_result = calendar_service.events().list(
-            calendarId=CALENDAR_ID, # .env から読み込んだカレンダーIDを使用
-            timeMin=time_min_utc_iso,
-            timeMax=time_max_utc_iso,
-            singleEvents=True,
-            orderBy='startTime').execute()
-        events = events_result.get('items', [])
-    except HttpError as error:
-        print(f'カレンダーからの予定取得中にエラー: {error}')
-        return -1, -1 # エラー時は空きなしとして扱う (例)
-
-    current_used_counter_seats = 0
-    current_used_table_units = 0
-
-    if not events:
-        print("指定期間に既存の予約はありませんでした。")
-    else:
-        print(f"{len(events)}件の既存予約が見つかりました。詳細を確認します...")
-        for event in events:
-            description_str = event.get('description', '{}')
-            # print(f"  デバッグ用出力: 取得した説明欄 -> [{description_str}]") # 必要に応じてコメント解除
-            try:
-                reservation_details = json.loads(description_str)
-                if reservation_details: # JSONが空でないことを確認
-                    seat_type = reservation_details.get('seat_type')
-                    if seat_type == 'カウンター':
-                        seats_this_booking = reservation_details.get('seats_used', 0)
-                        current_used_counter_seats += seats_this_booking
-                        print(f"  カウンター予約発見: {seats_this_booking}席使用")
-                    elif seat_type == 'テーブル':
-                        tables_this_booking = reservation_details.get('tables_used', 0)
-                        current_used_table_units += tables_this_booking
-                        print(f"  テーブル予約発見: {tables_this_booking}卓使用")
-            except json.JSONDecodeError:
-                print(f"  注意: 予定「{event.get('summary', '(タイトルなし)')}」の説明欄はJSON形式ではありませんでした。")
-            except TypeError:
-                print(f"  注意: 予定「{event.get('summary', '(タイトルなし)')}」の説明欄の形式に問題がありました。")
-
-    print(f"集計結果: 現在使用中のカウンター {current_used_counter_seats}席, テーブル {current_used_table_units}卓")
-
-    available_counter_seats = TOTAL_COUNTER_SEATS - current_used_counter_seats
-    available_table_units = TOTAL_TABLE_UNITS - current_used_table_units
-
-    print(f"計算結果: 空きカウンター {available_counter_seats}席, 空きテーブル {available_table_units}卓")
-    print("--- 空き状況計算終了 ---")
-
-    return available_counter_seats, available_table_units
-
-
-@app.route('/')
-def index():
+
+@shop.url_value_preprocessor
+def pull_tenant(endpoint, values):
+    """リクエストの店舗を決めて g.tenant に入れる (知らない店舗IDなら 404)"""
+    g.tenant = tenants.resolve(values.pop('tenant_id', None) if values else None, request.host)
+    if g.tenant is None:
+        abort(404)
+
+
+@shop.url_defaults
+def add_tenant_id(endpoint, values):
+    """/<店舗ID>/ のページの中で url_for() を使うと、同じ店舗のURLになるようにする"""
+    if 'tenant' in g and app.url_map.is_endpoint_expecting(endpoint, 'tenant_id'):
+        values.setdefault('tenant_id', g.tenant.tenant_id)
+
+
+
+
+def build_index_context(tenant, today):
+    """予約フォームに渡す値 (定休日・祝日の情報など) を作る。内容は日付とお店の設定だけで決まります"""
     # --- ▼▼▼ 定休日と祝日の情報をJavaScriptに渡すための準備 ▼▼▼ ---
     disabled_js_weekdays = []  # 毎週無効にする曜日 (JSのgetDay()用: 日曜=0, 月曜=1...)
     specific_dates_to_disable = [] # 特定の日付を無効にするリスト ("YYYY-MM-DD"形式)
     date_ranges_to_disable = []    # 特定の期間を無効にするリスト ({from:"YYYY-MM-DD", to:"..."})
 
-    today = datetime.date.today()
     min_date_for_flatpickr = (today + datetime.timedelta(days=1)).isoformat()
+    max_date_for_flatpickr = (today + datetime.timedelta(days=tenant.max_days_ahead)).isoformat()
     
     # 日本の祝日を取得 (当年と翌年分)
     jp_holidays = holidays.JP(years=[today.year, today.year + 1]) # holidays.Japanでも可
 
-    if SHOP_HOLIDAYS:
+    if tenant.shop_holidays:
         # 1. 毎週の定休日 (「祝日の月曜日」と区別するため、少しロジック調整)
-        disable_all_mondays = "毎週月曜日" in SHOP_HOLIDAYS # 「毎週月曜日」が指定されているか
+        disable_all_mondays = "毎週月曜日" in tenant.shop_holidays # 「毎週月曜日」が指定されているか
         
-        if "毎週日曜日" in SHOP_HOLIDAYS: disabled_js_weekdays.append(0)
+        if "毎週日曜日" in tenant.shop_holidays: disabled_js_weekdays.append(0)
         if disable_all_mondays: disabled_js_weekdays.append(1) # 「毎週月曜日」なら全ての月曜を無効化
-        if "毎週火曜日" in SHOP_HOLIDAYS: disabled_js_weekdays.append(2)
-        if "毎週水曜日" in SHOP_HOLIDAYS: disabled_js_weekdays.append(3)
-        if "毎週木曜日" in SHOP_HOLIDAYS: disabled_js_weekdays.append(4)
-        if "毎週金曜日" in SHOP_HOLIDAYS: disabled_js_weekdays.append(5)
-        if "毎週土曜日" in SHOP_HOLIDAYS: disabled_js_weekdays.append(6)
+        if "毎週火曜日" in tenant.shop_holidays: disabled_js_weekdays.append(2)
+        if "毎週水曜日" in tenant.shop_holidays: disabled_js_weekdays.append(3)
+        if "毎週木曜日" in tenant.shop_holidays: disabled_js_weekdays.append(4)
+        if "毎週金曜日" in tenant.shop_holidays: disabled_js_weekdays.append(5)
+        if "毎週土曜日" in tenant.shop_holidays: disabled_js_weekdays.append(6)
 
         # 2. 年末年始の期間 (前回と同じロジック)
-        if "年末年始" in SHOP_HOLIDAYS:
-            nenmatsu_start_mmdd_str = os.getenv('NENMATSU_HOLIDAY_START_MONTH_DAY', "12-29")
-            nenshi_end_mmdd_str = os.getenv('NENSHI_HOLIDAY_END_MONTH_DAY', "01-03")
+        if "年末年始" in tenant.shop_holidays:
+            nenmatsu_start_mmdd_str = tenant.nenmatsu_start
+            nenshi_end_mmdd_str = tenant.nenshi_end
             nenmatsu_m, nenmatsu_d = map(int, nenmatsu_start_mmdd_str.split('-'))
             nenshi_m, nenshi_d = map(int, nenshi_end_mmdd_str.split('-'))
             
@@ -194,7 +179,7 @@ def index():
             date_ranges_to_disable.append({"from": f"{today.year+1}-01-01", "to": f"{today.year+1}-{nenshi_m:02d}-{nenshi_d:02d}"})
 
         # 3. 日本の祝日全体を無効にするかチェック
-        if "祝日" in SHOP_HOLIDAYS and "祝日の月曜日" not in SHOP_HOLIDAYS: # 「祝日」指定があり、「祝日の月曜日」指定ではない場合
+        if "祝日" in tenant.shop_holidays and "祝日の月曜日" not in tenant.shop_holidays: # 「祝日」指定があり、「祝日の月曜日」指定ではない場合
             for date_obj, name in sorted(jp_holidays.items()):
                 if date_obj > today: # 未来の祝日のみ対象
                     specific_dates_to_disable.append(date_obj.isoformat())
@@ -202,7 +187,7 @@ def index():
 
         # 4. 「祝日の月曜日」だけを無効にするかチェック
         #    （「毎週月曜日」が指定されていなければ、こちらを優先）
-        if "祝日の月曜日" in SHOP_HOLIDAYS and not disable_all_mondays:
+        if "祝日の月曜日" in tenant.shop_holidays and not disable_all_mondays:
             for date_obj, name in sorted(jp_holidays.items()):
                 if date_obj > today and date_obj.weekday() == 0: # Pythonのweekday()で月曜日は0
                     specific_dates_to_disable.append(date_obj.isoformat())
@@ -213,195 +198,267 @@ def index():
 
     # --- ▲▲▲ ここまで準備 ▲▲▲ ---
 
-    # 'reservation_form.html' を表示する
-    return render_template(
-        'reservation_form.html',
-        shop_hours=SHOP_OPENING_HOURS,  # SHOP_OPENING_HOURS 変数を 'shop_hours' として渡す
-        shop_holidays=SHOP_HOLIDAYS,   # SHOP_HOLIDAYS 変数を 'shop_holidays' として渡す
-        shop_phone=SHOP_PHONE_NUMBER, # SHOP_PHONE_NUMBER を 'shop_phone' として渡す
+    return dict(
+        shop_name=tenant.shop_name, # お店の名前 (SHOP_NAME) をページのタイトルと見出しに使う
+        shop_hours=tenant.opening_hours,  # tenant.opening_hours 変数を 'shop_hours' として渡す
+        shop_holidays=tenant.shop_holidays,   # tenant.shop_holidays 変数を 'shop_holidays' として渡す
+        shop_phone=tenant.shop_phone, # tenant.shop_phone を 'shop_phone' として渡す
         min_date_for_calendar=min_date_for_flatpickr, # ★変更★ Flatpickr用のminDate
+        max_date_for_calendar=max_date_for_flatpickr, # 予約を受け付ける最後の日付 (RESERVATION_MAX_DAYS_AHEAD)
+        reservation_times=list(tenant.reservation_times), # 時刻の選択肢 (RESERVATION_FIRST_SLOT / LAST_SLOT / SLOT_MINUTES)
         disabled_weekdays_json=json.dumps(disabled_js_weekdays), # ★追加★ 無効にする曜日のリストをJSON文字列で渡す
         nenmatsu_nenshi_json=json.dumps(date_ranges_to_disable), # 年末年始期間を渡す (名前は前回と同じ)
         specific_holidays_json=json.dumps(specific_dates_to_disable) # ★追加★ 特定の祝日リストをJSONで渡す
     )
 
-@app.route('/reservation_result')
+
+# --- 予約フォームのページのキャッシュ ---
+# ページの中身は「日本時間の日付」と「お店の設定」と「ページのURL (/ か /<店舗ID>/ か)」だけで決まるので、
+# その組み合わせごとに一度だけ作り、以降は作ったものをそのまま返します (キャッシュは店舗ごと)。
+# 日付が変わると (日本時間の0時) キーが変わるため、自動的に作り直されます。
+# お店の設定は起動時に読み込むので、設定を変えた時はアプリを再起動してください。
+
+def cached_index_page(tenant, today):
+    """(ページのHTML, ETag) を返す。同じ日付・同じ設定・同じURLなら作り直しません"""
+    base_url = url_for('.index')
+    key = (today.isoformat(), tenant.settings_fingerprint, base_url)
+    cached = tenant.index_page_cache.get(base_url) # キャッシュは丸ごと差し替えるので、読むだけならロックは不要
+    if cached and cached['key'] == key:
+        return cached['body'], cached['etag']
+    with tenant.index_page_lock:
+        cached = tenant.index_page_cache.get(base_url)
+        if not cached or cached['key'] != key: # 他のスレッドが先に作っていなければ作る
+            body = render_template('reservation_form.html', **build_index_context(tenant, today)).encode('utf-8')
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            print(f"[{tenant.tenant_id}] 予約フォームのページを作成しました ({today.isoformat()}, {base_url}, ETag: {etag})")
+            cached = tenant.index_page_cache[base_url] = {'key': key, 'body': body, 'etag': etag}
+        return cached['body'], cached['etag']
+
+
+@shop.route('/')
+def index():
+    # 'reservation_form.html' を表示する (キャッシュ済みのページを返し、変わっていなければ 304 を返す)
+    body, etag = cached_index_page(g.tenant, jst_today())
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag)                        # 強い ETag (中身が1バイトでも違えば別の値)
+    response.headers['Cache-Control'] = 'no-cache' # ブラウザは毎回 ETag で確認してから使う
+    return response.make_conditional(request)
+
+def load_day_into_board(tenant, date_obj):
+    """
+    その日の営業時間分の予定を読み込み、ボードに反映する (同じ日付の接続で共有)。
+    読んでから OCCUPANCY_REFRESH_SECONDS 秒たつまでは読み直しません。それより古ければ読み直すので、
+    カレンダーで直接キャンセル・変更された予約も、その時間のうちに配信に反映されます。
+    """
+    occupancy_board = tenant.occupancy_board
+    date_str = date_obj.isoformat()
+    first_minute = jst_epoch_minute(date_str, min(occupancy_board.slot_minutes))
+    last_minute = jst_epoch_minute(date_str, max(occupancy_board.slot_minutes) + RESERVATION_DURATION_MINUTES)
+    if not occupancy_board.claim_day_load(date_str, first_minute, last_minute, tenant.occupancy_refresh_seconds):
+        return
+    try:
+        fetch_events(tenant.calendar_client, first_minute, last_minute, occupancy_board) # 失敗したら次の呼び出しで再挑戦する
+    finally:
+        occupancy_board.release_day_load(date_str)
+
+
+@shop.route('/availability_stream')
+def availability_stream():
+    """選択中の日付の空席状況を Server-Sent Events で送り続ける"""
+    try:
+        date_obj = datetime.date.fromisoformat(request.args.get('date', ''))
+    except ValueError:
+        return Response("date パラメータ (YYYY-MM-DD) が正しくありません。", status=400)
+    try:
+        # 予約を受け付けない日付 (過去・受付期間の外・定休日) は配信しない (ボードに日付を増やさないため)
+        g.tenant.validate.check_date(date_obj, jst_today())
+    except ReservationRejected as rejected:
+        return Response(str(rejected), status=400)
+
+    date_str = date_obj.isoformat()
+    tenant = g.tenant
+    occupancy_board = tenant.occupancy_board
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    last_version = int(last_event_id) if last_event_id.isdigit() else -1
+
+    def generate():
+        # 配信している間はボードがこの日付を忘れないようにする (接続が閉じられると finally で外す)
+        occupancy_board.subscribe(date_str)
+        try:
+            # 押さえた後に読み込む (忘れられて作り直された日付なら、ここで読み込み直す)
+            load_day_into_board(tenant, date_obj)
+            version = last_version
+            yield "retry: 5000\n\n".encode('utf-8') # 切断時にブラウザが再接続するまでの待ち時間 (ミリ秒)
+            while True:
+                version, payload = occupancy_board.wait_for_update(date_str, version, SSE_HEARTBEAT_SECONDS)
+                if payload is None:
+                    # 変化のないまま古くなったら読み直す (変わっていれば次の wait_for_update で配信されます)
+                    load_day_into_board(tenant, date_obj)
+                yield payload if payload is not None else b": keep-alive\n\n"
+        finally:
+            occupancy_board.unsubscribe(date_str)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # nginx などのバッファリングを無効にする
+    return response
+
+@shop.route('/health/calendar')
+def calendar_health():
+    """その店舗のカレンダー接続のサーキットブレーカーの状態を返す (監視用)"""
+    tenant = g.tenant
+    if tenant.calendar_client is None:
+        return jsonify({'tenant': tenant.tenant_id, 'backend': tenant.calendar_backend, 'service_ready': False}), 503
+    snapshot = tenant.calendar_client.breaker.snapshot()
+    snapshot['tenant'] = tenant.tenant_id
+    snapshot['backend'] = tenant.calendar_client.backend
+    snapshot['service_ready'] = True
+    snapshot['board_dates'] = tenant.occupancy_board.date_count() # ボードが覚えている日付の数
+    # キャンセル待ちの件数 (ご案内中のお客様の一覧は /staff/waitlist で確認します)
+    snapshot['waitlist'] = {'waiting': len(tenant.waitlist), 'offered': len(tenant.waitlist.offered())}
+    status_code = 200 if snapshot['state'] == CircuitBreaker.CLOSED else 503
+    return jsonify(snapshot), status_code
+
+# --- お店の方のページ (キャンセル待ちのご案内の確認・確定・取り下げ) ---
+# お客様のお名前・電話番号を返すので、STAFF_API_TOKEN を "Authorization: Bearer <合言葉>" で送った時だけ使えます。
+
+def require_staff():
+    token = g.tenant.staff_api_token
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+        abort(403)
+
+def waitlist_entry_json(entry, offered_at=None):
+    start = jst_datetime(entry.start_minute)
+    data = {
+        'entry_id': entry.entry_id, 'date': entry.date, 'time': start.strftime('%H:%M'),
+        'seat_type': entry.seat_type, 'guests': entry.guests, 'name': entry.name, 'phone': entry.phone,
+    }
+    if offered_at is not None:
+        data['offered_at'] = datetime.datetime.fromtimestamp(offered_at, start.tzinfo).isoformat(timespec='seconds')
+    return data
+
+@shop.route('/staff/waitlist')
+def staff_waitlist():
+    """ご案内中 (確定・取り下げ待ち) のキャンセル待ちの一覧"""
+    require_staff()
+    waitlist = g.tenant.waitlist
+    return jsonify({
+        'tenant': g.tenant.tenant_id,
+        'waiting': len(waitlist),
+        'offered': [waitlist_entry_json(entry, offered_at) for entry, offered_at in waitlist.offered()],
+    })
+
+@shop.route('/staff/waitlist/<int:entry_id>/<action>', methods=['POST'])
+def staff_waitlist_offer(entry_id, action):
+    """ご案内したお客様の予約を確定した (confirm)、またはご案内を取り下げる (release)"""
+    require_staff()
+    if action == 'confirm':
+        entry = g.tenant.waitlist.confirm_offer(entry_id)
+    elif action == 'release':
+        entry = g.tenant.release_offer(entry_id) # 押さえていた席は次のお客様にご案内します
+    else:
+        abort(404)
+    if entry is None:
+        return jsonify({'error': f"受付番号 {entry_id} はご案内中ではありません"}), 404
+    print(f"[{g.tenant.tenant_id}] キャンセル待ちのご案内を{'確定' if action == 'confirm' else '取り下げ'}: 受付番号 {entry_id}")
+    return jsonify(waitlist_entry_json(entry))
+
+@shop.route('/reservation_result')
 def reservation_result():
     # このページはフラッシュメッセージを表示するだけ
-    return render_template('result_page.html')
+    return render_template('result_page.html', shop_name=g.tenant.shop_name)
 
-@app.route('/submit_reservation', methods=['POST'])
+@shop.route('/submit_reservation', methods=['POST'])
 def submit_reservation():
-    global service, CALENDAR_ID
     message_type = "error" # ★追加★ まずはデフォルトをエラータイプに設定
+    tenant = g.tenant # このリクエストのお店 (カレンダー・席数・ボードなどは店舗ごと)
+    calendar_client = tenant.calendar_client
+    occupancy_board = tenant.occupancy_board
+    waitlist = tenant.waitlist
 
-    if service is None:
+    # --- ▼▼▼ 入力チェック (Googleカレンダーへの通信より前に、予約できない内容をすぐに弾く) ▼▼▼ ---
+    try:
+        reservation = tenant.validate(request.form, jst_today())
+    except ReservationRejected as rejected:
+        print(f"入力チェックで受付不可: {rejected}")
+        flash(str(rejected), message_type)
+        return redirect(url_for('.reservation_result'))
+    # --- ▲▲▲ ここまで入力チェック ▲▲▲ ---
+
+    if calendar_client is None:
         final_message_to_customer = "申し訳ありません。現在、予約システムをご利用いただけません。\nお手数ですが、お電話にてお問い合わせください。"
         # ★修正★ message_type を渡す
         flash(final_message_to_customer, message_type) # ★変更1: メッセージをflashに設定
-        return redirect(url_for('reservation_result'))  # ★変更2: 結果ページへリダイレクト
+        return redirect(url_for('.reservation_result'))  # ★変更2: 結果ページへリダイレクト
 
-    date_str = request.form.get('reservation_date')
-    time_str = request.form.get('reservation_time')
-    num_guests_str = request.form.get('num_guests')
-    requested_seat_type = request.form.get('seat_type')
-    reservist_name = request.form.get('reservist_name', '').strip()
-    phone_number = request.form.get('phone_number', '').strip()
-
-    try:
-        requested_guests = int(num_guests_str)
-        if not (1 <= requested_guests <= 8) :
-             raise ValueError("人数は1～8名で選択してください。")
+    reservist_name = reservation.name
+    phone_number = reservation.phone
+    requested_guests = reservation.guests
+    requested_seat_type = reservation.seat_type
 
-        year, month, day = map(int, date_str.split('-'))
-        hour, minute = map(int, time_str.split(':'))
+    # 予約の開始・終了はエポック分 (整数) で扱う (core/jst_time.py)
+    reservation_date_str = reservation.date.isoformat()
+    reservation_start_minute = jst_epoch_minute(reservation_date_str, reservation.hour * 60 + reservation.minute)
+    reservation_end_minute = reservation_start_minute + RESERVATION_DURATION_MINUTES
 
-        selected_date_obj = datetime.date(year, month, day) # お客様が選択した日付オブジェクト
-        today_date_obj = datetime.date.today()              # 今日の日付オブジェクト
-
-        if selected_date_obj <= today_date_obj: # 選択された日付が今日以前かチェック
-            final_message_to_customer = "ご予約は明日以降の日付で承っております。\n恐れ入りますが、日付をご確認の上、再度ご入力ください。"
-            # message_type は "error" のまま
-            flash(final_message_to_customer, message_type) # ★変更★
-            return redirect(url_for('reservation_result')) # ★変更★
-        
-               # --- ▼▼▼ 定休日チェック（拡張版）▼▼▼ ---
-        is_holiday = False # このフラグが True なら定休日
-        holiday_reason_message = "" # 定休日の理由メッセージ
-
-        selected_month = selected_date_obj.month # 選択された月
-        selected_day = selected_date_obj.day     # 選択された日
-        selected_weekday_int = selected_date_obj.weekday() # 曜日番号を selected_weekday_int に入れる
-        japanese_weekdays = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
-        selected_weekday_jp = japanese_weekdays[selected_weekday_int] # 正しく selected_weekday_int を使う
-
-
-        # 1. 毎週の定休日チェック (例: 日曜日)
-        if SHOP_HOLIDAYS and "日曜日" in SHOP_HOLIDAYS:
-            if selected_weekday_int == 6: # 6 は日曜日
-                is_holiday = True
-                holiday_reason_message = f"毎週{selected_weekday_jp}のため" # %A は曜日名 (例: Sunday)
-                                                                              # 日本語で「日曜日」と表示したい場合は調整が必要
-        
-        # (もし「毎週水曜日」も定休日なら、以下のように追加できます)
-        # if not is_holiday and SHOP_HOLIDAYS and "水曜日" in SHOP_HOLIDAYS: # まだ休日と判定されていなければ
-        #     if selected_weekday_int == 2: # 2 は水曜日
-        #         is_holiday = True
-        #         holiday_reason_message = f"毎週{selected_weekday_jp}のため"
-
-        # 2. 年末年始のチェック (例: 12月29日～1月3日)
-        #    SHOP_HOLIDAYS に "年末年始" というキーワードが含まれていれば、このチェックを行う
-        if not is_holiday and SHOP_HOLIDAYS and "年末年始" in SHOP_HOLIDAYS: # まだ休日と判定されていなければ
-            # 年末の期間 (12月29日, 30日, 31日)
-            if selected_month == 12 and selected_day >= 29:
-                is_holiday = True
-            # 年始の期間 (1月1日, 2日, 3日)
-            elif selected_month == 1 and selected_day <= 3:
-                is_holiday = True
-            
-            if is_holiday: # もし上の年末年始の条件に合致したら
-                holiday_reason_message = "年末年始の休業期間のため"
-
-        # (ここに、将来的に「祝日」や「特定の休みの日」のチェックも追加できます)
-
-        # 最終的に is_holiday が True なら、予約不可とする
-        if is_holiday:
-            final_message_to_customer = (
-                f"申し訳ございません。{selected_date_obj.strftime('%Y年%m月%d日')}（{selected_weekday_jp}）は、{holiday_reason_message}定休日でございます。\n"
-                f"恐れ入りますが、別の日付をご選択ください。"
-            )
-            flash(final_message_to_customer, message_type) # message_type は既に "error"
-            return redirect(url_for('reservation_result'))
-        # --- ▲▲▲ ここまで定休日チェック（拡張版） ▲▲▲ ---
-        
-        reservation_start_time_jp = datetime.datetime(year, month, day, hour, minute)
-        reservation_end_time_jp = reservation_start_time_jp + datetime.timedelta(hours=2)
-
-        if not reservist_name:
-            final_message_to_customer = "お名前が入力されていません。恐れ入りますが、お名前をご入力ください。"
-            # ★修正★ message_type を渡す
-            flash(final_message_to_customer, message_type) # ★変更★
-            return redirect(url_for('reservation_result')) # ★変更★
-
-        if requested_guests >= 4 and not phone_number:
-            final_message_to_customer = "4名様以上でご予約の場合は、お電話番号のご入力をお願いいたします。"
-            # ★修正★ message_type を渡す
-            flash(final_message_to_customer, message_type) # ★変更★
-            return redirect(url_for('reservation_result')) # ★変更★
-
-    except (ValueError, TypeError) as e:
-        print(f"入力データのエラー: {e}")
-        final_message_to_customer = f"入力された人数、日付、または時刻の形式に誤りがあります。もう一度ご確認ください。" # ({e}) を削除
-        # ★修正★ message_type を渡す
-        flash(final_message_to_customer, message_type) # ★変更★
-        return redirect(url_for('reservation_result')) # ★変更★
-    except Exception as e: # ★追加★ その他の予期せぬエラーもキャッチ
-        print(f"予期せぬ入力処理エラー: {e}")
-        final_message_to_customer = "入力処理中に予期せぬエラーが発生しました。お手数ですが、入力内容を再度ご確認ください。"
-        flash(final_message_to_customer, message_type) # ★変更★
-        return redirect(url_for('reservation_result')) # ★変更★
-
-
-    print(f"処理中のリクエスト: {reservist_name}様, {requested_guests}名様、{requested_seat_type}希望")
-    print(f"希望日時: {reservation_start_time_jp.strftime('%Y-%m-%d %H:%M')} - {reservation_end_time_jp.strftime('%Y-%m-%d %H:%M')} JST")
+    print(f"処理中のリクエスト: [{tenant.tenant_id}] {reservist_name}様, {requested_guests}名様、{requested_seat_type}希望")
+    print(f"希望日時: {reservation_date_str} {reservation.hour:02d}:{reservation.minute:02d} から{RESERVATION_DURATION_MINUTES}分 JST")
     if phone_number:
         print(f"電話番号: {phone_number}")
 
-    available_counters, available_tables = calculate_vacancy(
-        reservation_start_time_jp,
-        reservation_end_time_jp,
-        service
+    available_counters, available_tables, vacancy_is_stale = calculate_vacancy(
+        calendar_client,
+        reservation_start_minute,
+        reservation_end_minute,
+        tenant.total_counter_seats,
+        tenant.total_table_units,
+        board=occupancy_board,
+        stale_policy=tenant.stale_policy,
     )
 
     if available_counters == -1: # calculate_vacancy でエラーが発生した場合
         final_message_to_customer = "申し訳ありません。ただいま空席状況を確認できませんでした。\nお手数ですが、しばらくしてから再度お試しいただくか、お電話にてお問い合わせください。"
         # ★修正★ message_type を渡す (デフォルトの "error" のまま)
         flash(final_message_to_customer, message_type) # ★変更★
-        return redirect(url_for('reservation_result')) # ★変更★
+        return redirect(url_for('.reservation_result')) # ★変更★
 
     print(f"\n--- 予約可否判断開始 ---")
-    print(f"現在の空き: カウンター {available_counters}席, テーブル {available_tables}卓")
+    print(f"現在の空き: カウンター {available_counters}席, テーブル {available_tables}卓" + (" (保存済みの情報からの見積もり)" if vacancy_is_stale else ""))
     reservation_possible = False
     final_message_to_customer = "" # メッセージは各条件分岐で設定
     # message_type は、予約不可の場合はデフォルトの "error" が使われる
 
-    # --- 予約可否判断ロジック (メッセージ内容を調整) ---
-    if requested_seat_type == "カウンター":
-        if 1 <= requested_guests <= 4:
-            if available_counters >= requested_guests:
-                if (available_counters - requested_guests) >= 5:
-                    reservation_possible = True
-                    final_message_to_customer = f"{reservist_name}様、カウンター席 {requested_guests}名様でのご予約を承りました。"
-                    message_type = "success" # ★追加★ 予約成功なので type を success に
-                else:
-                    final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、カウンター席が満席でございます。恐れ入りますがお電話にてお問い合わせをお願いいたします。"
-            else:
-                final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、カウンター席がご希望の人数様分ご用意できません。"
-        else:
-            final_message_to_customer = f"{reservist_name}様、申し訳ありません。カウンター席は1～4名様でのご案内でございます。"
-    elif requested_seat_type == "テーブル":
-        if 1 <= requested_guests <= 2:
-            final_message_to_customer = f"{reservist_name}様、申し訳ありません。テーブル席は3名様からのご案内でございます。"
-        elif 3 <= requested_guests <= 4:
-            if available_tables >= 1:
-                reservation_possible = True
-                final_message_to_customer = f"{reservist_name}様、テーブル席 {requested_guests}名様でのご予約を承りました。"
-                message_type = "success" # ★追加★ 予約成功なので type を success に
-            else:
-                final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、テーブル席が満席でございます。"
-        elif 5 <= requested_guests <= 8:
-            if available_tables >= 2:
-                reservation_possible = True
-                final_message_to_customer = f"{reservist_name}様、テーブル席 {requested_guests}名様でのご予約を承りました。"
-                message_type = "success" # ★追加★ 予約成功なので type を success に
-            else:
-                final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、テーブル席が満席でございます。"
-        else:
-            final_message_to_customer = f"{reservist_name}様、申し訳ありません。テーブル席では8名様を超えるご予約はお受けできません。9名様以上はお電話にてご相談ください。"
+    # --- 予約可否判断ロジック (席のルールは core/seat_policy.py、人数の組み合わせは入力チェックで確認済み) ---
+    availability = check_availability(requested_seat_type, requested_guests, available_counters, available_tables,
+                                      tenant.reserved_units)
+    if availability == AVAILABLE and vacancy_is_stale:
+        # 見積もりの空きでは予約を確定しない (カレンダーにボードの知らない予約があるかもしれないため)
+        final_message_to_customer = (
+            f"{reservist_name}様、申し訳ございません。ただいま最新の空席状況を確認できないため、ご予約を確定できませんでした。\n"
+            f"少し前の状況では、ご希望のお時間帯の{requested_seat_type}席には空きがございました。"
+            f"お手数ですが、しばらくしてから再度お試しいただくか、お電話にてお問い合わせください。"
+        )
+    elif availability == AVAILABLE:
+        reservation_possible = True
+        final_message_to_customer = f"{reservist_name}様、{requested_seat_type}席 {requested_guests}名様でのご予約を承りました。"
+        message_type = "success" # ★追加★ 予約成功なので type を success に
+    elif requested_seat_type == TABLE:
+        final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、テーブル席が満席でございます。"
+    elif availability == FULL: # 人数分の空きはあるが、予約後に残しておく席数を割ってしまう
+        final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、カウンター席が満席でございます。恐れ入りますがお電話にてお問い合わせをお願いいたします。"
     else:
-        final_message_to_customer = f"{reservist_name}様、ご希望の席タイプを正しくお選びください。"
+        final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、カウンター席がご希望の人数様分ご用意できません。"
     # --- ここまで予約可否判断ロジック ---
 
+    # 満席でお断りする場合は、ご連絡先をいただいていればキャンセル待ちとして承る (見積もりの空きでは受け付けない)
+    if not reservation_possible and phone_number and not vacancy_is_stale:
+        waitlist_entry = waitlist.add(reservation_date_str, reservation_start_minute, requested_seat_type,
+                                      requested_guests, reservist_name, phone_number)
+        if waitlist_entry is not None:
+            print(f"キャンセル待ちに登録: 受付番号 {waitlist_entry.entry_id} (待ち {len(waitlist)}件)")
+            final_message_to_customer += "\nキャンセル待ちとして承りました。お席に空きが出ましたら、お電話にてご連絡いたします。"
+
     if reservation_possible: # この時点で final_message_to_customer と message_type は設定済みのはず
         # ... (カレンダー書き込み処理は変更なし、ただしエラー時の message_type 変更は重要) ...
         event_summary = f"予約: {reservist_name}様 {requested_guests}名 ({requested_seat_type})"
@@ -413,23 +470,40 @@ def submit_reservation():
             "seat_type": requested_seat_type,
         }
         if phone_number: event_description_details["phone_number"] = phone_number
-        if requested_seat_type == "カウンター": event_description_details["seats_used"] = requested_guests
-        elif requested_seat_type == "テーブル": event_description_details["tables_used"] = 1 if requested_guests <= 4 else 2
+        if reservation.line_user_id: event_description_details["line_user_id"] = reservation.line_user_id # リマインドの送信先 (notify_worker.py)
+        if requested_seat_type == COUNTER: event_description_details["seats_used"] = reservation.units
+        elif requested_seat_type == TABLE: event_description_details["tables_used"] = reservation.units
         event_description_json = json.dumps(event_description_details, ensure_ascii=False, indent=2)
-        event_start = {'dateTime': reservation_start_time_jp.isoformat(), 'timeZone': 'Asia/Tokyo'}
-        event_end = {'dateTime': reservation_end_time_jp.isoformat(), 'timeZone': 'Asia/Tokyo'}
+        event_start = {'dateTime': jst_datetime(reservation_start_minute).isoformat(), 'timeZone': 'Asia/Tokyo'}
+        event_end = {'dateTime': jst_datetime(reservation_end_minute).isoformat(), 'timeZone': 'Asia/Tokyo'}
         event_body = {'summary': event_summary, 'description': event_description_json, 'start': event_start, 'end': event_end}
 
         try:
-            created_event = service.events().insert(calendarId=CALENDAR_ID, body=event_body).execute()
+            created_event = calendar_client.insert_event(event_body)
             print(f"カレンダー登録成功: {created_event.get('id')}, Link: {created_event.get('htmlLink')}")
+            occupancy_board.record_booking(
+                reservation_date_str,
+                created_event.get('id'),
+                reservation_start_minute,
+                reservation_end_minute,
+                *usage_for(requested_seat_type, requested_guests),
+            ) # フォームを開いている他のお客様にも空き状況の変化を知らせる
             # final_message_to_customer には既に予約承りメッセージが入っているので、追記する
             final_message_to_customer += (
                 f"\n\n上記の内容でご予約を受付させていただきました。\n"
                 f"{reservist_name}様のご来店を心よりお待ちしております。"
             )
             # message_type は "success" のまま
-        except HttpError as error:
+        except CircuitOpenError:
+            # カレンダーには何も送っていないので、予約は登録されていません
+            print("カレンダー書き込みを省略しました (サーキットブレーカーが開いています)")
+            final_message_to_customer = (
+                f"{reservist_name}様、申し訳ございません。\n"
+                f"ただいま予約システムが一時的にご利用いただけないため、ご予約はまだ確定しておりません。\n"
+                f"お手数ですが、しばらくしてから再度お試しいただくか、お電話にてお問い合わせください。"
+            )
+            message_type = "error"
+        except CALENDAR_ERRORS as error:
             print(f"カレンダー書き込みエラー: {error}")
             final_message_to_customer = (
                 f"{reservist_name}様、申し訳ございません。\n"
@@ -443,89 +517,12 @@ def submit_reservation():
     print("--- 予約可否判断終了 ---")
     # ★修正★ message_type を渡す
     flash(final_message_to_customer, message_type)
-    return redirect(url_for('reservation_result'))
+    return redirect(url_for('.reservation_result'))
 
-    # 4. 予約可否判断ロジック
-    print(f"\n--- 予約可否判断開始 ---")
-    print(f"現在の空き: カウンター {available_counters}席, テーブル {available_tables}卓")
-    reservation_possible = False
-    final_message_to_customer = ""
-    
-    if requested_seat_type == "カウンター":
-        if 1 <= requested_guests <= 4:
-            if available_counters >= requested_guests:
-                if (available_counters - requested_guests) >= 5:
-                    reservation_possible = True
-                    final_message_to_customer = f"{reservist_name}様、カウンター席 {requested_guests}名様でのご予約を承りました。"
-                else:
-                    final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、カウンター席の空きが残り少なくなっております。別のお時間をご検討いただくか、お電話にてご相談ください。"
-            else:
-                final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、カウンター席がご希望の人数様分ご用意できません。)"
-        else:
-            final_message_to_customer = f"{reservist_name}様、申し訳ありません。カウンター席は1～4名様でのご案内となります。"
-    elif requested_seat_type == "テーブル":
-        if 1 <= requested_guests <= 2:
-            final_message_to_customer = f"{reservist_name}様、申し訳ありません。テーブル席は3名様からのご案内となります。"
-        elif 3 <= requested_guests <= 4:
-            if available_tables >= 1:
-                reservation_possible = True
-                final_message_to_customer = f"{reservist_name}様、テーブル席 {requested_guests}名様でのご予約を承りました。"
-            else:
-                final_message_to_customer = f"{reservist_name}様、申し訳ございません。ご希望のお時間帯は、カウンター席の空きが残り少なくなっております。別のお時間をご検討いただくか、お電話にてご相談ください。"
-        elif 5 <= requested_guests <= 8:
-            if available_tables >= 2:
-                reservation_possible = True
-                final_message_to_customer = f"{reservist_name}様、テーブル席 {requested_guests}名様でのご予約を承りました。"
-            else:
-                final_message_to_customer = f"{reservist_name}様、申し訳ございません。テーブル席は満席でございます。"
-        else:
-            final_message_to_customer = f"{reservist_name}様、申し訳ありません。テーブル席では8名様を超えるご予約はお受けできません。9名様以上はお電話にてご相談ください。"
-    else:
-        final_message_to_customer = f"{reservist_name}様、ご希望の席タイプを正しくお選びください。"
 
-    # 5. 予約可能ならカレンダーに書き込み
-    if reservation_possible:
-        event_summary = f"予約: {reservist_name}様 {requested_guests}名 ({requested_seat_type})"
-        if phone_number:
-            event_summary += f" ({phone_number})"
-            
-        event_description_details = {
-            "reservist_name": reservist_name,
-            "number_of_guests": requested_guests,
-            "seat_type": requested_seat_type,
-        }
-        if phone_number:
-            event_description_details["phone_number"] = phone_number
-        
-        if requested_seat_type == "カウンター":
-            event_description_details["seats_used"] = requested_guests
-        elif requested_seat_type == "テーブル":
-            event_description_details["tables_used"] = 1 if requested_guests <= 4 else 2
-        
-        event_description_json = json.dumps(event_description_details, ensure_ascii=False, indent=2)
-
-        event_start = {'dateTime': reservation_start_time_jp.isoformat(), 'timeZone': 'Asia/Tokyo'}
-        event_end = {'dateTime': reservation_end_time_jp.isoformat(), 'timeZone': 'Asia/Tokyo'}
-        event_body = {
-            'summary': event_summary,
-            'description': event_description_json,
-            'start': event_start,
-            'end': event_end,
-        }
-        try:
-            created_event = service.events().insert(calendarId=CALENDAR_ID, body=event_body).execute()
-            print(f"カレンダー登録成功: {created_event.get('id')}, Link: {created_event.get('htmlLink')}") # 開発者ログ
-            final_message_to_customer = f"{reservist_name}様、ご予約ありがとうございます。\n"
-            final_message_to_customer += f"{reservation_start_time_jp.strftime('%Y年%m月%d日 %H:%M')}より、{requested_guests}名様、{requested_seat_type}席にてご予約を承りました。"
-        except HttpError as error:
-            print(f"カレンダー書き込みエラー: {error}") # 開発者ログ
-            final_message_to_customer = f"{reservist_name}様、ご予約のお席は確保できましたが、システムエラーによりカレンダーへの登録に失敗しました。お手数ですがお電話にてご確認ください。"
-            # reservation_possible はTrueのままなので、メッセージタイプはsuccessのままでも良いが、注意を促す
-            message_type = "error" # または "warning" のような別のタイプを定義しても良い
-    
-    
-    print("--- 予約可否判断終了 ---")
-    return render_template('reservation_form.html', message=final_message_to_customer)
+# 店舗のページを / と /<店舗ID>/ の2か所に登録する (上の @shop.route のページすべて)
+app.register_blueprint(shop)
+app.register_blueprint(shop, url_prefix='/<tenant_id>', name='tenant_shop')
 
 
 if __name__ == '__main__':
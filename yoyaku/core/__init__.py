@@ -0,0 +1,20 @@
+# core (予約システムの共通部品)
+#
+# 予約フォーム (app.py)・空席チェック (kuuseki_check.py)・書き出し (export_reservations.py)・
+# old_scripts のスクリプトは、ここにある部品だけを使ってカレンダーを読み書きします。
+#   credentials.py     … Google の認証情報 (サービスアカウント / OAuth) の読み込み
+#   calendar_client.py … カレンダーの読み書き (タイムアウト・サーキットブレーカー付き)
+#   vacancy.py         … 空席状況の計算
+#   occupancy.py       … 予約の使用席数の集計と、プロセス内の空席状況ボード
+#   seat_policy.py     … 席タイプと人数のルール
+#   waitlist.py        … キャンセル待ちの受付と、空いた席のご案内
+#   jst_time.py        … 日本時間とエポック分の変換
+#   breaker.py         … サーキットブレーカー
+#   fake_calendar.py   … 動作確認用のカレンダーの偽物
+
+from .breaker import CircuitBreaker, CircuitOpenError
+from .calendar_client import CALENDAR_ERRORS, CalendarClient, get_calendar_client
+from .credentials import SCOPES_READ_ONLY, SCOPES_READ_WRITE
+from .occupancy import OccupancyBoard, count_usage, parse_reservation_usage
+from .vacancy import StalePolicy, calculate_vacancy, fetch_events
+from .waitlist import Waitlist, WaitlistEntry
@@ -0,0 +1,118 @@
+# breaker.py (Googleカレンダー呼び出し用のサーキットブレーカー)
+
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """ブレーカーが開いている (カレンダーを呼ばずにすぐ失敗させた) ことを表す例外"""
+
+
+class CircuitBreaker:
+    """
+    連続して失敗したら一定時間カレンダーへの呼び出しを止め、待たせずにすぐ失敗を返す仕組み。
+
+    状態の移り変わり:
+      closed    (通常)   -- failure_threshold 回続けて失敗 --> open
+      open      (遮断中) -- reset_timeout 秒経過 -----------> half_open
+      half_open (試行中) -- 1回だけ試しに呼ぶ。成功なら closed、失敗なら再び open
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, failure_exceptions=(Exception,),
+                 on_transition=None, clock=time.monotonic, history_size=20):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions  # 失敗として数える例外の種類
+        self.on_transition = on_transition            # 状態が変わった時に呼ぶ関数 (name, 変更前, 変更後)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._transitions = deque(maxlen=history_size)
+        self._counts = {'calls': 0, 'successes': 0, 'failures': 0, 'short_circuited': 0}
+        self._last_error = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def _transition(self, new_state):
+        # ロックを持った状態で呼ぶこと
+        old_state = self._state
+        if old_state == new_state:
+            return
+        self._state = new_state
+        self._transitions.append({'at': time.time(), 'from': old_state, 'to': new_state})
+        if self.on_transition is not None:
+            self.on_transition(self.name, old_state, new_state)
+
+    def _before_call(self):
+        with self._lock:
+            self._counts['calls'] += 1
+            if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+            if self._state == self.OPEN or (self._state == self.HALF_OPEN and self._trial_in_flight):
+                self._counts['short_circuited'] += 1
+                raise CircuitOpenError(f"{self.name}: サーキットブレーカーが開いています")
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = True
+
+    def _after_success(self):
+        with self._lock:
+            self._counts['successes'] += 1
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+            self._transition(self.CLOSED)
+
+    def _after_failure(self, error):
+        with self._lock:
+            self._counts['failures'] += 1
+            self._consecutive_failures += 1
+            self._last_error = f"{type(error).__name__}: {error}"
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+                self._transition(self.OPEN)
+            self._trial_in_flight = False
+
+    def call(self, func, *args, **kwargs):
+        """ブレーカー越しに func を呼ぶ。開いている間は CircuitOpenError を投げます"""
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_exceptions as error:
+            self._after_failure(error)
+            raise
+        except BaseException:
+            # 失敗として数えない例外でも、試行中の印だけは戻しておく
+            with self._lock:
+                self._trial_in_flight = False
+            raise
+        self._after_success()
+        return result
+
+    def snapshot(self):
+        """監視用に現在の状態をまとめて返す"""
+        with self._lock:
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (self.clock() - self._opened_at))
+            return {
+                'name': self.name,
+                'state': self._state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout_seconds': self.reset_timeout,
+                'retry_in_seconds': retry_in,
+                'last_error': self._last_error,
+                'counts': dict(self._counts),
+                'transitions': list(self._transitions),
+            }
@@ -0,0 +1,198 @@
+# calendar_client.py (Googleカレンダーとのやり取りをまとめたクライアント)
+#
+# 予約フォーム (app.py)・空席チェック (kuuseki_check.py)・書き出し (export_reservations.py)・
+# old_scripts のスクリプトは、すべてこの CalendarClient を通してカレンダーを読み書きします。
+# get_calendar_client() は .env の設定から一度だけクライアントを作り、以降は同じものを返します。
+
+import os
+import threading
+
+import google_auth_httplib2
+import httplib2
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from .breaker import CircuitBreaker
+from .credentials import SCOPES_READ_WRITE, load_credentials_from_env, load_service_account_credentials
+from .jst_time import rfc3339_utc
+
+# カレンダーとの通信で起こりうるエラー (これらは「カレンダーが使えない」として扱います)
+CALENDAR_ERRORS = (HttpError, TimeoutError, OSError, httplib2.HttpLib2Error)
+
+
+class CalendarClient:
+    """1つのカレンダー (calendar_id) を読み書きするクライアント。breaker があれば全ての呼び出しをその中で行います"""
+
+    def __init__(self, service, calendar_id, breaker=None, backend='google'):
+        self.service = service
+        self.calendar_id = calendar_id
+        self.breaker = breaker
+        self.backend = backend
+
+    def _execute(self, request, num_retries=0):
+        if self.breaker is None:
+            return request.execute(num_retries=num_retries)
+        return self.breaker.call(request.execute, num_retries=num_retries)
+
+    def iter_event_pages(self, start_epoch_minute=None, end_epoch_minute=None, page_token=None, page_size=250,
+                         show_deleted=False, updated_min=None, num_retries=0):
+        """
+        events().list の結果を1ページずつ返すジェネレーター。
+        (そのページの予定一覧, 次のページのトークン) を返し、最後のページでは次のトークンが None になります。
+        範囲はエポック分 (jst_time.py)、updated_min は RFC 3339 の文字列で指定します。
+        """
+        while True:
+            params = dict(calendarId=self.calendar_id, singleEvents=True, maxResults=page_size)
+            if start_epoch_minute is not None:
+                params['timeMin'] = rfc3339_utc(start_epoch_minute)
+            if end_epoch_minute is not None:
+                params['timeMax'] = rfc3339_utc(end_epoch_minute)
+            if updated_min is not None:
+                params['updatedMin'] = updated_min  # 変更分だけを読む時は並び順を指定しない
+            else:
+                params['orderBy'] = 'startTime'
+            if show_deleted:
+                params['showDeleted'] = True    # キャンセルされた予定も status='cancelled' として返す
+            if page_token:
+                params['pageToken'] = page_token
+            result = self._execute(self.service.events().list(**params), num_retries=num_retries)
+            page_token = result.get('nextPageToken')
+            yield result.get('items', []), page_token
+            if not page_token:
+                return
+
+    def list_events(self, start_epoch_minute, end_epoch_minute, show_deleted=False, updated_min=None):
+        """範囲内の予定を (ページをまたいで) すべて返す"""
+        events = []
+        for items, _ in self.iter_event_pages(start_epoch_minute, end_epoch_minute,
+                                              show_deleted=show_deleted, updated_min=updated_min):
+            events.extend(items)
+        return events
+
+    def insert_event(self, body):
+        """予定を1件登録し、登録された予定を返す"""
+        return self._execute(self.service.events().insert(calendarId=self.calendar_id, body=body))
+
+
+def log_breaker_transition(name, old_state, new_state):
+    """ブレーカーの状態が変わったことをログに残す"""
+    print(f"◆◆◆ サーキットブレーカー [{name}]: {old_state} → {new_state} ◆◆◆")
+
+
+def breaker_from_env(name='google-calendar'):
+    """.env の設定でサーキットブレーカーを作る"""
+    return CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5')), # 何回続けて失敗したら遮断するか
+        reset_timeout=float(os.getenv('BREAKER_RESET_SECONDS', '30')),      # 遮断してから再び試すまでの秒数
+        failure_exceptions=CALENDAR_ERRORS,
+        on_transition=log_breaker_transition,
+    )
+
+
+def build_calendar_service(credentials, timeout_seconds):
+    """
+    タイムアウト付きの通信オブジェクトで Calendar API のサービスを作る (応答がない時に待ち続けないように)。
+    httplib2.Http は複数のスレッドから同時に使えないため、通信オブジェクトはスレッドごとに作り、
+    認証情報 (credentials) とサービスだけを全スレッドで共有します。
+    """
+    local = threading.local()
+
+    def thread_http():
+        if not hasattr(local, 'http'):
+            local.http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout_seconds))
+        return local.http
+
+    def build_request(http, *args, **kwargs):
+        # build() が覚えている http ではなく、呼び出したスレッドの http で送る
+        return HttpRequest(thread_http(), *args, **kwargs)
+
+    return build('calendar', 'v3', http=thread_http(), requestBuilder=build_request, cache_discovery=False)
+
+
+_clients = {}
+_services = {}                  # (方法, 鍵ファイル, スコープ, タイムアウト) -> Calendar API のサービス (全店舗で共有)
+_clients_lock = threading.Lock()
+_services_lock = threading.Lock()
+
+
+def get_calendar_client(scopes=SCOPES_READ_WRITE):
+    """
+    .env の設定からカレンダーのクライアントを作る。作るのはプロセスで一度だけで、以降は同じものを返します。
+    設定の不足や認証の失敗で作れなかった場合は None を返します (その結果も覚えておきます)。
+
+    使う設定: CALENDAR_BACKEND ('google' または 'fake')、CALENDAR_ID、SERVICE_ACCOUNT_FILE
+    (なければ OAuth の token.json)、CALENDAR_API_TIMEOUT_SECONDS、BREAKER_FAILURE_THRESHOLD、BREAKER_RESET_SECONDS
+    """
+    key = tuple(scopes)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = create_calendar_client(
+                os.getenv('CALENDAR_BACKEND', 'google'),
+                os.getenv('CALENDAR_ID'),
+                os.getenv('SERVICE_ACCOUNT_FILE'),
+                scopes,
+            )
+        return _clients[key]
+
+
+def create_calendar_client(backend, calendar_id, service_account_file=None, scopes=SCOPES_READ_WRITE,
+                           timeout_seconds=None, breaker_name='google-calendar'):
+    """
+    指定したカレンダーのクライアントを作る (複数の店舗で使う場合は店舗ごとに呼びます)。
+    Calendar API のサービスと認証情報は同じ鍵ファイルを使うクライアントの間で共有し (通信はスレッドごと)、
+    サーキットブレーカーはクライアントごとに持ちます (1つのカレンダーの不調が他に広がらないように)。
+    作れなかった場合は None を返します。
+    """
+    backend = (backend or 'google').lower()
+    if timeout_seconds is None:
+        timeout_seconds = float(os.getenv('CALENDAR_API_TIMEOUT_SECONDS', '5'))
+
+    if backend == 'fake':
+        service = _shared_service(('fake',), _create_fake_service)
+        return CalendarClient(service, calendar_id or 'fake', breaker_from_env(breaker_name), backend='fake')
+
+    if service_account_file and not calendar_id:
+        # サービスアカウントには「自分のカレンダー」がないので、CALENDAR_ID が必須です
+        print("◆◆◆ エラー: .envファイルに CALENDAR_ID が設定されていません。 ◆◆◆")
+        return None
+
+    try:
+        if service_account_file:
+            key = ('service_account', os.path.abspath(service_account_file), tuple(scopes), timeout_seconds)
+            creds_loader = lambda: load_service_account_credentials(service_account_file, scopes)
+        else:
+            key = ('env', None, tuple(scopes), timeout_seconds)
+            creds_loader = lambda: load_credentials_from_env(scopes)
+        service = _shared_service(key, lambda: build_calendar_service(creds_loader(), timeout_seconds))
+    except FileNotFoundError as error:
+        print(f"◆◆◆ エラー: 認証ファイル '{error.filename}' が見つかりません。◆◆◆")
+        print("   .envファイルの設定と、ファイルの配置場所を確認してください。")
+        return None
+    except Exception as e:
+        print(f"◆◆◆ Google Calendar API の認証中に予期せぬエラーが発生しました: {e} ◆◆◆")
+        return None
+
+    # OAuth (自分のアカウント) の場合、CALENDAR_ID がなければメインのカレンダーを使います
+    return CalendarClient(service, calendar_id or 'primary', breaker_from_env(breaker_name))
+
+
+def _shared_service(key, factory):
+    with _services_lock:
+        if key not in _services:
+            _services[key] = factory()
+            if key[0] == 'fake':
+                print("★★★ 偽物のカレンダー (CALENDAR_BACKEND=fake) を使用します ★★★")
+            else:
+                print("★★★ Google Calendar API の認証成功 ★★★")
+        return _services[key]
+
+
+def _create_fake_service():
+    from .fake_calendar import FakeCalendarService
+    return FakeCalendarService(
+        failure_rate=float(os.getenv('FAKE_CALENDAR_FAILURE_RATE', '0')),
+        latency_seconds=float(os.getenv('FAKE_CALENDAR_LATENCY_MS', '0')) / 1000,
+        failure_mode=os.getenv('FAKE_CALENDAR_FAILURE_MODE', 'error'),
+    )
@@ -0,0 +1,70 @@
+# credentials.py (Google の認証情報の読み込み - 一度読んだらプロセス内で使い回します)
+#
+# 認証の方法は2通りです。
+#   1. サービスアカウント (.env の SERVICE_ACCOUNT_FILE) … 予約フォーム (app.py) など、サーバーで動かす場合
+#   2. OAuth (token.json / credentials.json) … 手元のパソコンで自分のカレンダーを見るスクリプトの場合
+#      初回だけブラウザで認証し、以降は token.json を使います。
+
+import os
+import threading
+
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+
+SCOPES_READ_WRITE = ('https://www.googleapis.com/auth/calendar',)
+SCOPES_READ_ONLY = ('https://www.googleapis.com/auth/calendar.readonly',)
+
+_cache = {}                 # (方法, ファイル, スコープ) -> 認証情報
+_lock = threading.Lock()
+
+
+def load_service_account_credentials(service_account_file, scopes=SCOPES_READ_WRITE):
+    """サービスアカウントの鍵ファイルから認証情報を作る (ファイルが見つからなければ FileNotFoundError)"""
+    key = ('service_account', os.path.abspath(service_account_file), tuple(scopes))
+    with _lock:
+        if key not in _cache:
+            _cache[key] = service_account.Credentials.from_service_account_file(
+                service_account_file, scopes=list(scopes))
+        return _cache[key]
+
+
+def load_oauth_credentials(token_file='token.json', client_secrets_file='credentials.json', scopes=SCOPES_READ_WRITE):
+    """
+    OAuth の認証情報を読み込む。token.json が無い・期限切れで更新できない場合は、
+    credentials.json を使ってブラウザでの認証を始め、結果を token.json に保存します。
+    """
+    key = ('oauth', os.path.abspath(token_file), tuple(scopes))
+    with _lock:
+        creds = _cache.get(key)
+        if creds is None and os.path.exists(token_file):
+            from google.oauth2.credentials import Credentials
+            creds = Credentials.from_authorized_user_file(token_file, list(scopes))
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                from google_auth_oauthlib.flow import InstalledAppFlow
+                flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, list(scopes))
+                creds = flow.run_local_server(port=0) # ブラウザが起動して認証画面が出ます
+            # 次回のために、認証情報を token.json に保存します。
+            with open(token_file, 'w') as token:
+                token.write(creds.to_json())
+
+        _cache[key] = creds
+        return creds
+
+
+def load_credentials_from_env(scopes=SCOPES_READ_WRITE):
+    """
+    .env の設定に従って認証情報を読み込む。
+    SERVICE_ACCOUNT_FILE があればサービスアカウント、なければ OAuth (OAUTH_TOKEN_FILE / OAUTH_CLIENT_SECRETS_FILE) を使います。
+    """
+    service_account_file = os.getenv('SERVICE_ACCOUNT_FILE')
+    if service_account_file:
+        return load_service_account_credentials(service_account_file, scopes)
+    return load_oauth_credentials(
+        os.getenv('OAUTH_TOKEN_FILE', 'token.json'),
+        os.getenv('OAUTH_CLIENT_SECRETS_FILE', 'credentials.json'),
+        scopes,
+    )
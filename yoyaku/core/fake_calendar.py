@@ -0,0 +1,160 @@
+# fake_calendar.py (動作確認用のGoogleカレンダーの偽物 - 障害を意図的に起こせます)
+#
+# googleapiclient の service.events().list(...).execute() / insert(...).execute() と
+# 同じ呼び出し方ができるので、CALENDAR_BACKEND=fake で本物と差し替えられます (core/calendar_client.py)。
+
+import datetime
+import itertools
+import json
+import random
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+def _parse_rfc3339(value):
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _event_time(time_dict):
+    """{'dateTime': ..., 'timeZone': ...} をタイムゾーン付きの datetime にする"""
+    value = datetime.datetime.fromisoformat(time_dict['dateTime'].replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=ZoneInfo(time_dict.get('timeZone') or 'UTC'))
+    return value
+
+
+class _FakeRequest:
+    """googleapiclient の HttpRequest の代わり。execute() で初めて処理が走ります"""
+
+    def __init__(self, calendar, handler):
+        self._calendar = calendar
+        self._handler = handler
+
+    def execute(self, num_retries=0):
+        self._calendar._inject_faults()
+        return self._handler()
+
+
+class _FakeEvents:
+    def __init__(self, calendar):
+        self._calendar = calendar
+
+    def list(self, calendarId, timeMin=None, timeMax=None, singleEvents=True, orderBy=None,
+             pageToken=None, maxResults=250, updatedMin=None, showDeleted=False, **kwargs):
+        return _FakeRequest(self._calendar, lambda: self._calendar._list(
+            calendarId, timeMin, timeMax, pageToken, maxResults, updatedMin, showDeleted))
+
+    def insert(self, calendarId, body, **kwargs):
+        return _FakeRequest(self._calendar, lambda: self._calendar._insert(calendarId, body))
+
+    def delete(self, calendarId, eventId, **kwargs):
+        return _FakeRequest(self._calendar, lambda: self._calendar._delete(calendarId, eventId))
+
+
+class FakeCalendarService:
+    """
+    メモリ上に予定を持つカレンダーの偽物。
+    failure_rate (0～1) の確率、または fail_next() で指定した回数だけ、
+    HttpError (503) やタイムアウトを起こせます。latency_seconds で応答を遅らせることもできます。
+    """
+
+    def __init__(self, failure_rate=0.0, latency_seconds=0.0, failure_mode='error', seed=None):
+        self.failure_rate = failure_rate
+        self.latency_seconds = latency_seconds
+        self.failure_mode = failure_mode   # 'error' (HttpError 503) または 'timeout' (TimeoutError)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._events = {}                  # (カレンダーID, 予定ID) -> 予定
+        self._ids = itertools.count(1)
+        self._forced_failures = 0
+        self.calls = 0
+
+    def events(self):
+        return _FakeEvents(self)
+
+    # --- 障害を起こす設定 ---
+
+    def fail_next(self, count, mode=None):
+        """次の count 回の呼び出しを必ず失敗させる"""
+        with self._lock:
+            self._forced_failures = count
+            if mode:
+                self.failure_mode = mode
+
+    def _inject_faults(self):
+        with self._lock:
+            self.calls += 1
+            forced = self._forced_failures > 0
+            if forced:
+                self._forced_failures -= 1
+            fail = forced or (self.failure_rate > 0 and self._random.random() < self.failure_rate)
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if not fail:
+            return
+        if self.failure_mode == 'timeout':
+            raise TimeoutError("fake calendar: timed out")
+        raise HttpError(httplib2.Response({'status': 503}), b'{"error": {"message": "fake calendar: backend error"}}')
+
+    # --- 予定の読み書き ---
+
+    def add_event(self, calendar_id, start, end, description=None, summary='', event_id=None):
+        """テスト用に予定を直接追加する (start/end はタイムゾーン付きの datetime)"""
+        body = {
+            'summary': summary,
+            'description': description if isinstance(description, str) else json.dumps(description or {}, ensure_ascii=False),
+            'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': end.isoformat()},
+        }
+        return self._insert(calendar_id, body, event_id=event_id)
+
+    def _insert(self, calendar_id, body, event_id=None):
+        with self._lock:
+            event_id = event_id or f"fake{next(self._ids)}"
+            now = datetime.datetime.now(datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
+            event = dict(body, id=event_id, status='confirmed', created=now, updated=now,
+                         htmlLink=f"https://calendar.example/{event_id}")
+            event['start'] = {'dateTime': _event_time(body['start']).isoformat()}
+            event['end'] = {'dateTime': _event_time(body['end']).isoformat()}
+            self._events[(calendar_id, event_id)] = event
+            return dict(event)
+
+    def _delete(self, calendar_id, event_id):
+        with self._lock:
+            event = self._events.get((calendar_id, event_id))
+            if event is None or event['status'] == 'cancelled':
+                raise HttpError(httplib2.Response({'status': 404}), b'{"error": {"message": "Not Found"}}')
+            event['status'] = 'cancelled'
+            event['updated'] = datetime.datetime.now(datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
+            return ''
+
+    def _list(self, calendar_id, time_min, time_max, page_token, max_results, updated_min, show_deleted):
+        time_min = _parse_rfc3339(time_min) if time_min else None
+        time_max = _parse_rfc3339(time_max) if time_max else None
+        updated_min = _parse_rfc3339(updated_min) if updated_min else None
+        with self._lock:
+            matched = []
+            for (event_calendar_id, _), event in self._events.items():
+                if event_calendar_id != calendar_id:
+                    continue
+                if event['status'] == 'cancelled' and not show_deleted:
+                    continue
+                if updated_min and _parse_rfc3339(event['updated']) < updated_min:
+                    continue
+                start = _event_time(event['start'])
+                end = _event_time(event['end'])
+                if (time_max and start >= time_max) or (time_min and end <= time_min):
+                    continue
+                matched.append((start, event['id'], dict(event)))
+        matched.sort(key=lambda item: (item[0], item[1]))
+
+        offset = int(page_token or 0)
+        page = [event for _, _, event in matched[offset:offset + max_results]]
+        result = {'items': page}
+        if offset + max_results < len(matched):
+            result['nextPageToken'] = str(offset + max_results)
+        return result
@@ -0,0 +1,82 @@
+# jst_time.py (日本時間の扱いをまとめたモジュール - 空席計算は「エポック分」の整数で行います)
+#
+# エポック分 = 1970-01-01 00:00 UTC からの経過分数。タイムゾーンに関係なく同じ瞬間は同じ整数になるので、
+# カレンダーの予定がどのタイムゾーンで登録されていても、そのまま足し引き・大小比較ができます。
+
+import datetime
+import time
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+JST = ZoneInfo('Asia/Tokyo')
+
+
+def jst_today():
+    """サーバーの設定に関係なく、日本時間での「今日」を返す"""
+    return datetime.datetime.now(JST).date()
+
+
+def epoch_minute(dt):
+    """タイムゾーン付きの datetime をエポック分にする"""
+    return int(dt.timestamp()) // 60
+
+
+@lru_cache(maxsize=1024)
+def day_start_epoch_minute(date_str):
+    """日付 ("YYYY-MM-DD") の日本時間0時をエポック分で返す"""
+    date_obj = datetime.date.fromisoformat(date_str)
+    return epoch_minute(datetime.datetime(date_obj.year, date_obj.month, date_obj.day, tzinfo=JST))
+
+
+def jst_epoch_minute(date_str, minute_of_day):
+    """日付と、その日の0時からの分数 (日本時間) をエポック分にする"""
+    # 日本には夏時間がないので、0時に分数を足すだけで正しい時刻になります
+    return day_start_epoch_minute(date_str) + minute_of_day
+
+
+@lru_cache(maxsize=1024)
+def slot_bounds(date_str, slot_minutes, duration_minutes):
+    """その日の各時間枠の (開始, 終了) をエポック分で返す。日付ごとに一度だけ計算します"""
+    day_start = day_start_epoch_minute(date_str)
+    return tuple((day_start + minute, day_start + minute + duration_minutes) for minute in slot_minutes)
+
+
+def jst_date_str(epoch_min):
+    """エポック分が日本時間で何日に当たるかを "YYYY-MM-DD" で返す"""
+    return datetime.datetime.fromtimestamp(epoch_min * 60, JST).date().isoformat()
+
+
+def jst_datetime(epoch_min):
+    """エポック分を日本時間の datetime に戻す (カレンダーへの登録や表示用)"""
+    return datetime.datetime.fromtimestamp(epoch_min * 60, JST)
+
+
+def rfc3339_utc(epoch_min):
+    """エポック分を Calendar API の timeMin / timeMax に使える UTC の文字列にする"""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch_min * 60))
+
+
+def parse_event_time(time_dict):
+    """
+    予定の start / end ({'dateTime': ..., 'timeZone': ...}) をエポック分にする。
+    dateTime にオフセットがなければ timeZone (なければ日本時間) として扱います。終日予定などは None。
+    """
+    try:
+        value = datetime.datetime.fromisoformat(time_dict['dateTime'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if value.tzinfo is None:
+        try:
+            value = value.replace(tzinfo=ZoneInfo(time_dict.get('timeZone') or 'Asia/Tokyo'))
+        except (ValueError, ZoneInfoNotFoundError):
+            return None
+    return epoch_minute(value)
+
+
+def event_epoch_minutes(event):
+    """予定の (開始, 終了) をエポック分で返す (時刻のない予定は None)"""
+    start = parse_event_time(event.get('start'))
+    end = parse_event_time(event.get('end'))
+    if start is None or end is None:
+        return None
+    return start, end
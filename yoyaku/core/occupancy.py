@@ -0,0 +1,306 @@
+# occupancy.py (プロセス内の空席状況ボード - 予約の使用席数の集計とリアルタイム配信用)
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from .jst_time import event_epoch_minutes, jst_date_str, slot_bounds
+from .seat_policy import COUNTER, TABLE
+
+
+def parse_reservation_usage(event):
+    """カレンダーの予定1件から (使用カウンター席数, 使用テーブル卓数) を取り出す。予約でなければ None"""
+    try:
+        details = json.loads(event.get('description') or '{}')
+        seat_type = details.get('seat_type')
+        if seat_type == COUNTER:
+            return int(details.get('seats_used', 0)), 0
+        if seat_type == TABLE:
+            return 0, int(details.get('tables_used', 0))
+    except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def count_usage(events):
+    """予定一覧の (使用カウンター席数の合計, 使用テーブル卓数の合計, 予約情報のない予定の数) を返す"""
+    used_counter = used_tables = ignored = 0
+    for event in events:
+        usage = parse_reservation_usage(event)
+        if usage is None:
+            ignored += 1
+            continue
+        used_counter += usage[0]
+        used_tables += usage[1]
+    return used_counter, used_tables, ignored
+
+
+def _add_window(windows, start, end, read_at):
+    """読んだ範囲の一覧に [start, end) を加える (重なる部分は新しく読んだ時刻で置き換える)"""
+    kept = []
+    for old_start, old_end, old_read_at in windows:
+        if old_end <= start or old_start >= end:
+            kept.append((old_start, old_end, old_read_at))
+            continue
+        if old_start < start:
+            kept.append((old_start, start, old_read_at))
+        if old_end > end:
+            kept.append((end, old_end, old_read_at))
+    kept.append((start, end, read_at))
+    windows[:] = sorted(kept)
+
+
+def _covered_since(windows, start, end):
+    """[start, end) がすべて読んだ範囲に含まれていれば、その中で一番古く読んだ時刻を返す (足りなければ None)"""
+    position = start
+    oldest = None
+    for window_start, window_end, read_at in windows: # 開始の順に並んでいて、重なりはない
+        if window_end <= position:
+            continue
+        if window_start > position:
+            return None
+        oldest = read_at if oldest is None else min(oldest, read_at)
+        position = window_end
+        if position >= end:
+            return oldest
+    return None
+
+
+class _DayState:
+    """1日分の予約一覧と、その変化を待つ接続のための Condition"""
+
+    def __init__(self, lock):
+        self.bookings = {}          # 予約ID -> (開始, 終了 (エポック分), カウンター席数, テーブル卓数)
+        self.version = 0            # 予約一覧が変わるたびに付け直す番号 (ボード全体で重ならない。SSE の id)
+        self.payload = None         # 最新の配信データ (SSE形式のバイト列、全接続で共有)
+        self.loading = False        # 1日分をカレンダーから読み込んでいる最中かどうか
+        self.windows = []           # カレンダーから読んだ範囲 [(開始, 終了 (エポック分), 読んだ時刻 (time.monotonic)), ...]
+        self.subscribers = 0        # この日を配信中の SSE 接続の数 (配信中の日は追い出さない)
+        self.changed = threading.Condition(lock)
+
+
+class OccupancyBoard:
+    """
+    このプロセスが把握している予約を日付ごとに持ち、時間枠ごとの空席数を計算するボード。
+    calculate_vacancy() (vacancy.py) で読んだ予定や、予約フォームで登録した予約がここに反映され、
+    変化があると待っている全ての SSE 接続に同じ配信データを一度だけ作って渡します。
+    時刻はすべてエポック分 (jst_time.py) の整数で扱います。
+    予約が消えたり減ったりした時は on_release(日付, [(開始, 終了, 席数, 卓数), ...]) を呼びます (キャンセル待ち用)。
+    max_dates を指定すると、覚えておく日付の数をその数までにし、一番長く使われていない日付から忘れます
+    (subscribe() で配信中の日付は、unsubscribe() されるまで忘れません)。
+    配信データの id はボード全体で数える番号なので、忘れた日付を作り直しても前の id と重なりません。
+    """
+
+    def __init__(self, total_counter_seats, total_table_units, slot_minutes, summarize_slot,
+                 duration_minutes=120, on_release=None, max_dates=None):
+        self.total_counter_seats = total_counter_seats
+        self.total_table_units = total_table_units
+        self.slot_minutes = tuple(slot_minutes)   # 各時間枠の開始 (日本時間の0時からの分数)
+        self.summarize_slot = summarize_slot      # (空きカウンター, 空きテーブル) -> 配信する dict
+        self.duration_minutes = duration_minutes
+        self.on_release = on_release
+        self.max_dates = max_dates
+        self._lock = threading.Lock()
+        self._days = OrderedDict()  # 日付 -> _DayState (最近使った日付ほど後ろ)
+        self._last_version = 0      # 最後に付けた配信データの番号 (全ての日付で共通)
+
+    def _day(self, date_str):
+        # ロックを持った状態で呼ぶこと
+        day = self._days.get(date_str)
+        if day is None:
+            day = self._days[date_str] = _DayState(self._lock)
+            if self.max_dates is not None and len(self._days) > self.max_dates:
+                self._evict()
+        else:
+            self._days.move_to_end(date_str)
+        return day
+
+    def _evict(self):
+        # ロックを持った状態で呼ぶこと。配信中でない日付を、使われていない順に忘れる (今作った日付は残す)
+        for date_str in list(self._days)[:-1]:
+            if len(self._days) <= self.max_dates:
+                return
+            if self._days[date_str].subscribers == 0:
+                del self._days[date_str]
+
+    def subscribe(self, date_str):
+        """SSE 接続の開始時に呼ぶ。unsubscribe() するまで、その日付をボードから忘れないようにする"""
+        with self._lock:
+            self._day(date_str).subscribers += 1
+
+    def unsubscribe(self, date_str):
+        """SSE 接続の終了時に呼ぶ (subscribe() と同じ回数だけ)"""
+        with self._lock:
+            self._days[date_str].subscribers -= 1
+            if self.max_dates is not None and len(self._days) > self.max_dates:
+                self._evict()
+
+    def date_count(self):
+        """覚えている日付の数"""
+        with self._lock:
+            return len(self._days)
+
+    def claim_day_load(self, date_str, window_start, window_end, max_age_seconds):
+        """
+        その日の [window_start, window_end) を読み込む役目を1つの呼び出し元だけに割り当てる。
+        その範囲をまだ読んでいないか、読んでから max_age_seconds 秒以上たっていれば True を返します
+        (このプロセスの外で変わった予約 (カレンダーで直接キャンセルされたものなど) を取り込むため)。
+        True を受け取った呼び出し元は、読み込みの成否にかかわらず release_day_load() を呼んでください。
+        """
+        with self._lock:
+            day = self._day(date_str)
+            if day.loading:
+                return False
+            read_at = _covered_since(day.windows, window_start, window_end)
+            if read_at is not None and time.monotonic() - read_at < max_age_seconds:
+                return False
+            day.loading = True
+            return True
+
+    def release_day_load(self, date_str):
+        """読み込みが終わった (または失敗した) 時に印を戻す。失敗していれば次の呼び出しで再挑戦します"""
+        with self._lock:
+            self._day(date_str).loading = False
+
+    def record_window(self, date_str, window_start, window_end, events):
+        """
+        [window_start, window_end) (エポック分) の範囲で取得した予定一覧を反映する。
+        範囲内にあったはずなのに今回返ってこなかった予約は、キャンセルされたものとして消します。
+        """
+        fresh = {}
+        for event in events:
+            usage = parse_reservation_usage(event)
+            minutes = event_epoch_minutes(event)
+            if usage is None or minutes is None:
+                continue
+            fresh[event.get('id') or f"{minutes}:{usage}"] = (minutes[0], minutes[1], usage[0], usage[1])
+
+        with self._lock:
+            day = self._day(date_str)
+            _add_window(day.windows, window_start, window_end, time.monotonic())
+            bookings = {
+                booking_id: booking for booking_id, booking in day.bookings.items()
+                if booking[1] <= window_start or booking[0] >= window_end
+            }
+            bookings.update(fresh)
+            released = [booking for booking_id, booking in day.bookings.items() if bookings.get(booking_id) != booking]
+            if bookings != day.bookings:
+                day.bookings = bookings
+                self._publish(date_str, day)
+        self._notify_release({date_str: released} if released else {})
+
+    def apply_changes(self, events):
+        """
+        変更があった予定だけ (updatedMin と showDeleted で読んだもの) を反映する。
+        キャンセルされた予定は日付が分からないこともあるため、予約IDで全ての日から探して消します。
+        変化があった日付の一覧を返します。
+        """
+        changed_dates = set()
+        released = {}
+        with self._lock:
+            for event in events:
+                booking_id = event.get('id')
+                booking = new_date = None
+                if event.get('status') != 'cancelled':
+                    usage = parse_reservation_usage(event)
+                    minutes = event_epoch_minutes(event)
+                    if usage is not None and minutes is not None:
+                        booking = (minutes[0], minutes[1], usage[0], usage[1])
+                        new_date = jst_date_str(minutes[0])
+                for date_str, day in self._days.items():
+                    old = day.bookings.get(booking_id)
+                    if old is not None and (old != booking or date_str != new_date):
+                        del day.bookings[booking_id]
+                        changed_dates.add(date_str)
+                        released.setdefault(date_str, []).append(old)
+                if booking is not None:
+                    day = self._day(new_date)
+                    if day.bookings.get(booking_id) != booking:
+                        day.bookings[booking_id] = booking
+                        changed_dates.add(new_date)
+            for date_str in changed_dates:
+                if date_str in self._days: # 反映の途中で追い出された日付は配信しない
+                    self._publish(date_str, self._days[date_str])
+        self._notify_release(released)
+        return sorted(changed_dates)
+
+    def _notify_release(self, released):
+        # ロックを外してから呼ぶこと (on_release の中でボードを読めるように)
+        if self.on_release is None:
+            return
+        for date_str, bookings in released.items():
+            self.on_release(date_str, bookings)
+
+    def record_booking(self, date_str, booking_id, start_minute, end_minute, seats_used, tables_used):
+        """新しく登録した予約を1件反映する"""
+        with self._lock:
+            day = self._day(date_str)
+            day.bookings[booking_id] = (start_minute, end_minute, seats_used, tables_used)
+            self._publish(date_str, day)
+
+    def availability(self, date_str):
+        """時間枠ごと (0時からの分数) の (空きカウンター席数, 空きテーブル卓数) を返す"""
+        with self._lock:
+            return self._availability(date_str, self._day(date_str))
+
+    def window_availability(self, date_str, window_start, window_end):
+        """
+        カレンダーに問い合わせられない時のために、このボードが覚えている予約だけで
+        [window_start, window_end) の空きを計算する。
+        (空きカウンター席数, 空きテーブル卓数, その範囲をカレンダーから読んでからの秒数 (一番古い部分)) を返し、
+        範囲の一部でもカレンダーから読んでいなければ None を返します (知らない予約があるかもしれないため)。
+        """
+        with self._lock:
+            day = self._days.get(date_str)
+            read_at = _covered_since(day.windows, window_start, window_end) if day is not None else None
+            if read_at is None:
+                return None
+            used_counter = used_tables = 0
+            for start, end, seats, tables in day.bookings.values():
+                if start < window_end and end > window_start:
+                    used_counter += seats
+                    used_tables += tables
+            return (self.total_counter_seats - used_counter,
+                    self.total_table_units - used_tables,
+                    time.monotonic() - read_at)
+
+    def _availability(self, date_str, day):
+        slots = {}
+        bookings = day.bookings.values()
+        bounds = slot_bounds(date_str, self.slot_minutes, self.duration_minutes)
+        for minute_of_day, (slot_start, slot_end) in zip(self.slot_minutes, bounds):
+            used_counter = used_tables = 0
+            for start, end, seats, tables in bookings:
+                if start < slot_end and end > slot_start:
+                    used_counter += seats
+                    used_tables += tables
+            slots[minute_of_day] = (self.total_counter_seats - used_counter, self.total_table_units - used_tables)
+        return slots
+
+    def _publish(self, date_str, day):
+        # ロックを持った状態で呼ぶこと
+        self._last_version += 1
+        day.version = self._last_version
+        slots = {
+            f"{minute // 60:02d}:{minute % 60:02d}": self.summarize_slot(free_counter, free_tables)
+            for minute, (free_counter, free_tables) in self._availability(date_str, day).items()
+        }
+        data = json.dumps({'date': date_str, 'slots': slots}, ensure_ascii=False, separators=(',', ':'))
+        day.payload = f"id: {day.version}\ndata: {data}\n\n".encode('utf-8')
+        day.changed.notify_all()
+
+    def wait_for_update(self, date_str, last_version, timeout):
+        """
+        last_version より新しい配信データができるまで待つ。
+        (新しい版数, 配信データ) を返し、timeout までに変化がなければ配信データは None です。
+        """
+        with self._lock:
+            day = self._day(date_str)
+            if day.payload is None:
+                self._publish(date_str, day)
+            if day.version == last_version:
+                day.changed.wait(timeout)
+            if day.version == last_version:
+                return last_version, None
+            return day.version, day.payload
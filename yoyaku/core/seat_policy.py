@@ -0,0 +1,75 @@
+# seat_policy.py (席タイプと人数のルール - 予約フォーム・空席チェックのツール・スクリプトで共通)
+
+COUNTER = 'カウンター'
+TABLE = 'テーブル'
+
+# --- 席タイプごとの人数ルール ---
+# 席タイプ: (最小人数, 最大人数, 最小未満のメッセージ, 最大超過のメッセージ, 人数 -> 使用数)
+SEAT_RULES = {
+    COUNTER: (
+        1, 4,
+        "{name}様、申し訳ありません。カウンター席は1～4名様でのご案内でございます。",
+        "{name}様、申し訳ありません。カウンター席は1～4名様でのご案内でございます。",
+        lambda guests: guests,                   # 1名 = 1席
+    ),
+    TABLE: (
+        3, 8,
+        "{name}様、申し訳ありません。テーブル席は3名様からのご案内でございます。",
+        "{name}様、申し訳ありません。テーブル席では8名様を超えるご予約はお受けできません。9名様以上はお電話にてご相談ください。",
+        lambda guests: 1 if guests <= 4 else 2,  # 4名までは1卓、5名以上は2卓
+    ),
+}
+
+# ご予約後も必ず空けておく数 (カウンターは予約後に5席以上残る場合のみ受付)。店舗ごとに変える場合は
+# 下の関数の reserved_units に同じ形の dict を渡します
+RESERVED_UNITS = {COUNTER: 5, TABLE: 0}
+
+# check_availability() の結果
+AVAILABLE = 'available'       # ご予約可能
+FULL = 'full'                 # 人数分の空きはあるが、残しておく席数を割ってしまう (カウンターのみ)
+NOT_ENOUGH = 'not_enough'     # 人数分の空きがない
+
+
+def party_size_error(seat_type, guests):
+    """席タイプと人数の組み合わせがルール外なら、その理由のメッセージ (書式 {name} 付き) を返す"""
+    rule = SEAT_RULES.get(seat_type)
+    if rule is None:
+        return "{name}様、ご希望の席タイプを正しくお選びください。"
+    min_guests, max_guests, below_message, above_message, _ = rule
+    if guests < min_guests:
+        return below_message
+    if guests > max_guests:
+        return above_message
+    return None
+
+
+def units_for(seat_type, guests):
+    """その人数で使う数 (カウンターは席数、テーブルは卓数) を返す"""
+    return SEAT_RULES[seat_type][4](guests)
+
+
+def usage_for(seat_type, guests):
+    """その人数で使う (カウンター席数, テーブル卓数) を返す"""
+    units = units_for(seat_type, guests)
+    return (units, 0) if seat_type == COUNTER else (0, units)
+
+
+def check_availability(seat_type, guests, free_counter_seats, free_table_units, reserved_units=RESERVED_UNITS):
+    """空き状況から、その席タイプ・人数で予約できるかを AVAILABLE / FULL / NOT_ENOUGH で返す"""
+    free_units = free_counter_seats if seat_type == COUNTER else free_table_units
+    needed = units_for(seat_type, guests)
+    if free_units < needed:
+        return NOT_ENOUGH
+    if free_units - needed < reserved_units[seat_type]:
+        return FULL
+    return AVAILABLE
+
+
+def max_party_size(seat_type, free_units, reserved_units=RESERVED_UNITS):
+    """空き (カウンター席数 / テーブル卓数) から、その席タイプで受け付けられる最大人数を返す (不可なら0)"""
+    min_guests, max_guests, _, _, units_for_guests = SEAT_RULES[seat_type]
+    reserved = reserved_units[seat_type]
+    for guests in range(max_guests, min_guests - 1, -1):
+        if units_for_guests(guests) + reserved <= free_units:
+            return guests
+    return 0
@@ -0,0 +1,83 @@
+# vacancy.py (空席状況の計算 - 予約フォームと空席チェックのツールで共通)
+
+from .breaker import CircuitOpenError
+from .calendar_client import CALENDAR_ERRORS
+from .jst_time import jst_date_str, jst_datetime
+from .occupancy import count_usage
+
+
+class StalePolicy:
+    """カレンダーを読めない時に、ボードの古い情報から空きを見積もる際の控えめさの設定"""
+
+    def __init__(self, counter_margin=2, table_margin=1, max_age_seconds=3600):
+        self.counter_margin = counter_margin      # 空きカウンター席数から差し引く数
+        self.table_margin = table_margin          # 空きテーブル卓数から差し引く数
+        self.max_age_seconds = max_age_seconds    # これより古い情報は使わない
+
+
+def fetch_events(calendar_client, start_epoch_minute, end_epoch_minute, board=None):
+    """
+    指定された範囲 (エポック分) にある予定を取得する関数。エラー時は None を返します。
+    board (OccupancyBoard) を渡すと、取得した予定をボードにも反映します。
+    """
+    if calendar_client is None: # 認証失敗などでクライアントが作れなかった場合の対策
+        print("◆◆◆ fetch_eventsエラー: Calendar APIサービスが利用できません。 ◆◆◆")
+        return None
+
+    try:
+        events = calendar_client.list_events(start_epoch_minute, end_epoch_minute)
+    except CircuitOpenError:
+        print('カレンダーへの問い合わせを省略しました (サーキットブレーカーが開いています)')
+        return None
+    except CALENDAR_ERRORS as error:
+        print(f'カレンダーからの予定取得中にエラー: {error}')
+        return None
+
+    if board is not None:
+        board.record_window(jst_date_str(start_epoch_minute), start_epoch_minute, end_epoch_minute, events)
+    return events
+
+
+def stale_vacancy(board, stale_policy, start_epoch_minute, end_epoch_minute):
+    """
+    カレンダーを読めなかった時に、ボードが覚えている最後の予約状況から空きを見積もる関数。
+    控えめに見積もるため、設定した数だけ空きを少なく数えます。使えない場合は (-1, -1) を返します。
+    """
+    snapshot = None
+    if board is not None and stale_policy is not None:
+        snapshot = board.window_availability(jst_date_str(start_epoch_minute), start_epoch_minute, end_epoch_minute)
+    if snapshot is None or snapshot[2] > stale_policy.max_age_seconds:
+        print("保存済みの空席状況がない (または古すぎる) ため、空きを見積もれませんでした。")
+        return -1, -1
+    free_counter, free_tables, age_seconds = snapshot
+    print(f"★ {age_seconds:.0f}秒前の空席状況から見積もります (カウンター -{stale_policy.counter_margin}席, テーブル -{stale_policy.table_margin}卓の余裕を見ます)")
+    return max(0, free_counter - stale_policy.counter_margin), max(0, free_tables - stale_policy.table_margin)
+
+
+def calculate_vacancy(calendar_client, start_epoch_minute, end_epoch_minute, total_counter_seats, total_table_units,
+                      board=None, stale_policy=None):
+    """
+    指定された範囲 (エポック分) の既存予約から、カウンターとテーブルの空き状況を計算する関数。
+    (空きカウンター席数, 空きテーブル卓数, 古い情報からの見積もりかどうか) を返します。
+    カレンダーを読めず、見積もりもできない場合の空きは -1, -1 です。
+    """
+    print(f"\n--- 空き状況計算開始 ({jst_datetime(start_epoch_minute).isoformat()}) ---")
+
+    events = fetch_events(calendar_client, start_epoch_minute, end_epoch_minute, board)
+    if events is None:
+        # カレンダーを読めない時は、最後に分かっている予約状況から見積もる (見積もれなければ -1, -1)
+        available_counter_seats, available_table_units = stale_vacancy(
+            board, stale_policy, start_epoch_minute, end_epoch_minute)
+        return available_counter_seats, available_table_units, True
+
+    # 説明欄の予約情報 (JSON) から使用中の席数・卓数を整数で足し合わせる
+    current_used_counter_seats, current_used_table_units, ignored_events = count_usage(events)
+    print(f"{len(events)}件の予定 (うち予約情報なし {ignored_events}件): 使用中のカウンター {current_used_counter_seats}席, テーブル {current_used_table_units}卓")
+
+    available_counter_seats = total_counter_seats - current_used_counter_seats
+    available_table_units = total_table_units - current_used_table_units
+
+    print(f"計算結果: 空きカウンター {available_counter_seats}席, 空きテーブル {available_table_units}卓")
+    print("--- 空き状況計算終了 ---")
+
+    return available_counter_seats, available_table_units, False
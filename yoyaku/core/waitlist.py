@@ -0,0 +1,307 @@
+# waitlist.py (キャンセル待ちの受付と、空いた席のご案内)
+#
+# 満席でお断りしたご予約のご希望を、日付・時間枠・席タイプ・人数ごとの索引に入れておきます。
+# OccupancyBoard が予約のキャンセル (空いた席) を見つけると match_released() が呼ばれ、
+# 空いた時間帯に関係する時間枠だけを調べて、今の空きに収まるご希望を選びます。
+# 人数の種類は数通りしかないので、1件のキャンセルで調べる量はキャンセル待ちの件数によらずほぼ一定です。
+# 選んだご希望は「ご案内中」として残し、お店の方が予約を確定する (confirm_offer) か、
+# お断り・連絡がつかないなどで取り下げる (release_offer) までその席を押さえておきます。
+#
+# 受付とご案内中の状態は SQLite (path、既定はメモリの中だけ) に書き、索引はその写しとして起動時に作り直します。
+# 予約フォームを複数のワーカー (プロセス) で動かす場合も、ご案内中の一覧・確定・取り下げ・件数は
+# 同じファイルを見るのでどのワーカーでも同じになります。照合は各ワーカーが自分の索引にあるご希望 (そのワーカーが
+# 受け付けた分と、起動時に読み込んだ分) について行い、同じご希望を2つのワーカーがご案内することはありません。
+
+import bisect
+import itertools
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+
+from .seat_policy import AVAILABLE, RESERVED_UNITS, SEAT_RULES, check_availability, usage_for
+
+WaitlistEntry = namedtuple('WaitlistEntry', 'entry_id date start_minute seat_type guests name phone created_at')
+
+
+class _SlotQueue:
+    """1つの (日付, 時間枠, 席タイプ) のキャンセル待ち。人数ごとに受付順の列を持ちます"""
+
+    def __init__(self, max_guests):
+        self.by_guests = [deque() for _ in range(max_guests + 1)]
+        self.count = 0
+
+
+class Waitlist:
+    """
+    キャンセル待ちの一覧。索引は (日付, 時間枠の開始 (エポック分), 席タイプ) -> 人数ごとの受付順の列 と、
+    日付ごとの時間枠の並び (空いた時間帯に重なる時間枠を二分探索で探すため) です。
+    取り消された受付は列から直接は消さず、取り出す時に読み飛ばします。
+    ご案内中のご希望は列から外し、SQLite の上だけで持ちます (その分の席は次の照合で空きから差し引きます)。
+    受付番号は SQLite が振るので、同じファイルを使う店舗・ワーカーの間で重なりません。
+    """
+
+    def __init__(self, duration_minutes=120, max_entries_per_slot=50, reserved_units=RESERVED_UNITS,
+                 path=':memory:', tenant_id=''):
+        self.duration_minutes = duration_minutes
+        self.max_entries_per_slot = max_entries_per_slot  # 1つの時間枠・席タイプで受け付ける件数の上限
+        self.reserved_units = reserved_units              # ご予約後も空けておく数 (seat_policy.py)
+        self.tenant_id = tenant_id                        # 1つのファイルを複数の店舗で使うための店舗ID
+        self._lock = threading.Lock()
+        self._queues = {}           # (日付, 開始, 席タイプ) -> _SlotQueue
+        self._slots_by_date = {}    # 日付 -> キャンセル待ちのある時間枠の開始 (昇順のリスト)
+        self._entries = {}          # 受付番号 -> WaitlistEntry (まだご案内していないもの)
+        self._customers = {}        # (日付, 開始, 席タイプ, お名前, 電話番号) -> 受付番号 (二重登録を防ぐ)
+        # リクエストのスレッドと変更確認のスレッドから使うので、読み書きはすべて _lock を持って行います
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS waitlist (
+                entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tenant_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                start_minute INTEGER NOT NULL,
+                seat_type TEXT NOT NULL,
+                guests INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                phone TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                offered_at REAL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS waitlist_by_date ON waitlist (tenant_id, date)")
+        # 照合のたびにその日のご案内中の分を読むので、ご案内中のものだけの索引も持つ (待ちの件数によらず速く読める)
+        self._db.execute("CREATE INDEX IF NOT EXISTS waitlist_offered ON waitlist (tenant_id, date)"
+                         " WHERE offered_at IS NOT NULL")
+        self._db.commit()
+        for entry, _ in self._select("offered_at IS NULL"): # 索引を作り直す (上限を超えていても受付済みの分は残す)
+            self._index(entry)
+
+    def _select(self, condition, params=()):
+        # この店舗の (WaitlistEntry, ご案内した時刻) を受付順に読む
+        rows = self._db.execute(
+            "SELECT entry_id, date, start_minute, seat_type, guests, name, phone, created_at, offered_at FROM waitlist"
+            f" WHERE tenant_id = ? AND {condition} ORDER BY entry_id", (self.tenant_id,) + tuple(params)).fetchall()
+        return [(WaitlistEntry(*row[:-1]), row[-1]) for row in rows]
+
+    def _index(self, entry):
+        # ロックを持った状態で呼ぶこと。まだご案内していないご希望を索引に入れる
+        key = (entry.date, entry.start_minute, entry.seat_type)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _SlotQueue(SEAT_RULES[entry.seat_type][1])
+            bisect.insort(self._slots_by_date.setdefault(entry.date, []), entry.start_minute)
+        queue.by_guests[entry.guests].append(entry.entry_id)
+        queue.count += 1
+        self._entries[entry.entry_id] = entry
+        self._customers[self._customer_key(entry)] = entry.entry_id
+
+    def add(self, date_str, start_minute, seat_type, guests, name, phone):
+        """
+        キャンセル待ちに登録し、その WaitlistEntry を返す。同じお客様の同じご希望は登録済みのものを返し、
+        その時間枠が上限に達している場合は None を返します。
+        """
+        customer_key = (date_str, start_minute, seat_type, name, phone)
+        with self._lock:
+            existing = self._customers.get(customer_key)
+            if existing is not None:
+                return self._entries[existing]
+            offered = self._select("offered_at IS NOT NULL AND date = ? AND start_minute = ? AND seat_type = ?"
+                                   " AND name = ? AND phone = ?", customer_key)
+            if offered:
+                return offered[0][0]
+            queue = self._queues.get((date_str, start_minute, seat_type))
+            if queue is not None and queue.count >= self.max_entries_per_slot:
+                return None
+            created_at = time.time()
+            with self._db:
+                entry_id = self._db.execute(
+                    "INSERT INTO waitlist (tenant_id, date, start_minute, seat_type, guests, name, phone, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.tenant_id, date_str, start_minute, seat_type, guests, name, phone, created_at)).lastrowid
+            entry = WaitlistEntry(entry_id, date_str, start_minute, seat_type, guests, name, phone, created_at)
+            self._index(entry)
+            return entry
+
+    def remove(self, entry_id):
+        """キャンセル待ちを取り消す。取り消せた場合はその WaitlistEntry を返します"""
+        with self._lock:
+            entry = self._entries.pop(entry_id, None)
+            if entry is not None:
+                self._forget(entry)
+                with self._db:
+                    self._db.execute("DELETE FROM waitlist WHERE entry_id = ? AND offered_at IS NULL", (entry_id,))
+            return entry
+
+    def offered(self):
+        """ご案内中 (お店の方の確定・取り下げ待ち) の (WaitlistEntry, ご案内した時刻) の一覧 (受付順)"""
+        with self._lock:
+            return self._select("offered_at IS NOT NULL")
+
+    def confirm_offer(self, entry_id):
+        """ご案内したお客様の予約をお店の方が確定した時に呼ぶ。ご案内中から外した WaitlistEntry を返します"""
+        return self._end_offer(entry_id)
+
+    def release_offer(self, entry_id):
+        """
+        ご案内を取り下げる (お断り・連絡がつかないなど)。ご案内中から外した WaitlistEntry を返します。
+        押さえていた席は、呼び出し元が match_released() で次のお客様にご案内してください。
+        """
+        return self._end_offer(entry_id)
+
+    def _end_offer(self, entry_id):
+        with self._lock:
+            offered = self._select("offered_at IS NOT NULL AND entry_id = ?", (entry_id,))
+            if not offered:
+                return None
+            with self._db:
+                if not self._db.execute("DELETE FROM waitlist WHERE entry_id = ? AND offered_at IS NOT NULL",
+                                        (entry_id,)).rowcount:
+                    return None # 別のワーカーが先に確定・取り下げた
+            return offered[0][0]
+
+    def purge_before(self, date_str):
+        """date_str より前の日付のキャンセル待ち (ご案内中のものを含む) を削除し、削除した件数を返す"""
+        with self._lock:
+            for old_date in [d for d in self._slots_by_date if d < date_str]:
+                for start_minute in self._slots_by_date.pop(old_date):
+                    for seat_type in SEAT_RULES:
+                        queue = self._queues.pop((old_date, start_minute, seat_type), None)
+                        for bucket in (queue.by_guests if queue else ()):
+                            for entry_id in bucket:
+                                entry = self._entries.pop(entry_id, None)
+                                if entry is not None:
+                                    self._customers.pop(self._customer_key(entry), None)
+            with self._db:
+                return self._db.execute("DELETE FROM waitlist WHERE tenant_id = ? AND date < ?",
+                                        (self.tenant_id, date_str)).rowcount
+
+    def dates(self):
+        """このワーカーの索引にあるキャンセル待ちの日付の一覧 (ご案内中だけの日付は含みません)"""
+        with self._lock:
+            return sorted(self._slots_by_date)
+
+    def __len__(self):
+        """まだご案内していないキャンセル待ちの件数 (全ワーカーの分)"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM waitlist WHERE tenant_id = ? AND offered_at IS NULL",
+                                    (self.tenant_id,)).fetchone()[0]
+
+    def match_released(self, board, date_str, released):
+        """
+        board で date_str の予約が減った (released: 空いた (開始, 終了, 席数, 卓数) の一覧) 時に、
+        今の空きに収まるキャンセル待ちを選んでご案内中にし、ご案内する WaitlistEntry の一覧を返す。
+        時間枠ごとに、人数の多いご希望から (同じ人数なら受付順に) 選びます。
+        ご案内中の分 (この呼び出しで選んだ分を含む) は、重なる時間枠の空きから差し引いて数えます。
+        """
+        offers = []
+        with self._lock:
+            slots = self._slots_by_date.get(date_str)
+            if not slots:
+                return offers
+            holding = [entry for entry, _ in self._select("offered_at IS NOT NULL AND date = ?", (date_str,))]
+            affected = set()
+            for start, end, _, _ in released:
+                # 時間枠 [開始, 開始 + 利用時間) が空いた時間帯と重なるもの
+                low = bisect.bisect_right(slots, start - self.duration_minutes)
+                high = bisect.bisect_left(slots, end)
+                affected.update(slots[low:high])
+
+            for start_minute in sorted(affected):
+                end_minute = start_minute + self.duration_minutes
+                snapshot = board.window_availability(date_str, start_minute, end_minute)
+                if snapshot is None:
+                    continue
+                free_counter, free_tables, _ = snapshot
+                for offer in itertools.chain(holding, offers): # ご案内中・この呼び出しで先にご案内した分を差し引く
+                    if offer.start_minute < end_minute and offer.start_minute + self.duration_minutes > start_minute:
+                        seats, tables = usage_for(offer.seat_type, offer.guests)
+                        free_counter -= seats
+                        free_tables -= tables
+                for seat_type in SEAT_RULES:
+                    queue = self._queues.get((date_str, start_minute, seat_type))
+                    while queue is not None and queue.count:
+                        entry = self._take_best_fit(queue, free_counter, free_tables)
+                        if entry is None:
+                            break
+                        offers.append(entry)
+                        seats, tables = usage_for(entry.seat_type, entry.guests)
+                        free_counter -= seats
+                        free_tables -= tables
+            offered_at = time.time()
+            with self._db:
+                for entry in offers:
+                    self._forget(entry)
+                # 起動時に同じご希望を読み込んだ別のワーカーが先にご案内していれば、こちらではご案内しない
+                offers = [entry for entry in offers if self._db.execute(
+                    "UPDATE waitlist SET offered_at = ? WHERE entry_id = ? AND offered_at IS NULL",
+                    (offered_at, entry.entry_id)).rowcount]
+        return offers
+
+    def _take_best_fit(self, queue, free_counter, free_tables):
+        # ロックを持った状態で呼ぶこと。収まる中で一番人数の多いご希望を、受付順に取り出す
+        for guests in range(len(queue.by_guests) - 1, 0, -1):
+            bucket = queue.by_guests[guests]
+            while bucket and bucket[0] not in self._entries:
+                bucket.popleft() # 取り消し済み
+            if not bucket:
+                continue
+            entry = self._entries[bucket[0]]
+            if check_availability(entry.seat_type, guests, free_counter, free_tables, self.reserved_units) == AVAILABLE:
+                bucket.popleft()
+                del self._entries[entry.entry_id]
+                return entry
+        return None
+
+    @staticmethod
+    def _customer_key(entry):
+        return (entry.date, entry.start_minute, entry.seat_type, entry.name, entry.phone)
+
+    def _forget(self, entry):
+        # ロックを持った状態で呼ぶこと。件数と二重登録防止の索引を更新し、空になった時間枠を索引から外す
+        self._customers.pop(self._customer_key(entry), None)
+        key = (entry.date, entry.start_minute, entry.seat_type)
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        queue.count -= 1
+        if queue.count > 0:
+            return
+        del self._queues[key]
+        if not any((entry.date, entry.start_minute, seat_type) in self._queues for seat_type in SEAT_RULES):
+            slots = self._slots_by_date[entry.date]
+            slots.pop(bisect.bisect_left(slots, entry.start_minute))
+            if not slots:
+                del self._slots_by_date[entry.date]
+
+
+if __name__ == '__main__':
+    # 簡単な速度の確認: キャンセル待ちが多い時でも、1件のキャンセルに対する照合が速いこと
+    import random
+
+    from .jst_time import jst_epoch_minute
+    from .occupancy import OccupancyBoard
+    from .seat_policy import COUNTER, TABLE
+
+    waitlist = Waitlist(max_entries_per_slot=10 ** 6)
+    slot_minutes = list(range(17 * 60 + 30, 22 * 60 + 1, 30))
+    board = OccupancyBoard(11, 2, slot_minutes, lambda c, t: None)
+    rng = random.Random(0)
+    dates = [f"2099-07-{day:02d}" for day in range(1, 29)]
+    for _ in range(50000):
+        seat_type = rng.choice((COUNTER, TABLE))
+        date_str = rng.choice(dates)
+        guests = rng.randint(1, 4) if seat_type == COUNTER else rng.randint(3, 8)
+        waitlist.add(date_str, jst_epoch_minute(date_str, rng.choice(slot_minutes)), seat_type, guests,
+                     f"name{_}", f"090{_:08d}")
+
+    rounds = 1000
+    elapsed = 0.0
+    offered = 0
+    for i in range(rounds):
+        date_str = dates[i % len(dates)]
+        start = jst_epoch_minute(date_str, 19 * 60)
+        board.record_window(date_str, jst_epoch_minute(date_str, 0), jst_epoch_minute(date_str, 24 * 60), [])
+        started = time.perf_counter()
+        offered += len(waitlist.match_released(board, date_str, [(start, start + 120, 4, 1)]))
+        elapsed += time.perf_counter() - started
+    print(f"キャンセル待ち {len(waitlist) + offered}件中 {offered}件をご案内: 1回の照合 {elapsed / rounds * 1e6:.1f}μs")
@@ -0,0 +1,264 @@
+# export_reservations.py (予約履歴の書き出しツール)
+#
+# 指定した期間のすべての予約を、Googleカレンダーから1ページずつ読みながら書き出します。
+# 読んだページはすぐにファイルへ書き込むので、何年分でもメモリの使用量はほぼ一定です。
+# 途中で止まっても、チェックポイント (最後に書き終えたページの位置) から続きを再開できます。
+#
+# 使い方の例:
+#   python export_reservations.py --start 2023-01-01 --end 2025-12-31 --output reservations.jsonl
+#   python export_reservations.py --start 2023-01-01 --end 2025-12-31 --output reservations.csv --format csv
+#   python export_reservations.py --start 2023-01-01 --end 2025-12-31 --output reservations_parquet --format parquet
+#   (同じコマンドをもう一度実行すると、チェックポイントから再開します)
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+from googleapiclient.errors import HttpError
+
+from core import CALENDAR_ERRORS, CircuitOpenError, SCOPES_READ_ONLY, get_calendar_client
+from core.jst_time import jst_epoch_minute, jst_datetime, event_epoch_minutes
+from core.seat_policy import SEAT_RULES
+
+# 書き出す列 (CSV / Parquet の列順もこの順番です)
+INTEGER_COLUMNS = ('number_of_guests', 'seats_used', 'tables_used')
+COLUMNS = [
+    'event_id', 'status', 'date', 'start', 'end', 'reservist_name', 'number_of_guests',
+    'seat_type', 'seats_used', 'tables_used', 'phone_number', 'summary', 'created', 'updated',
+]
+
+
+def reservation_record(event):
+    """予定1件を書き出し用の1行 (dict) にする。説明欄に予約情報 (JSON) がない予定は None"""
+    try:
+        details = json.loads(event.get('description') or '{}')
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(details, dict) or details.get('seat_type') not in SEAT_RULES:
+        return None
+    minutes = event_epoch_minutes(event)
+    start = jst_datetime(minutes[0]) if minutes else None
+    end = jst_datetime(minutes[1]) if minutes else None
+    return {
+        'event_id': event.get('id'),
+        'status': event.get('status'),
+        'date': start.date().isoformat() if start else None,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'reservist_name': details.get('reservist_name'),
+        'number_of_guests': details.get('number_of_guests'),
+        'seat_type': details.get('seat_type'),
+        'seats_used': details.get('seats_used'),
+        'tables_used': details.get('tables_used'),
+        'phone_number': details.get('phone_number'),
+        'summary': event.get('summary'),
+        'created': event.get('created'),
+        'updated': event.get('updated'),
+    }
+
+
+# --- 書き出し形式 ---
+# どの形式も write_page() でページごとに書き、commit() の戻り値 (再開位置の情報) をチェックポイントに保存します。
+
+class JsonLinesWriter:
+    """1行に1件の JSON を書く (JSON Lines)"""
+
+    def __init__(self, path, resume_state):
+        self.file = open(path, 'a+b')
+        # 前回チェックポイント以降に書きかけた分は捨ててから続きを書く
+        self.file.truncate(resume_state.get('output_bytes', 0) if resume_state else 0)
+        self.file.seek(0, os.SEEK_END)
+
+    def write_page(self, records):
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'output_bytes': self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter(JsonLinesWriter):
+    """CSV (1行目は列名) を書く"""
+
+    def __init__(self, path, resume_state):
+        super().__init__(path, resume_state)
+        self.text = None
+        if self.file.tell() == 0:
+            self._writer().writerow(COLUMNS)
+
+    def _writer(self):
+        # バイナリのファイルに文字列で書くための薄いラッパー
+        self.text = self.text or _BytesTextAdapter(self.file)
+        return csv.writer(self.text)
+
+    def write_page(self, records):
+        writer = self._writer()
+        for record in records:
+            writer.writerow([record[column] for column in COLUMNS])
+
+
+class _BytesTextAdapter:
+    def __init__(self, binary_file):
+        self.binary_file = binary_file
+
+    def write(self, text):
+        return self.binary_file.write(text.encode('utf-8'))
+
+
+class ParquetWriter:
+    """
+    Parquet 形式 (列ごとにまとめて保存する形式) で書く。pyarrow が必要です。
+    Parquet ファイルは後から追記できないため、出力先をフォルダーにして
+    rows_per_file 件ごとに part-00001.parquet, part-00002.parquet ... と分けて書きます。
+    チェックポイントはファイルを1つ書き終えるたびに進みます。
+    """
+
+    def __init__(self, path, resume_state, rows_per_file=10000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            sys.exit("◆◆◆ --format parquet には pyarrow が必要です (pip install pyarrow) ◆◆◆")
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        # 列の型を固定しておく (ファイルごとに型が変わらないように)
+        self.schema = pyarrow.schema([
+            (column, pyarrow.int64() if column in INTEGER_COLUMNS else pyarrow.string()) for column in COLUMNS
+        ])
+        self.directory = path
+        self.rows_per_file = rows_per_file
+        self.part_number = resume_state.get('parts_written', 0) if resume_state else 0
+        self.buffer = {column: [] for column in COLUMNS}
+        self.buffered_rows = 0
+        os.makedirs(path, exist_ok=True)
+
+    def write_page(self, records):
+        for record in records:
+            for column in COLUMNS:
+                self.buffer[column].append(record[column])
+        self.buffered_rows += len(records)
+
+    def ready_to_commit(self):
+        return self.buffered_rows >= self.rows_per_file
+
+    def commit(self):
+        if self.buffered_rows:
+            self.part_number += 1
+            part_path = os.path.join(self.directory, f"part-{self.part_number:05d}.parquet")
+            self.parquet.write_table(self.pyarrow.table(self.buffer, schema=self.schema), part_path + '.tmp')
+            os.replace(part_path + '.tmp', part_path)
+            self.buffer = {column: [] for column in COLUMNS}
+            self.buffered_rows = 0
+        return {'parts_written': self.part_number}
+
+    def close(self):
+        pass
+
+
+WRITERS = {'jsonl': JsonLinesWriter, 'csv': CsvWriter, 'parquet': ParquetWriter}
+
+
+# --- チェックポイント ---
+
+def load_checkpoint(path, job):
+    """前回の続きの情報を読む。同じ条件 (期間・形式・出力先・キャンセルを含むか・ページの件数) の書き出しでなければ使いません"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('job') != job:
+        sys.exit(f"◆◆◆ チェックポイント {path} は別の条件の書き出しのものです。不要なら削除してください。 ◆◆◆")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    """書きかけで壊れないよう、一時ファイルに書いてから置き換える"""
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def export_reservations(calendar_client, start_date, end_date, output, output_format,
+                        checkpoint_path, page_size=250, include_cancelled=False):
+    """[start_date, end_date] (日本時間、両端を含む) の予約を output に書き出す"""
+    # ページの位置 (next_page_token) は取得の条件ごとに違うので、条件がすべて同じ時だけ続きから再開する
+    job = {'calendar_id': calendar_client.calendar_id, 'start': start_date, 'end': end_date, 'output': output, 'format': output_format,
+           'include_cancelled': include_cancelled, 'page_size': page_size}
+    checkpoint = load_checkpoint(checkpoint_path, job)
+    if checkpoint and checkpoint.get('finished'):
+        print(f"この書き出しは完了済みです ({checkpoint['records_written']}件)。やり直す場合は {checkpoint_path} を削除してください。")
+        return checkpoint
+
+    records_written = checkpoint['records_written'] if checkpoint else 0
+    page_token = checkpoint['next_page_token'] if checkpoint else None
+    if checkpoint:
+        print(f"チェックポイントから再開します (書き出し済み {records_written}件)")
+
+    writer = WRITERS[output_format](output, checkpoint['writer'] if checkpoint else None)
+    pending = 0 # まだチェックポイントに反映していない件数
+
+    try:
+        # 一時的なエラー (429 / 5xx) は間隔を空けて再試行する
+        for events, next_page_token in calendar_client.iter_event_pages(
+                jst_epoch_minute(start_date, 0), jst_epoch_minute(end_date, 24 * 60), page_token, page_size,
+                show_deleted=include_cancelled, num_retries=3):
+            records = [record for record in map(reservation_record, events) if record is not None]
+            writer.write_page(records)
+            pending += len(records)
+            # Parquet はファイルを1つ書き終えるまで、それ以外はページごとにチェックポイントを進める
+            if next_page_token is None or getattr(writer, 'ready_to_commit', lambda: True)():
+                records_written += pending
+                pending = 0
+                save_checkpoint(checkpoint_path, {
+                    'job': job,
+                    'next_page_token': next_page_token,
+                    'records_written': records_written,
+                    'writer': writer.commit(),
+                    'finished': next_page_token is None,
+                })
+                print(f"  {records_written}件 書き出し済み")
+    except (CircuitOpenError,) + CALENDAR_ERRORS as error: # HttpError の他、タイムアウトや接続の切断も
+        print(f"◆◆◆ カレンダーの読み込み中にエラーが発生しました: {error} ◆◆◆")
+        print("   もう一度同じコマンドを実行すると、最後のチェックポイントから再開します。")
+        if isinstance(error, HttpError) and error.resp.status in (400, 410):
+            print(f"   (ページの位置が無効になった可能性があります。続けて失敗する場合は {checkpoint_path} を削除してください)")
+        raise
+    finally:
+        writer.close()
+
+    print(f"★★★ 書き出し完了: {records_written}件 → {output} ★★★")
+    return {'records_written': records_written}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指定した期間の予約をカレンダーから書き出します。")
+    parser.add_argument('--start', required=True, help="開始日 (YYYY-MM-DD、日本時間)")
+    parser.add_argument('--end', required=True, help="終了日 (YYYY-MM-DD、この日も含む)")
+    parser.add_argument('--output', required=True, help="出力先 (parquet の場合はフォルダー)")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='jsonl', help="出力形式 (既定: jsonl)")
+    parser.add_argument('--checkpoint', help="チェックポイントのファイル (既定: <出力先>.checkpoint.json)")
+    parser.add_argument('--page-size', type=int, default=250, help="1回に読む予定の数 (最大2500)")
+    parser.add_argument('--include-cancelled', action='store_true', help="キャンセルされた予約も書き出す")
+    args = parser.parse_args()
+
+    load_dotenv() # app.py と同じ .env の設定 (SERVICE_ACCOUNT_FILE / CALENDAR_ID) を使います
+    calendar_client = get_calendar_client(SCOPES_READ_ONLY)
+    if calendar_client is None:
+        sys.exit("◆◆◆ カレンダーに接続できませんでした。.envファイルの設定を確認してください。 ◆◆◆")
+    export_reservations(
+        calendar_client, args.start, args.end, args.output, args.format,
+        args.checkpoint or args.output.rstrip('/\\') + '.checkpoint.json',
+        page_size=args.page_size, include_cancelled=args.include_cancelled,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,246 +1,246 @@
+# kuuseki_check.py (空席チェックのツール - 電話での問い合わせ対応用)
+#
+# 複数の「日付・時刻・人数・席タイプ」をまとめて受け取り、予約できるかどうかを一覧で表示します。
+# カレンダーは日付ごとに1回だけ読み、同じ日の問い合わせはすべて読み込んだ予約一覧 (OccupancyBoard) から答えます。
+# (問い合わせの日付はすべて答え終わるまで覚えておくので、何日分でもまとめて確認できます)
+# 答えられなかった (取得失敗の) 問い合わせがあれば、終了コード 1 で終わります。
+# 席のルールと空きの数え方は予約フォーム (app.py) と同じ core パッケージを使います。
+# カレンダーへの接続は .env の設定を使います (SERVICE_ACCOUNT_FILE がなければ token.json / credentials.json)。
+# 席数・残しておく席数はお店の設定 (tenants.py) から読みます。TENANTS_FILE で複数店舗を使う場合は --tenant で店舗を選びます
+# (店舗の設定に書いたカレンダー・鍵ファイルを使います)。
+#
+# 使い方の例:
+#   python kuuseki_check.py 2025-07-02,19:00,3,カウンター 2025-07-02,20:00,6,テーブル
+#   python kuuseki_check.py --csv queries.csv            (列: 日付,時刻,人数,席タイプ)
+#   python kuuseki_check.py - < queries.txt              (1行に1件、カンマまたは空白区切り)
+#   python kuuseki_check.py --csv queries.csv --watch 30 (30秒ごとに変更分だけ読んで表示を更新)
+#   python kuuseki_check.py --tenant ekimae 2025-07-02,19:00,3,カウンター
+
+import argparse
+import csv
 import datetime
-import os.path
-import json # JSONを扱うために追加
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-
-# --- お店の基本情報 ---
-TOTAL_COUNTER_SEATS = 11  # カウンターの総席数
-TOTAL_TABLE_UNITS = 2     # テーブルの総卓数 (4人掛けが2つなので2卓)
-# --------------------
-
-def calculate_vacancy(target_datetime_start_jp, target_datetime_end_jp, calendar_service):
+import re
+import sys
+import time
+import unicodedata
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+from core import CALENDAR_ERRORS, CircuitOpenError, OccupancyBoard, SCOPES_READ_ONLY, fetch_events
+from core.calendar_client import create_calendar_client
+from core.jst_time import epoch_minute, jst_epoch_minute, rfc3339_utc
+from core.seat_policy import COUNTER, TABLE, AVAILABLE, FULL, NOT_ENOUGH, check_availability, max_party_size, party_size_error
+from tenants import load_tenants
+
+RESERVATION_DURATION_MINUTES = 120 # 1組あたりの利用時間 (2時間、app.py と同じ)
+
+# 席タイプの書き方 (英語や1文字でも入力できるように)
+SEAT_ALIASES = {
+    COUNTER: COUNTER, 'counter': COUNTER, 'c': COUNTER, 'カ': COUNTER,
+    TABLE: TABLE, 'table': TABLE, 't': TABLE, 'テ': TABLE,
+}
+
+Query = namedtuple('Query', 'date time guests seat_type start end')
+
+# 判定の表示
+VERDICTS = {
+    AVAILABLE: '○ 予約可',
+    FULL: '△ 要電話',      # 人数分の空きはあるが、カウンターの残しておく席数を割ってしまう
+    NOT_ENOUGH: '× 満席',
+}
+UNANSWERED = '取得失敗'
+
+
+def parse_query(fields):
+    """[日付, 時刻, 人数, 席タイプ] を Query にする。読み取れなければ ValueError"""
+    if len(fields) != 4:
+        raise ValueError("「日付,時刻,人数,席タイプ」の4項目が必要です")
+    date_str, time_str, guests_str, seat_str = (field.strip() for field in fields)
+    datetime.date.fromisoformat(date_str)
+    hour, minute = (int(part) for part in time_str.split(':'))
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"時刻 {time_str} が正しくありません")
+    seat_type = SEAT_ALIASES.get(seat_str.lower())
+    if seat_type is None:
+        raise ValueError(f"席タイプ {seat_str} が正しくありません (カウンター / テーブル)")
+    start = jst_epoch_minute(date_str, hour * 60 + minute)
+    return Query(date_str, f"{hour:02d}:{minute:02d}", int(guests_str), seat_type,
+                 start, start + RESERVATION_DURATION_MINUTES)
+
+
+def read_queries(args):
+    """引数・CSV・標準入力から問い合わせを読む。読み取れなかった行はエラーを表示して飛ばします"""
+    rows = []
+    for text in args.queries:
+        if text == '-':
+            rows.extend(line for line in sys.stdin if line.strip())
+        else:
+            rows.append(text)
+    rows = [re.split(r'[,\s]+', row.strip()) for row in rows]
+    if args.csv:
+        with open(args.csv, encoding='utf-8-sig', newline='') as f:
+            rows.extend(row for row in csv.reader(f) if row and any(cell.strip() for cell in row))
+
+    queries = []
+    for fields in rows:
+        if fields[0].startswith('#') or fields[0].strip() in ('date', '日付'): # コメント行と見出し行
+            continue
+        try:
+            queries.append(parse_query(fields))
+        except ValueError as error:
+            print(f"◆◆◆ 読み取れない問い合わせ {','.join(fields)}: {error} ◆◆◆", file=sys.stderr)
+    return queries
+
+
+def create_board(tenant):
     """
-    指定された日時の既存予約から、カウンターとテーブルの空き状況を計算する関数。
+    問い合わせに答えるためのボードを作る。予約フォームのボード (tenant.occupancy_board) と違って覚えておく日付の数に
+    上限がないので、問い合わせの日付が多くても、答える前に読み込んだ日付を忘れることはありません。
     """
-    print(f"\n--- 空き状況計算開始 ({target_datetime_start_jp.strftime('%Y-%m-%d %H:%M')} JST) ---")
+    return OccupancyBoard(tenant.total_counter_seats, tenant.total_table_units, (), None,
+                          duration_minutes=RESERVATION_DURATION_MINUTES)
 
-    # 1. 指定された日時範囲をUTCに変換 (前回と同じロジック)
-    time_offset = datetime.timedelta(hours=9)
-    start_time_utc = target_datetime_start_jp - time_offset
-    end_time_utc = target_datetime_end_jp - time_offset
-    time_min_utc_iso = start_time_utc.isoformat() + 'Z'
-    time_max_utc_iso = end_time_utc.isoformat() + 'Z'
 
-    print(f"検索期間 (UTC): {time_min_utc_iso} から {time_max_utc_iso}")
+def load_dates(calendar_client, board, queries):
+    """
+    問い合わせのある日付ごとに、その日の問い合わせ全体を覆う範囲の予定を1回だけ読んでボードに入れる。
+    読み込めなかった日付の集合を返します。
+    """
+    windows = {}
+    for query in queries:
+        start, end = windows.get(query.date, (query.start, query.end))
+        windows[query.date] = (min(start, query.start), max(end, query.end))
+    failed = set()
+    for date_str, (start, end) in sorted(windows.items()):
+        if fetch_events(calendar_client, start, end, board) is None:
+            failed.add(date_str)
+    return failed
+
+
+def answer(tenant, board, query, failed_dates):
+    """問い合わせ1件の (空きカウンター, 空きテーブル, 最大人数, 判定) を返す (席数と残しておく席数はその店舗のもの)"""
+    size_error = party_size_error(query.seat_type, query.guests)
+    snapshot = None if query.date in failed_dates else board.window_availability(query.date, query.start, query.end)
+    if snapshot is None:
+        return '-', '-', '-', UNANSWERED
+    free_counter, free_tables, _ = snapshot
+    free_units = free_counter if query.seat_type == COUNTER else free_tables
+    largest = max_party_size(query.seat_type, free_units, tenant.reserved_units)
+    if size_error:
+        return free_counter, free_tables, largest, 'ルール外'
+    verdict = check_availability(query.seat_type, query.guests, free_counter, free_tables, tenant.reserved_units)
+    return free_counter, free_tables, largest, VERDICTS[verdict]
+
+
+def _width(text):
+    # 全角文字は2桁分として数える (表の列をそろえるため)
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+
+
+def print_table(queries, results, previous=None):
+    """問い合わせと結果を表にして表示する。previous と比べて変わった行には * を付けます"""
+    header = ('', '日付', '時刻', '人数', '席', '空きC', '空きT', '最大', '判定')
+    rows = []
+    for index, (query, result) in enumerate(zip(queries, results)):
+        mark = '*' if previous is not None and previous[index] != result else ''
+        rows.append((mark, query.date, query.time, str(query.guests), query.seat_type) + tuple(map(str, result)))
+    if previous is None: # 初回の表には印の列を出さない
+        header, rows = header[1:], [row[1:] for row in rows]
+    widths = [max(_width(row[column]) for row in rows + [header]) for column in range(len(header))]
+    for row in [header] + rows:
+        print('  '.join(cell + ' ' * (width - _width(cell)) for cell, width in zip(row, widths)).rstrip())
+
+
+def watch(calendar_client, tenant, board, queries, failed_dates, interval_seconds, results):
+    """
+    interval_seconds ごとに、前回以降に変更された予定だけ (updatedMin、キャンセルを含む) を読んで表を更新する。
+    読み込みに失敗していた日付は、その日の分をもう一度まとめて読みます。
+    """
+    range_start = min(query.start for query in queries)
+    range_end = max(query.end for query in queries)
+    # 時計のずれを見込んで1分前から読む (同じ変更を2回反映しても結果は変わりません)
+    synced_from = epoch_minute(datetime.datetime.now(datetime.timezone.utc)) - 1
+    while True:
+        time.sleep(interval_seconds)
+        started = epoch_minute(datetime.datetime.now(datetime.timezone.utc)) - 1
+        try:
+            changes = calendar_client.list_events(range_start, range_end, show_deleted=True,
+                                                  updated_min=rfc3339_utc(synced_from))
+        except (CircuitOpenError,) + CALENDAR_ERRORS as error:
+            print(f"◆◆◆ {time.strftime('%H:%M:%S')} 変更の確認に失敗しました: {error} ◆◆◆")
+            continue
+        synced_from = started
+        changed_dates = set(board.apply_changes(changes))
+        if failed_dates:
+            retry = [query for query in queries if query.date in failed_dates]
+            still_failed = load_dates(calendar_client, board, retry)
+            changed_dates |= failed_dates - still_failed
+            failed_dates = still_failed
+
+        if not changed_dates:
+            print(f"{time.strftime('%H:%M:%S')} 変更なし ({len(changes)}件の更新を確認)")
+            continue
+        new_results = [answer(tenant, board, query, failed_dates) for query in queries]
+        print(f"\n{time.strftime('%H:%M:%S')} 更新がありました ({', '.join(sorted(changed_dates))})")
+        print_table(queries, new_results, previous=results)
+        results = new_results
 
-    # 2. Google Calendar APIで指定期間の予定を取得 (前回と同じロジック)
-    try:
-        events_result = calendar_service.events().list(
-            calendarId='primary',
-            timeMin=time_min_utc_iso,
-            timeMax=time_max_utc_iso,
-            singleEvents=True,
-            orderBy='startTime').execute()
-        events = events_result.get('items', [])
-    except HttpError as error:
-        print(f'カレンダーからの予定取得中にエラー: {error}')
-        return -1, -1 # エラー時は空きなしとして扱う (例)
-
-    # 3. 【新しい処理】既存予約から使用中のカウンター席数とテーブル卓数を集計
-    current_used_counter_seats = 0
-    current_used_table_units = 0
-
-    if not events:
-        print("指定期間に既存の予約はありませんでした。")
-    else:
-        print(f"{len(events)}件の既存予約が見つかりました。詳細を確認します...")
-        for event in events:
-            description_str = event.get('description', '{}')
-            try:
-                reservation_details = json.loads(description_str)
-                if reservation_details: # JSONが空でないことを確認
-                    seat_type = reservation_details.get('seat_type')
-                    if seat_type == 'カウンター':
-                        seats_this_booking = reservation_details.get('seats_used', 0)
-                        current_used_counter_seats += seats_this_booking
-                        print(f"  カウンター予約発見: {seats_this_booking}席使用")
-                    elif seat_type == 'テーブル':
-                        tables_this_booking = reservation_details.get('tables_used', 0)
-                        current_used_table_units += tables_this_booking
-                        print(f"  テーブル予約発見: {tables_this_booking}卓使用")
-            except json.JSONDecodeError:
-                # JSONパースエラーの場合は、予約詳細不明なので無視するかログに出す
-                print(f"  注意: 予定「{event.get('summary', '(タイトルなし)')}」の説明欄はJSON形式ではありませんでした。")
-            except TypeError:
-                # reservation_detailsがNoneなどで.getできない場合など
-                print(f"  注意: 予定「{event.get('summary', '(タイトルなし)')}」の説明欄の形式に問題がありました。")
-
-
-    print(f"集計結果: 現在使用中のカウンター {current_used_counter_seats}席, テーブル {current_used_table_units}卓")
-
-    # 4. 空き状況を計算
-    available_counter_seats = TOTAL_COUNTER_SEATS - current_used_counter_seats
-    available_table_units = TOTAL_TABLE_UNITS - current_used_table_units
-
-    print(f"計算結果: 空きカウンター {available_counter_seats}席, 空きテーブル {available_table_units}卓")
-    print("--- 空き状況計算終了 ---")
-
-    return available_counter_seats, available_table_units
-
-SCOPES = ['https://www.googleapis.com/auth/calendar']
 
 def main():
-    creds = None
-    # ... (認証処理は前回と同じなので省略) ...
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    # ... (ここまで認証処理) ...
-
+    parser = argparse.ArgumentParser(description="複数の日時・人数・席タイプの空き状況をまとめて確認します。")
+    parser.add_argument('queries', nargs='*',
+                        help="問い合わせ (例: 2025-07-02,19:00,3,カウンター)。- で標準入力から読みます")
+    parser.add_argument('--csv', help="問い合わせの CSV ファイル (列: 日付,時刻,人数,席タイプ)")
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help="指定した秒数ごとに変更分だけを読み直して表示を更新する (Ctrl+C で終了)")
+    parser.add_argument('--tenant', metavar='ID',
+                        help="確認する店舗のID (TENANTS_FILE の id。省略すると既定の店舗)")
+    args = parser.parse_args()
+    if not args.queries and not args.csv:
+        parser.error("問い合わせを引数・--csv・標準入力 (-) のいずれかで指定してください")
+
+    queries = read_queries(args)
+    if not queries:
+        sys.exit("◆◆◆ 確認できる問い合わせがありません。 ◆◆◆")
+
+    load_dotenv()
     try:
-        service = build('calendar', 'v3', credentials=creds) # 認証済みのサービスオブジェクト
-
-        # 【1】テスト用の予約リクエストを設定 (ここを色々変えてテストします)
-        requested_guests = 3        # 例: 3名様
-        requested_seat_type = "カウンター"  # 例: "カウンター" または "テーブル"
-
-        # 【2】テスト用の日時を設定 (これもテストに応じて変更)
-        test_start_time_jp = datetime.datetime(2025, 7, 2, 19, 0, 0)
-        test_end_time_jp   = datetime.datetime(2025, 7, 2, 21, 0, 0)
-
-        print(f"予約リクエスト: {requested_guests}名様、{requested_seat_type}希望")
-        print(f"希望日時: {test_start_time_jp.strftime('%Y-%m-%d %H:%M')} - {test_end_time_jp.strftime('%H:%M')} JST")
-
-        # 【3】空き状況を計算 (これは前回作った関数を呼び出す)
-        available_counters, available_tables = calculate_vacancy(
-            test_start_time_jp,
-            test_end_time_jp,
-            service
-        )
-
-        if available_counters == -1: # カレンダーアクセスエラーの場合
-            print("エラー: 空き状況の計算中に問題が発生しました。")
-            return # ここで処理を終了
-
-        # 【4】予約可否判断ロジック
-        print(f"\n--- 予約可否判断開始 ---")
-        print(f"現在の空き: カウンター {available_counters}席, テーブル {available_tables}卓")
-
-        reservation_possible = False  # 予約可能かどうかの旗 (最初は「不可」にしておく)
-        message = ""                  # お客様へのメッセージ
-
-        if requested_seat_type == "カウンター":
-            if 1 <= requested_guests <= 4:  # カウンター希望で1～4名様の場合
-                    if available_counters >= requested_guests: # まず、席が足りているか？
-                        if (available_counters - requested_guests) >= 5: # 次に、予約後に5席以上空きが残るか？
-                            reservation_possible = True
-                            message = f"カウンター席 {requested_guests}名様でご予約可能です。(予約後も5席以上空きが残ります)"
-                        else:
-                            message = f"申し訳ありません。カウンター席のご予約後、十分な空き席(最低5席)を確保できないためお受けできません。(現在の空き: {available_counters}席。{requested_guests}名様のご予約で残り{available_counters - requested_guests}席となります)"
-                    else:
-                        message = f"申し訳ありません。カウンター席がご希望の人数({requested_guests}名様)分空いていません。(現在の空き: {available_counters}席)"
-            else:  # カウンター希望で0名以下または5名様以上の場合
-                    message = "申し訳ありません。カウンター席は1～4名様でのご案内となります。"
-
-        elif requested_seat_type == "テーブル":
-            if 1 <= requested_guests <= 2:  # テーブル希望で1～2名様の場合
-                message = "申し訳ありません。テーブル席は3名様からのご案内となります。"
-            elif 3 <= requested_guests <= 4:  # テーブル希望で3～4名様の場合 (1卓使用)
-                if available_tables >= 1:
-                    reservation_possible = True
-                    message = f"テーブル席 {requested_guests}名様 (1卓利用)でご予約可能です。"
-                else:
-                    message = f"申し訳ありません。テーブル席が空いていません。(現在の空き: {available_tables}卓)"
-            elif 5 <= requested_guests <= 8:  # テーブル希望で5～8名様の場合 (2卓使用)
-                if available_tables >= 2:
-                    reservation_possible = True
-                    message = f"テーブル席 {requested_guests}名様 (2卓利用)でご予約可能です。"
-                else:
-                    message = f"申し訳ありません。ご希望の人数({requested_guests}名様)ですとテーブル2卓必要ですが、現在{available_tables}卓しか空いていません。"
-            else:  # テーブル希望で0名以下または9名様以上の場合
-                message = "申し訳ありません。テーブル席では8名様を超えるご予約、または1名様未満のご予約はお受けできません。9名様以上はお電話にてご相談ください。"
-        else:
-            message = "申し訳ありません。ご希望の席タイプが正しくありません。（「カウンター」または「テーブル」と入力してください）"
-
-        # 【5】最終的な結果を表示
-        if reservation_possible:
-                print(f"【予約結果】: ★★★ ご予約可能です！ ★★★")
-                print(f"   詳細: {message}")
-                print("\n--- Googleカレンダーへの予約登録開始 ---")
-                
-                # 1. イベントのタイトルを作成
-                event_summary = f"予約: {requested_guests}名様 ({requested_seat_type})"
-                # 例: 「予約: 3名様 (カウンター)」のようなタイトルになります。
-
-                # 2. イベントの説明欄に入れる予約詳細情報 (JSON形式) を作成
-                event_description_details = {
-                    "reservist_name": "（お客様名テスト）", # 将来的には入力してもらう
-                    "number_of_guests": requested_guests,
-                    "seat_type": requested_seat_type,
-                    # "notes": "（何か備考があれば）" # 必要に応じて
-                }
-                # 予約された席の情報を追加
-                if requested_seat_type == "カウンター":
-                    event_description_details["seats_used"] = requested_guests 
-                elif requested_seat_type == "テーブル":
-                    if 1 <= requested_guests <= 4:
-                        event_description_details["tables_used"] = 1
-                    elif 5 <= requested_guests <= 8:
-                        event_description_details["tables_used"] = 2
-                
-                # Pythonの辞書データをJSON形式の文字列に変換
-                event_description_json = json.dumps(event_description_details, ensure_ascii=False, indent=2)
-                # ensure_ascii=False で日本語がそのままJSONに入るようにし、indent=2 で見やすく整形
-
-                # 3. APIで使う開始日時と終了日時の形式を準備 (日本時間を指定)
-                # test_start_time_jp と test_end_time_jp は既にdatetimeオブジェクトのはず
-                event_start = {
-                    'dateTime': test_start_time_jp.isoformat(), # datetimeオブジェクトをISO形式文字列に
-                    'timeZone': 'Asia/Tokyo', # 日本のタイムゾーンを指定
-                }
-                event_end = {
-                    'dateTime': test_end_time_jp.isoformat(),   # datetimeオブジェクトをISO形式文字列に
-                    'timeZone': 'Asia/Tokyo', # 日本のタイムゾーンを指定
-                }
-
-                # 4. カレンダーに登録するイベント本体を作成
-                event_body = {
-                    'summary': event_summary,             # 予定のタイトル
-                    'description': event_description_json, # 予定の説明（JSON文字列）
-                    'start': event_start,                 # 開始日時とタイムゾーン
-                    'end': event_end,                     # 終了日時とタイムゾーン
-                    # 他にも attendees (参加者) や reminders (通知) なども設定できます
-                }
-
-                # 5. Google Calendar APIを使ってイベントを登録！
-                try:
-                    print("カレンダーに新しい予定を作成しています...")
-                    created_event = service.events().insert(
-                        calendarId='primary', # メインカレンダーに登録
-                        body=event_body       # 作成するイベントの内容
-                    ).execute()
-                    
-                    print(f"\n★★★ Googleカレンダーに予約を登録しました！ ★★★")
-                    print(f"  タイトル: {created_event.get('summary')}")
-                    print(f"  開始日時: {created_event.get('start', {}).get('dateTime')}")
-                    print(f"  イベントID: {created_event.get('id')}")
-                    print(f"  確認用リンク: {created_event.get('htmlLink')}")
-
-                except HttpError as error:
-                    print(f"\n◆◆◆ カレンダーへの登録中にエラーが発生しました: {error} ◆◆◆")
-                
-                print("--- Googleカレンダーへの予約登録終了 ---")
-        else:
-            print(f"【予約結果】: ◆◆◆ 申し訳ありません、ご予約いただけません ◆◆◆")
-            print(f"   理由: {message}")
-
-        print("--- 予約可否判断終了 ---")
+        tenants = load_tenants(duration_minutes=RESERVATION_DURATION_MINUTES, connect_calendar=False)
+    except (OSError, ValueError) as error:
+        sys.exit(f"◆◆◆ 店舗の設定を読み込めませんでした: {error} ◆◆◆")
+    tenant = tenants.get(args.tenant) if args.tenant else tenants.default
+    if tenant is None:
+        sys.exit(f"◆◆◆ 店舗 '{args.tenant}' は設定されていません (店舗: {', '.join(t.tenant_id for t in tenants)}) ◆◆◆")
+
+    # 空席の確認だけなので読み取り専用で接続します (鍵ファイルがなければ OAuth の token.json)
+    calendar_client = create_calendar_client(
+        tenant.calendar_backend,
+        tenant.setting('CALENDAR_ID'),
+        tenant.setting('SERVICE_ACCOUNT_FILE'),
+        SCOPES_READ_ONLY,
+        breaker_name=f"google-calendar:{tenant.tenant_id}",
+    )
+    if calendar_client is None:
+        sys.exit("◆◆◆ カレンダーに接続できませんでした。.envファイルの設定を確認してください。 ◆◆◆")
+
+    board = create_board(tenant)
+    failed_dates = load_dates(calendar_client, board, queries)
+    results = [answer(tenant, board, query, failed_dates) for query in queries]
+    print()
+    print_table(queries, results)
+
+    if args.watch:
+        print(f"\n{args.watch:g}秒ごとに変更を確認します (Ctrl+C で終了)")
+        try:
+            watch(calendar_client, tenant, board, queries, failed_dates, args.watch, results)
+        except KeyboardInterrupt:
+            print()
+        return
+    unanswered = sum(1 for result in results if result[3] == UNANSWERED)
+    if unanswered:
+        sys.exit(f"◆◆◆ {unanswered}件の問い合わせに答えられませんでした (カレンダーを読み込めませんでした)。 ◆◆◆")
 
-    except HttpError as error:
-        print(f'main関数でエラーが発生しました: {error}')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
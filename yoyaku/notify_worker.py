@@ -0,0 +1,391 @@
+# notify_worker.py (ご予約の確認とリマインドのお知らせ - 予約フォームとは別に動かす常駐プログラム)
+#
+# 予約フォームで受け付けた予約に、次の2つのお知らせを送ります。
+#   確認 (confirmation) … 予約を受け付けた直後 (カレンダーに新しく登録された予定を NOTIFY_INTERVAL_SECONDS ごとに確認)
+#   リマインド (reminder) … 前日の NOTIFY_REMINDER_TIME 以降に、翌日の予約をまとめて (1日分を1回の問い合わせで読みます)
+# 送り先は、LINE のトークから予約フォームを開いたお客様 (予定の説明欄に line_user_id があるもの) だけです。
+# (LINE のIDは bot が署名した ?uid= で届き、予約フォームが LINE_CHANNEL_SECRET で署名を確かめたものだけが残ります。
+#  line/reservationLink.js で署名付きの URL を作れます)
+# お知らせの文面は templates/notifications/ の confirmation.txt / reminder.txt で、
+# templates/notifications/<店舗ID>/ に同じ名前のファイルを置くと、その店舗だけ別の文面にできます。
+#
+# 送信の方法は NOTIFY_SENDER で選びます ('line': LINE の push API、'stub': 送らずに表示またはファイルへ書くだけ)。
+# 同時に送る数は NOTIFY_CONCURRENCY まで、NOTIFY_BATCH_SIZE 件ずつ送って結果を送信済み台帳
+# (NOTIFY_LEDGER_FILE、SQLite) に書きます。一時的なエラーは間隔を空けて送り直します。
+# 台帳には送る前に書き込み、送れたら「送信済み」にするので、途中で止まっても再起動後に同じお知らせを2回送ることはありません
+# (LINE には同じ X-Line-Retry-Key で送り直すため、届いていた場合は LINE の側で重複として扱われます)。
+#
+# 使い方の例:
+#   python notify_worker.py                              (動かし続ける)
+#   python notify_worker.py --once                       (1回だけ確認して終わる。cron などから呼ぶ場合)
+#   python notify_worker.py --once --sender stub --stub-file sent.jsonl (送らずに送る内容をファイルへ)
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, namedtuple
+
+import jinja2
+from dotenv import load_dotenv
+
+from core import CALENDAR_ERRORS, CircuitOpenError
+from core.jst_time import JST, epoch_minute, event_epoch_minutes, jst_datetime, jst_epoch_minute, jst_today, rfc3339_utc
+from tenants import load_tenants
+from validation import JAPANESE_WEEKDAYS
+
+CONFIRMATION = 'confirmation'
+REMINDER = 'reminder'
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'notifications')
+
+# 1回分の確認で数える件数の表示名
+STAT_LABELS = {'sent': "送信", 'pending': "送り直し待ち", 'failed': "送信をあきらめた", 'no_line_id': "LINE のIDなし"}
+
+# 送るお知らせ1件 (retry_key は送り直しても変わらない、お知らせごとの番号)
+Notification = namedtuple('Notification', 'tenant_id event_id kind start_minute to text retry_key')
+
+
+class DeliveryError(Exception):
+    """お知らせを送れなかった時の例外。retryable が False なら送り直しても届きません (宛先の誤りなど)"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# --- 送信の方法 ---
+
+class LinePushSender:
+    """LINE Messaging API の push メッセージで送る"""
+
+    PUSH_URL = 'https://api.line.me/v2/bot/message/push'
+
+    def __init__(self, channel_access_token, timeout_seconds=10):
+        self.channel_access_token = channel_access_token
+        self.timeout_seconds = timeout_seconds
+
+    def send(self, notification):
+        body = json.dumps({'to': notification.to, 'messages': [{'type': 'text', 'text': notification.text}]},
+                          ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(self.PUSH_URL, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'Authorization': f"Bearer {self.channel_access_token}",
+            'X-Line-Retry-Key': notification.retry_key, # 同じキーで送り直すと、LINE の側で1回分として扱われる
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_seconds) as response:
+                response.read()
+        except urllib.error.HTTPError as error:
+            if error.code == 409: # 同じ X-Line-Retry-Key のメッセージは受付済み (前回届いていた)
+                return
+            raise DeliveryError(f"LINE push API: {error.code} {error.read()[:200]!r}",
+                                retryable=error.code == 429 or error.code >= 500)
+        except (urllib.error.URLError, TimeoutError, OSError) as error:
+            raise DeliveryError(f"LINE push API: {error}")
+
+
+class StubSender:
+    """実際には送らず、送る内容を表示する (path を渡すとファイルに1行1件の JSON で書く)。動作確認用"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.sent = []
+
+    def send(self, notification):
+        with self._lock:
+            self.sent.append(notification)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(notification._asdict(), ensure_ascii=False) + '\n')
+            else:
+                print(f"--- [{notification.tenant_id}] {notification.kind} → {notification.to} ---\n{notification.text}")
+
+
+def create_sender(tenant, sender_name=None, stub_file=None):
+    """店舗の設定 (NOTIFY_SENDER, LINE_CHANNEL_ACCESS_TOKEN) から送信の方法を作る。作れなければ None"""
+    sender_name = (sender_name or tenant.setting('NOTIFY_SENDER', 'line')).lower()
+    if sender_name == 'stub':
+        return StubSender(stub_file)
+    if sender_name == 'line':
+        token = tenant.setting('LINE_CHANNEL_ACCESS_TOKEN')
+        if not token:
+            print(f"◆◆◆ エラー: [{tenant.tenant_id}] LINE_CHANNEL_ACCESS_TOKEN が設定されていません。 ◆◆◆")
+            return None
+        return LinePushSender(token, timeout_seconds=float(tenant.setting('NOTIFY_TIMEOUT_SECONDS', '10')))
+    print(f"◆◆◆ エラー: [{tenant.tenant_id}] NOTIFY_SENDER '{sender_name}' は使えません (line / stub)。 ◆◆◆")
+    return None
+
+
+# --- 送信済み台帳 ---
+
+class SentLedger:
+    """
+    お知らせごとの送信状況を SQLite に残す台帳。キーは (店舗, 予定ID, 種類, 予約の開始 (エポック分)) なので、
+    予約の日時が変わった場合は新しいお知らせとして扱います。
+    状態: pending (送る前・送り直し待ち) / sent (送信済み) / failed (送るのをあきらめた)
+    台帳はこのプログラムのメインのスレッドだけが読み書きします。
+    """
+
+    def __init__(self, path, max_attempts=5):
+        self.max_attempts = max_attempts
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS notifications (
+                tenant_id TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                start_minute INTEGER NOT NULL,
+                retry_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (tenant_id, event_id, kind, start_minute)
+            )""")
+        self._db.commit()
+
+    def claim(self, tenant_id, event_id, kind, start_minute):
+        """
+        これから送るお知らせを台帳に書き、送るべきなら retry_key を返す (送信済み・あきらめたものは None)。
+        前回「送る前」のまま止まっていたものは、同じ retry_key を返します。
+        """
+        key = (tenant_id, event_id, kind, start_minute)
+        with self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO notifications (tenant_id, event_id, kind, start_minute, retry_key, status, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 'pending', ?)", key + (str(uuid.uuid4()), time.time()))
+        status, retry_key = self._db.execute(
+            "SELECT status, retry_key FROM notifications"
+            " WHERE tenant_id = ? AND event_id = ? AND kind = ? AND start_minute = ?", key).fetchone()
+        return retry_key if status == 'pending' else None
+
+    def record(self, results):
+        """送った結果 [(Notification, 'sent' または 'failed' または 'pending', 試した回数, エラー), ...] をまとめて書く"""
+        with self._db:
+            for notification, status, attempts, error in results:
+                self._db.execute(
+                    "UPDATE notifications SET status = CASE WHEN ? = 'pending' AND attempts + ? >= ? THEN 'failed' ELSE ? END,"
+                    " attempts = attempts + ?, last_error = ?, updated_at = ?"
+                    " WHERE tenant_id = ? AND event_id = ? AND kind = ? AND start_minute = ?",
+                    (status, attempts, self.max_attempts, status, attempts, error, time.time(),
+                     notification.tenant_id, notification.event_id, notification.kind, notification.start_minute))
+
+    def purge_before(self, start_minute):
+        """予約の開始が start_minute より前のお知らせを台帳から消し、消した件数を返す"""
+        with self._db:
+            return self._db.execute("DELETE FROM notifications WHERE start_minute < ?", (start_minute,)).rowcount
+
+    def counts(self):
+        """状態ごとの件数"""
+        return dict(self._db.execute("SELECT status, COUNT(*) FROM notifications GROUP BY status").fetchall())
+
+
+# --- お知らせを作って送る ---
+
+_templates = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+    autoescape=False,  # LINE のテキストメッセージなので HTML のエスケープはしない
+    trim_blocks=True,
+    lstrip_blocks=True,
+    undefined=jinja2.StrictUndefined,
+)
+
+
+def render_message(tenant, kind, details, start_minute):
+    """お知らせの文面を作る (店舗用の文面があればそちらを使う)"""
+    template = _templates.select_template([f"{tenant.tenant_id}/{kind}.txt", f"{kind}.txt"])
+    start = jst_datetime(start_minute)
+    return template.render(
+        shop_name=tenant.shop_name,
+        shop_phone=tenant.shop_phone,
+        name=details.get('reservist_name', ''),
+        guests=details.get('number_of_guests', ''),
+        seat_type=details.get('seat_type', ''),
+        date_label=f"{start.month}月{start.day}日（{JAPANESE_WEEKDAYS[start.weekday()][0]}）",
+        time_label=start.strftime('%H:%M'),
+    ).strip()
+
+
+def prepare_notifications(tenant, ledger, kind, events, stats):
+    """予定の一覧から、まだ送っていない (LINE のIDがある) 予約のお知らせを作る"""
+    notifications = []
+    for event in events:
+        try:
+            details = json.loads(event.get('description') or '{}')
+        except json.JSONDecodeError:
+            continue
+        minutes = event_epoch_minutes(event)
+        if not isinstance(details, dict) or not details.get('seat_type') or minutes is None:
+            continue # 予約フォームで受け付けた予約ではない予定
+        line_user_id = details.get('line_user_id')
+        if not line_user_id:
+            stats['no_line_id'] += 1
+            continue
+        retry_key = ledger.claim(tenant.tenant_id, event['id'], kind, minutes[0])
+        if retry_key is None:
+            continue
+        notifications.append(Notification(tenant.tenant_id, event['id'], kind, minutes[0], line_user_id,
+                                          render_message(tenant, kind, details, minutes[0]), retry_key))
+    return notifications
+
+
+def deliver(sender, notification, retries, backoff_seconds):
+    """1件を送る (一時的なエラーは間隔を倍にしながら retries 回まで送り直す)。(状態, 試した回数, エラー) を返す"""
+    for attempt in range(1, retries + 2):
+        try:
+            sender.send(notification)
+            return 'sent', attempt, None
+        except DeliveryError as error:
+            if not error.retryable:
+                return 'failed', attempt, str(error)
+            if attempt > retries:
+                return 'pending', attempt, str(error) # 次の確認の時にもう一度送る
+            time.sleep(backoff_seconds * 2 ** (attempt - 1) * (0.5 + random.random())) # 同時に送り直さないよう揺らす
+
+
+def send_batches(sender, ledger, notifications, pool, batch_size, retries, backoff_seconds, stats):
+    """batch_size 件ずつ並行して送り、1まとまりごとに結果を台帳に書く"""
+    for offset in range(0, len(notifications), batch_size):
+        batch = notifications[offset:offset + batch_size]
+        outcomes = list(pool.map(lambda notification: deliver(sender, notification, retries, backoff_seconds), batch))
+        ledger.record([(notification,) + outcome for notification, outcome in zip(batch, outcomes)])
+        for notification, (status, _, error) in zip(batch, outcomes):
+            stats[status] += 1
+            if error:
+                print(f"◆◆◆ [{notification.tenant_id}] {notification.kind} の送信に失敗 ({status}): "
+                      f"{notification.event_id}: {error} ◆◆◆")
+
+
+class NotifyWorker:
+    """全店舗について、確認とリマインドのお知らせを1回分ずつ送る"""
+
+    def __init__(self, tenants, senders, ledger, reminder_time, confirm_lookback_minutes=1440,
+                 concurrency=4, batch_size=50, retries=3, backoff_seconds=1.0):
+        self.tenants = tenants
+        self.senders = senders                # 店舗ID -> 送信の方法
+        self.ledger = ledger
+        self.reminder_minute = reminder_time  # リマインドを送り始める時刻 (日本時間の0時からの分数)
+        self.confirm_lookback_minutes = confirm_lookback_minutes
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='notify')
+        self._reminded = {}                   # 店舗ID -> リマインドを送り終えた予約日 (同じ日に何度も読まないため)
+
+    def run_once(self):
+        """1回分の確認と送信を行い、件数の内訳を返す"""
+        stats = Counter()
+        now_minute = epoch_minute(datetime.datetime.now(datetime.timezone.utc))
+        self.ledger.purge_before(now_minute - 30 * 24 * 60) # 1か月より前の予約の記録は消す
+        for tenant in self.tenants:
+            sender = self.senders.get(tenant.tenant_id)
+            if sender is None or tenant.calendar_client is None:
+                continue
+            self._confirmations(tenant, sender, now_minute, stats)
+            self._reminders(tenant, sender, now_minute, stats)
+        return stats
+
+    def _confirmations(self, tenant, sender, now_minute, stats):
+        # 最近登録・変更された、これからの予定だけを読む (created で新しく登録されたものに絞る)
+        since = now_minute - self.confirm_lookback_minutes
+        try:
+            events = tenant.calendar_client.list_events(now_minute, now_minute + 366 * 24 * 60,
+                                                        updated_min=rfc3339_utc(since))
+        except (CircuitOpenError,) + CALENDAR_ERRORS as error:
+            print(f"◆◆◆ [{tenant.tenant_id}] 新しい予約の確認に失敗しました: {error} ◆◆◆")
+            return
+        events = [event for event in events if _created_minute(event) >= since]
+        notifications = prepare_notifications(tenant, self.ledger, CONFIRMATION, events, stats)
+        send_batches(sender, self.ledger, notifications, self.pool, self.batch_size, self.retries,
+                     self.backoff_seconds, stats)
+
+    def _reminders(self, tenant, sender, now_minute, stats):
+        today = jst_today()
+        if now_minute < jst_epoch_minute(today.isoformat(), self.reminder_minute):
+            return
+        target_date = (today + datetime.timedelta(days=1)).isoformat()
+        if self._reminded.get(tenant.tenant_id) == target_date:
+            return
+        try:
+            # 翌日の予約は1回の問い合わせでまとめて読む
+            events = tenant.calendar_client.list_events(jst_epoch_minute(target_date, 0),
+                                                        jst_epoch_minute(target_date, 24 * 60))
+        except (CircuitOpenError,) + CALENDAR_ERRORS as error:
+            print(f"◆◆◆ [{tenant.tenant_id}] {target_date} の予約の読み込みに失敗しました: {error} ◆◆◆")
+            return
+        pending_before = stats['pending']
+        notifications = prepare_notifications(tenant, self.ledger, REMINDER, events, stats)
+        send_batches(sender, self.ledger, notifications, self.pool, self.batch_size, self.retries,
+                     self.backoff_seconds, stats)
+        if stats['pending'] == pending_before: # 送り直し待ちが残っていなければ、今日はもう読まない
+            self._reminded[tenant.tenant_id] = target_date
+        if notifications:
+            print(f"★★★ [{tenant.tenant_id}] {target_date} のご予約 {len(notifications)}件のリマインドを処理しました ★★★")
+
+
+def _created_minute(event):
+    # 予定が登録された時刻 (エポック分)。分からなければ更新された時刻を使う
+    value = event.get('created') or event.get('updated')
+    if not value:
+        return 0
+    return epoch_minute(datetime.datetime.fromisoformat(value.replace('Z', '+00:00')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ご予約の確認とリマインドのお知らせを送ります。")
+    parser.add_argument('--once', action='store_true', help="1回だけ確認して終わる (cron などから呼ぶ場合)")
+    parser.add_argument('--sender', choices=('line', 'stub'), help="送信の方法 (省略時は NOTIFY_SENDER、既定は line)")
+    parser.add_argument('--stub-file', help="--sender stub の時に、送る内容を書くファイル (省略時は表示するだけ)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    try:
+        hour, minute = (int(part) for part in os.getenv('NOTIFY_REMINDER_TIME', '10:00').split(':'))
+    except ValueError:
+        sys.exit("◆◆◆ NOTIFY_REMINDER_TIME は HH:MM の形式で指定してください。 ◆◆◆")
+    interval_seconds = float(os.getenv('NOTIFY_INTERVAL_SECONDS', '60'))
+
+    tenants = load_tenants()
+    senders = {}
+    for tenant in tenants:
+        sender = create_sender(tenant, args.sender, args.stub_file)
+        if sender is not None:
+            senders[tenant.tenant_id] = sender
+    if not senders:
+        sys.exit("◆◆◆ お知らせを送れる店舗がありません。.envファイルの設定を確認してください。 ◆◆◆")
+
+    ledger = SentLedger(os.getenv('NOTIFY_LEDGER_FILE', 'notifications.sqlite3'),
+                        max_attempts=int(os.getenv('NOTIFY_MAX_ATTEMPTS', '5')))
+    worker = NotifyWorker(
+        tenants, senders, ledger, hour * 60 + minute,
+        confirm_lookback_minutes=int(os.getenv('NOTIFY_CONFIRM_LOOKBACK_MINUTES', '1440')),
+        concurrency=int(os.getenv('NOTIFY_CONCURRENCY', '4')),
+        batch_size=int(os.getenv('NOTIFY_BATCH_SIZE', '50')),
+        retries=int(os.getenv('NOTIFY_RETRIES', '3')),
+    )
+    print(f"★★★ お知らせの送信を開始します (リマインド: 前日 {hour:02d}:{minute:02d} 以降) ★★★")
+    while True:
+        stats = worker.run_once()
+        if stats['sent'] or stats['pending'] or stats['failed']: # 送るものがなかった回は表示しない
+            print(f"{datetime.datetime.now(JST).strftime('%H:%M:%S')} "
+                  + ', '.join(f"{label} {stats[name]}件" for name, label in STAT_LABELS.items() if stats[name]))
+        if args.once:
+            break
+        time.sleep(interval_seconds)
+    worker.pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,63 +1,35 @@
-import datetime
-import os.path
 import json # JSONを扱うために追加
+import os
+import sys
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+# yoyaku フォルダーの core パッケージ (カレンダー接続の共通部品) を使います
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+from core import CALENDAR_ERRORS, SCOPES_READ_ONLY, get_calendar_client
+from core.jst_time import jst_epoch_minute, jst_datetime, rfc3339_utc
 
-def main():
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
+def main():
+    # 'token.json' というファイルに、ユーザーのアクセストークンとリフレッシュトークンが保存されます
+    # (場所は OAUTH_TOKEN_FILE で変えられます)。token.json がない場合は、credentials.json
+    # (OAUTH_CLIENT_SECRETS_FILE) を使ってログイン（認証）してもらいます。
+    # CALENDAR_ID がなければ、メインのカレンダー ('primary') を読みます。
+    calendar_client = get_calendar_client(SCOPES_READ_ONLY)
+    if calendar_client is None:
+        print('カレンダーに接続できませんでした。')
+        return
 
     try:
-        service = build('calendar', 'v3', credentials=creds)
-
-        # --- ここから変更・注目ポイント ---
-
         # 検索したい日付と時刻を指定します
         # 例: 2025年6月15日の19:00から21:00 (日本時間で指定)
-        # まずは日本時間でdatetimeオブジェクトを作成
-        start_time_jp = datetime.datetime(2025, 6, 15, 19, 0, 0) # 年, 月, 日, 時, 分, 秒
-        end_time_jp = datetime.datetime(2025, 6, 15, 21, 0, 0)   # 年, 月, 日, 時, 分, 秒
+        # 日本時間からUTCへの変換は core/jst_time.py が zoneinfo で行います。
+        start_minute = jst_epoch_minute('2025-06-15', 19 * 60)
+        end_minute = jst_epoch_minute('2025-06-15', 21 * 60)
 
-        # Google Calendar APIはUTC（協定世界時）で時刻を扱うため、日本時間からUTCに変換します。
-        # 日本はUTCより9時間進んでいるので、9時間引きます。
-        # (より正確にはタイムゾーン対応ライブラリを使うべきですが、今回はシンプルに)
-        time_offset = datetime.timedelta(hours=9)
-        start_time_utc = start_time_jp - time_offset
-        end_time_utc = end_time_jp - time_offset
+        print(f"検索期間 (UTC): {rfc3339_utc(start_minute)} から {rfc3339_utc(end_minute)} まで")
+        print(f"検索期間 (日本時間): {jst_datetime(start_minute).strftime('%Y-%m-%d %H:%M:%S')} から {jst_datetime(end_minute).strftime('%Y-%m-%d %H:%M:%S')} まで")
 
-        # APIで使える形式 (ISOフォーマット文字列) に変換
-        time_min = start_time_utc.isoformat() + 'Z'
-        time_max = end_time_utc.isoformat() + 'Z'
-
-        print(f"検索期間 (UTC): {time_min} から {time_max} まで")
-        print(f"検索期間 (日本時間): {start_time_jp.strftime('%Y-%m-%d %H:%M:%S')} から {end_time_jp.strftime('%Y-%m-%d %H:%M:%S')} まで")
-
-
-        events_result = service.events().list(
-            calendarId='primary', # メインカレンダーを指定
-            timeMin=time_min,     # 検索開始時刻
-            timeMax=time_max,     # 検索終了時刻
-            singleEvents=True,
-            orderBy='startTime').execute()
-        events = events_result.get('items', [])
+        events = calendar_client.list_events(start_minute, end_minute)
 
         if not events:
             print('その時間帯に予定は見つかりませんでした。')
@@ -87,10 +59,8 @@ def main():
                 # JSONとして読み取れなかった場合 (ただの文字列だった場合など)
                 print("  予約詳細: (説明欄はJSON形式ではありませんでした)")
 
-        # --- ここまでが変更・注目ポイント ---
-
-    except HttpError as error:
+    except CALENDAR_ERRORS as error:
         print(f'エラーが発生しました: {error}')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,262 @@
+# replay_traffic.py (記録したアクセスの再生 - 負荷試験用)
+#
+# traffic_log.py で記録したアクセス (TRAFFIC_LOG_FILE) を、記録された間隔のまま、または10倍・100倍に縮めて送り直し、
+# 1秒あたりの処理件数・ステータスと結果の内訳・処理時間のパーセンタイル (p50/p95/p99) を表示します。
+# 金曜18時に予約ページの案内が届いた直後のような混雑を再現して、本番に出す前に予約の処理が遅くなっていないかを確かめます。
+#
+# --target を付けなければ、このプロセスの中で予約フォーム (app.py) を偽物のカレンダー (CALENDAR_BACKEND=fake) に
+# つないで起動し、そこへ送ります (本物のカレンダーには一切書き込みません)。偽物のカレンダーの遅さや障害は
+# .env と同じ FAKE_CALENDAR_LATENCY_MS / FAKE_CALENDAR_FAILURE_RATE で指定できます。
+# 予約の日付は、記録した日から今日までの週の数だけ後ろにずらします (曜日と「何日先の予約か」がそのままになるように)。
+#
+# 使い方の例:
+#   python replay_traffic.py traffic.jsonl                       (記録と同じ速さ)
+#   python replay_traffic.py traffic.jsonl --speed 100           (100倍速)
+#   python replay_traffic.py traffic.jsonl --speed 10 --since "2025-07-04 17:50" --until "2025-07-04 18:30"
+#   python replay_traffic.py traffic.jsonl --speed 10 --max-p95-ms 200 (予約の送信の p95 が 200ms を超えたら終了コード 1)
+#   python replay_traffic.py traffic.jsonl --target http://127.0.0.1:5000 (起動済みのアプリへ送る)
+
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import http.client
+import http.cookies
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+from core.jst_time import JST, jst_today
+from traffic_log import OUTCOME_LABELS, classify_outcome, flashes_from_cookie, read_traffic_log
+
+PAGE_LABELS = {'index': "予約フォーム (/)", 'submit_reservation': "予約の送信"}
+
+
+def percentile(sorted_values, q):
+    """並べ替え済みの一覧の q パーセンタイル (nearest-rank)。空なら None"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def page_of(record):
+    """記録1件が予約フォームのページか予約の送信か"""
+    return 'submit_reservation' if record['p'].rstrip('/').endswith('/submit_reservation') else 'index'
+
+
+def parse_jst(text):
+    """'YYYY-MM-DD HH:MM' (日本時間) を UNIX 秒にする"""
+    return datetime.datetime.strptime(text, '%Y-%m-%d %H:%M').replace(tzinfo=JST).timestamp()
+
+
+def date_shift_days(records):
+    """記録した日から今日までを週単位に切り上げた日数 (曜日を変えずに、予約の日付を今日より後ろにするため)"""
+    recorded_on = datetime.datetime.fromtimestamp(records[0]['t'], JST).date()
+    days = (jst_today() - recorded_on).days
+    return -(-days // 7) * 7 if days > 0 else 0
+
+
+def shifted_form(form, shift_days):
+    """予約の日付を shift_days 日ずらしたフォームの項目を返す"""
+    form = dict(form)
+    try:
+        date_obj = datetime.date.fromisoformat(form.get('reservation_date', ''))
+    except ValueError:
+        return form # 日付の形式が誤っている送信は、そのまま送り直す (入力チェックで弾かれるはず)
+    form['reservation_date'] = (date_obj + datetime.timedelta(days=shift_days)).isoformat()
+    return form
+
+
+def start_local_app():
+    """
+    偽物のカレンダーにつないだ予約フォームをこのプロセスの中で起動し、(URL, サーバー) を返す。
+    アプリの設定より先に環境変数を決めておく必要があるため、ここで初めて app.py を読み込みます。
+    """
+    os.environ['CALENDAR_BACKEND'] = 'fake'
+    os.environ['WAITLIST_SYNC_SECONDS'] = '0' # 再生中は変更の確認を行わない
+    os.environ.pop('TRAFFIC_LOG_FILE', None)  # 再生したアクセスを記録し直さない
+    os.environ['WAITLIST_DB_FILE'] = ':memory:' # 再生で受け付けたキャンセル待ちを本物の一覧に残さない
+    from werkzeug.serving import make_server
+    import app as reservation_app
+
+    real_tenants = [tenant.tenant_id for tenant in reservation_app.tenants if tenant.calendar_backend != 'fake']
+    if real_tenants:
+        sys.exit(f"◆◆◆ 店舗 {', '.join(real_tenants)} の CALENDAR_BACKEND が fake ではないため再生できません "
+                 f"(TENANTS_FILE の設定を確認してください)。 ◆◆◆")
+    logging.getLogger('werkzeug').setLevel(logging.WARNING) # 1件ごとのアクセスのログは出さない
+    server = make_server('127.0.0.1', 0, reservation_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='replay-server', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+class Replayer:
+    """記録を予定の時刻に送り、結果を集める"""
+
+    def __init__(self, target, speed, shift_days, concurrency, timeout_seconds):
+        parsed = urllib.parse.urlsplit(target)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self.prefix = parsed.path.rstrip('/')
+        self.speed = speed
+        self.shift_days = shift_days
+        self.concurrency = concurrency
+        self.timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self._etags = {}            # (ホスト, パス) -> 最後に受け取った ETag (キャッシュ確認付きのアクセスで送る)
+        self.results = []           # (ページ, ステータス, 結果, 処理時間 (ミリ秒))
+        self.lags = []              # 予定の時刻から実際に送るまでの遅れ (ミリ秒)
+
+    def run(self, records):
+        """全件を送り終えるまで待ち、かかった秒数を返す"""
+        first = records[0]['t']
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for record in records:
+                due = started + (record['t'] - first) / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, record, due)
+        return time.perf_counter() - started
+
+    def _send(self, record, due):
+        sent = time.perf_counter()
+        page = page_of(record)
+        headers = {'Host': record.get('h') or self.host}
+        body = None
+        etag_key = (headers['Host'], record['p'])
+        if page == 'submit_reservation':
+            body = urllib.parse.urlencode(shifted_form(record.get('f', {}), self.shift_days))
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif record.get('c'):
+            with self._lock:
+                etag = self._etags.get(etag_key)
+            if etag:
+                headers['If-None-Match'] = etag
+
+        connection = self.connection_class(self.host, self.port, timeout=self.timeout_seconds)
+        try:
+            connection.request(record.get('m', 'POST' if body else 'GET'), self.prefix + record['p'], body, headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            if page == 'submit_reservation':
+                outcome = self._outcome(response.getheader('Set-Cookie'), status)
+            else:
+                outcome = str(status)
+                if response.getheader('ETag'):
+                    with self._lock:
+                        self._etags[etag_key] = response.getheader('ETag')
+        except (OSError, http.client.HTTPException) as error:
+            status, outcome = 0, f"接続失敗 ({type(error).__name__})"
+        finally:
+            connection.close()
+        elapsed_ms = (time.perf_counter() - sent) * 1000
+        with self._lock:
+            self.results.append((page, status, outcome, elapsed_ms))
+            self.lags.append((sent - due) * 1000)
+
+    @staticmethod
+    def _outcome(set_cookie, status):
+        # 予約の送信の結果は、リダイレクトと一緒に送られるセッション Cookie の flash メッセージから見分ける
+        if set_cookie:
+            cookie = http.cookies.SimpleCookie()
+            cookie.load(set_cookie)
+            if 'session' in cookie:
+                flashes = flashes_from_cookie(cookie['session'].value)
+                if flashes:
+                    return classify_outcome(*flashes[-1])
+        return str(status)
+
+
+def format_ms(value):
+    return f"{value:7.1f}" if value is not None else '      -'
+
+
+def print_report(records, replayer, elapsed_seconds):
+    """スループット・ステータスと結果の内訳・処理時間のパーセンタイルを表示する"""
+    results = replayer.results
+    recorded_seconds = records[-1]['t'] - records[0]['t']
+    print(f"\n再生: {len(results)}件 (記録 {recorded_seconds:.1f}秒分 → {elapsed_seconds:.1f}秒, {replayer.speed:g}倍速)")
+    print(f"スループット: {len(results) / elapsed_seconds:.1f}件/秒" if elapsed_seconds > 0 else "スループット: -")
+
+    print("\n処理時間 (ミリ秒)")
+    print("   件数     p50     p95     p99    最大  ページ")
+    for page, label in PAGE_LABELS.items():
+        times = sorted(result[3] for result in results if result[0] == page)
+        if not times:
+            continue
+        print(f"{len(times):7d} " + ' '.join(format_ms(percentile(times, q)) for q in (50, 95, 99, 100)) + f"  {label}")
+
+    statuses = Counter(result[1] for result in results)
+    print("\nステータス: " + ', '.join(f"{status or '接続失敗'} ×{count}" for status, count in sorted(statuses.items())))
+
+    recorded = Counter(record.get('o', '-') for record in records if page_of(record) == 'submit_reservation')
+    replayed = Counter(result[2] for result in results if result[0] == 'submit_reservation')
+    if recorded or replayed:
+        print("\n予約の送信の結果 (記録時 → 再生)")
+        for outcome in sorted(set(recorded) | set(replayed), key=lambda name: -replayed[name]):
+            print(f"{recorded[outcome]:7d} → {replayed[outcome]:5d}  {OUTCOME_LABELS.get(outcome, outcome)}")
+
+    lags = sorted(replayer.lags)
+    print(f"\n送信の遅れ (予定の時刻から): p95 {percentile(lags, 95):.1f}ms, 最大 {lags[-1]:.1f}ms")
+    if percentile(lags, 95) > 100:
+        print("★ 送信が予定に追いついていません。--concurrency を増やすか、--speed を下げてください。")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="記録したアクセスを送り直して、予約フォームの処理性能を測ります。")
+    parser.add_argument('log', help="traffic_log.py で記録したファイル (TRAFFIC_LOG_FILE)")
+    parser.add_argument('--speed', type=float, default=1.0, help="再生の速さ (1, 10, 100 など。既定: 1)")
+    parser.add_argument('--target', help="送り先のアプリの URL (省略時はこのプロセスの中で偽物のカレンダーにつないで起動)")
+    parser.add_argument('--since', help="この時刻以降の記録だけを再生 (日本時間 'YYYY-MM-DD HH:MM')")
+    parser.add_argument('--until', help="この時刻より前の記録だけを再生 (日本時間 'YYYY-MM-DD HH:MM')")
+    parser.add_argument('--concurrency', type=int, default=64, help="同時に送る最大件数 (既定: 64)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="1件あたりのタイムアウト秒数 (既定: 30)")
+    parser.add_argument('--max-p95-ms', type=float,
+                        help="予約の送信の p95 がこれを超えたら終了コード 1 (デプロイ前の確認用)")
+    parser.add_argument('--app-log', help="起動したアプリのログの保存先 (省略時は表示しない)")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed は 0 より大きい値を指定してください")
+
+    records = read_traffic_log(args.log)
+    try:
+        if args.since:
+            records = [record for record in records if record['t'] >= parse_jst(args.since)]
+        if args.until:
+            records = [record for record in records if record['t'] < parse_jst(args.until)]
+    except ValueError:
+        parser.error("--since / --until は 'YYYY-MM-DD HH:MM' の形式で指定してください")
+    if not records:
+        sys.exit("◆◆◆ 再生できる記録がありません。 ◆◆◆")
+
+    shift_days = date_shift_days(records)
+    with open(args.app_log or os.devnull, 'a', encoding='utf-8') as app_log:
+        # アプリの print は大量に出るので、再生中はファイル (または捨て先) へ送る
+        with contextlib.redirect_stdout(app_log):
+            target, server = (args.target, None) if args.target else start_local_app()
+        print(f"{len(records)}件を {target} へ {args.speed:g}倍速で送ります (予約の日付は {shift_days}日後ろへずらします)")
+        replayer = Replayer(target, args.speed, shift_days, args.concurrency, args.timeout)
+        with contextlib.redirect_stdout(app_log):
+            elapsed_seconds = replayer.run(records)
+        if server is not None:
+            server.shutdown()
+
+    print_report(records, replayer, elapsed_seconds)
+    if args.max_p95_ms is not None:
+        times = sorted(result[3] for result in replayer.results if result[0] == 'submit_reservation')
+        p95 = percentile(times, 95)
+        if p95 is not None and p95 > args.max_p95_ms:
+            print(f"◆◆◆ 予約の送信の p95 ({p95:.1f}ms) が上限 {args.max_p95_ms:g}ms を超えました ◆◆◆")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# tenants.py (複数店舗の設定 - 1つのアプリで複数のお店の予約を受け付けるため)
+#
+# .env の TENANTS_FILE に店舗の一覧 (JSON) を書くと、店舗ごとに別のカレンダー・席数・定休日で予約を受け付けます。
+# 店舗ごとの設定は .env と同じ名前で書き、書かなかった項目は .env の値を使います。
+# 例 (tenants.json):
+#   [
+#     {"id": "showaya", "hosts": ["showaya.example.jp"], "default": true,
+#      "settings": {"CALENDAR_ID": "xxxx@group.calendar.google.com", "TOTAL_COUNTER_SEATS": 11}},
+#     {"id": "ekimae",
+#      "settings": {"CALENDAR_ID": "yyyy@group.calendar.google.com", "SERVICE_ACCOUNT_FILE": "ekimae-key.json",
+#                   "SHOP_HOLIDAYS": "毎週火曜日", "TOTAL_COUNTER_SEATS": 8, "TOTAL_TABLE_UNITS": 4}}
+#   ]
+# お店のページは /ekimae/ のようにパスで、または hosts に書いたホスト名で開けます。
+# どちらにも当てはまらない / へのアクセスは "default": true の店舗 (なければ1番目の店舗) が受けます。
+# TENANTS_FILE がなければ、これまで通り .env の設定だけで1店舗として動きます。
+#
+# 店舗ごとに持つもの: 入力チェック、カレンダーのクライアント (サーキットブレーカー)、空席状況ボード、
+# キャンセル待ち、予約フォームのページのキャッシュ。ボードは店舗ごとに覚えておく日付の数に上限があり
+# (OCCUPANCY_MAX_DATES)、大きな店舗の予約が小さな店舗の情報を追い出すことはありません。
+# Flask のワーカー (スレッド) と Calendar API のサービス・認証情報 (同じ鍵ファイルなら同じもの) は全店舗で共有します。
+
+import json
+import os
+import re
+import threading
+
+from validation import compile_validator, slot_times
+
+from core import OccupancyBoard, StalePolicy, Waitlist
+from core.calendar_client import create_calendar_client
+from core.jst_time import jst_datetime
+from core.seat_policy import COUNTER, TABLE, RESERVED_UNITS, max_party_size, usage_for
+
+DEFAULT_TENANT_ID = 'default'
+_TENANT_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+# アプリのページと同じ名前は店舗IDに使えません (/submit_reservation などと区別できなくなるため)
+RESERVED_TENANT_IDS = {'submit_reservation', 'reservation_result', 'availability_stream', 'health', 'staff', 'static'}
+
+
+class Tenant:
+    """1つのお店の設定と、そのお店だけが使うもの (ボード・キャンセル待ち・ページのキャッシュなど)"""
+
+    def __init__(self, tenant_id, settings=None, hosts=(), duration_minutes=120, connect_calendar=True):
+        self.tenant_id = tenant_id
+        self.settings = dict(settings or {})
+        self.hosts = tuple(host.lower() for host in hosts)
+        self.duration_minutes = duration_minutes
+
+        self.total_counter_seats = int(self.setting('TOTAL_COUNTER_SEATS', '11')) # カウンターの総席数
+        self.total_table_units = int(self.setting('TOTAL_TABLE_UNITS', '2'))      # テーブルの総卓数
+        # ご予約後も必ず空けておくカウンター席数 (飛び込みのお客様の分)
+        self.reserved_units = dict(RESERVED_UNITS, **{
+            COUNTER: int(self.setting('COUNTER_RESERVED_SEATS', str(RESERVED_UNITS[COUNTER]))),
+        })
+        self.shop_name = self.setting('SHOP_NAME', "笑わ家") # ページの見出しとお知らせ (notify_worker.py) に使うお店の名前
+        self.shop_phone = self.setting('SHOP_PHONE_NUMBER', "お店の電話番号までお問い合わせください")
+        self.staff_api_token = self.setting('STAFF_API_TOKEN') # お店の方のページ (/staff/...) の合言葉 (なければ使えません)
+        self.opening_hours = self.setting('SHOP_OPENING_HOURS', "お問い合わせください")
+        self.shop_holidays = self.setting('SHOP_HOLIDAYS', "お問い合わせください")
+        self.nenmatsu_start = self.setting('NENMATSU_HOLIDAY_START_MONTH_DAY', "12-29")
+        self.nenshi_end = self.setting('NENSHI_HOLIDAY_END_MONTH_DAY', "01-03")
+        first_slot = self.setting('RESERVATION_FIRST_SLOT', '17:30')
+        last_slot = self.setting('RESERVATION_LAST_SLOT', '22:00')
+        slot_minutes = int(self.setting('RESERVATION_SLOT_MINUTES', '30'))
+        # 受付する時刻 ("HH:MM" -> (時, 分)、早い順)。予約フォームの時刻の選択肢と空席状況ボードの時間枠に使います
+        self.reservation_times = slot_times(first_slot, last_slot, slot_minutes)
+        self.max_days_ahead = int(self.setting('RESERVATION_MAX_DAYS_AHEAD', '60')) # 何日先まで予約を受け付けるか
+
+        # 入力チェック関数は起動時に一度だけ組み立てます (定休日ルールなどの解析を毎回しないため)
+        self.validate = compile_validator(
+            self.shop_holidays,
+            first_slot=first_slot,
+            last_slot=last_slot,
+            slot_interval_minutes=slot_minutes,
+            nenmatsu_start=self.nenmatsu_start,
+            nenshi_end=self.nenshi_end,
+            max_days_ahead=self.max_days_ahead,
+            line_channel_secret=self.setting('LINE_CHANNEL_SECRET'), # 予約フォームに届く LINE のIDの署名の確認用
+        )
+
+        # カレンダーを読めない間は、最後に見た予約状況から空きを計算します (古い情報なので控えめに見積もる)
+        self.stale_policy = StalePolicy(
+            counter_margin=int(self.setting('STALE_COUNTER_MARGIN', '2')),
+            table_margin=int(self.setting('STALE_TABLE_MARGIN', '1')),
+            max_age_seconds=float(self.setting('STALE_MAX_AGE_SECONDS', '3600')),
+        )
+
+        self.waitlist = Waitlist(
+            duration_minutes=duration_minutes,
+            max_entries_per_slot=int(self.setting('WAITLIST_MAX_PER_SLOT', '50')),
+            reserved_units=self.reserved_units,
+            # 受付とご案内中の状態を残すファイル (SQLite)。再起動しても、ワーカーが複数でも同じ一覧を使います
+            # (カレンダーにつながない読み取り専用のツールはキャンセル待ちを使わないので、ファイルを開きません)
+            path=self.setting('WAITLIST_DB_FILE', 'waitlist.sqlite3') if connect_calendar else ':memory:',
+            tenant_id=tenant_id,
+        )
+        self.occupancy_board = OccupancyBoard(
+            self.total_counter_seats,
+            self.total_table_units,
+            [hour * 60 + minute for hour, minute in self.reservation_times.values()],
+            self.summarize_slot,
+            duration_minutes=duration_minutes,
+            on_release=self.offer_freed_seats,
+            max_dates=int(self.setting('OCCUPANCY_MAX_DATES', '62')), # 覚えておく日付の数 (約2か月分)
+        )
+        # 空席状況の配信で、1日分の予定を読み直すまでの秒数 (カレンダーで直接変えられた予約を取り込むため)
+        self.occupancy_refresh_seconds = float(self.setting('OCCUPANCY_REFRESH_SECONDS', '300'))
+
+        # 予約フォームのページのキャッシュ (ページの中身は日付とお店の設定だけで決まります)
+        self.settings_fingerprint = json.dumps([
+            self.shop_name, self.opening_hours, self.shop_holidays, self.shop_phone, self.nenmatsu_start,
+            self.nenshi_end, self.max_days_ahead, list(self.reservation_times),
+        ], ensure_ascii=False)
+        self.index_page_cache = {}  # ページのURL (/ または /<店舗ID>/) -> {'key', 'body', 'etag'}
+        self.index_page_lock = threading.Lock()
+
+        self.calendar_backend = self.setting('CALENDAR_BACKEND', 'google').lower()
+        self.calendar_client = None # カレンダーと通信するためのクライアント (認証に失敗した場合は None のまま)
+        service_account_file = self.setting('SERVICE_ACCOUNT_FILE')
+        if not connect_calendar:
+            return # 読み取り専用のツールなどは、呼び出し元が自分でクライアントを作ります
+        if self.calendar_backend != 'fake' and not service_account_file:
+            # 予約フォームはサーバーで動かすため、サービスアカウントでの認証が必須です
+            print(f"◆◆◆ エラー: [{tenant_id}] SERVICE_ACCOUNT_FILE が設定されていません。 ◆◆◆")
+        else:
+            self.calendar_client = create_calendar_client(
+                self.calendar_backend,
+                self.setting('CALENDAR_ID'),
+                service_account_file,
+                breaker_name=f"google-calendar:{tenant_id}",
+            )
+
+    def setting(self, name, default=None):
+        """店舗の設定を読む。店舗に書かれていなければ .env の値、それもなければ default"""
+        value = self.settings.get(name)
+        if value is None:
+            value = os.getenv(name, default)
+        return value
+
+    def summarize_slot(self, free_counter_seats, free_table_units):
+        """1つの時間枠の空きから、フォームに送る「席タイプごとの受付可能な最大人数」を作る"""
+        return {
+            'counter': max_party_size(COUNTER, free_counter_seats, self.reserved_units),
+            'table': max_party_size(TABLE, free_table_units, self.reserved_units),
+        }
+
+    def offer_freed_seats(self, date_str, released):
+        """
+        ボードで予約が消えた (席が空いた) 時に呼ばれ、収まるキャンセル待ちのお客様をご案内中にする。
+        ご案内中のお客様は /staff/waitlist に出し、お店の方が確定か取り下げをするまで席を押さえておきます。
+        """
+        for entry in self.waitlist.match_released(self.occupancy_board, date_str, released):
+            print(f"★★★ [{self.tenant_id}] キャンセル待ちのご案内: 受付番号 {entry.entry_id} {entry.name}様 ({entry.phone}) "
+                  f"{jst_datetime(entry.start_minute).strftime('%Y-%m-%d %H:%M')} {entry.seat_type}席 {entry.guests}名様 ★★★")
+
+    def release_offer(self, entry_id):
+        """ご案内を取り下げ、押さえていた席を次のキャンセル待ちのお客様にご案内する。取り下げた WaitlistEntry を返します"""
+        entry = self.waitlist.release_offer(entry_id)
+        if entry is not None:
+            seats, tables = usage_for(entry.seat_type, entry.guests)
+            self.offer_freed_seats(entry.date, [(entry.start_minute, entry.start_minute + self.duration_minutes,
+                                                 seats, tables)])
+        return entry
+
+
+class TenantRegistry:
+    """店舗の一覧。URL のパスの店舗ID、またはホスト名から店舗を探します"""
+
+    def __init__(self, tenants, default_tenant_id=None):
+        self._by_id = {tenant.tenant_id: tenant for tenant in tenants}
+        self._by_host = {host: tenant for tenant in tenants for host in tenant.hosts}
+        self.default = self._by_id.get(default_tenant_id) or (tenants[0] if tenants else None)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, tenant_id):
+        return self._by_id.get(tenant_id)
+
+    def resolve(self, tenant_id, host):
+        """
+        リクエストの店舗を決める。パスに店舗IDがあればその店舗 (なければ None)、
+        なければホスト名 (ポート番号を除く) で探し、見つからなければ既定の店舗を返します。
+        """
+        if tenant_id is not None:
+            return self._by_id.get(tenant_id)
+        return self._by_host.get(host.split(':')[0].lower(), self.default)
+
+
+def load_tenants(tenants_file=None, duration_minutes=120, connect_calendar=True):
+    """
+    TENANTS_FILE (なければ .env だけで1店舗) から店舗の一覧を作る。設定の誤りは ValueError。
+    connect_calendar=False なら店舗のカレンダーのクライアントは作りません (tenant.calendar_client は None)。
+    """
+    tenants_file = tenants_file or os.getenv('TENANTS_FILE')
+    if not tenants_file:
+        return TenantRegistry([Tenant(DEFAULT_TENANT_ID, duration_minutes=duration_minutes,
+                                      connect_calendar=connect_calendar)])
+
+    with open(tenants_file, encoding='utf-8') as f:
+        entries = json.load(f)
+    tenants = []
+    default_tenant_id = None
+    for entry in entries:
+        tenant_id = entry.get('id', '')
+        if not _TENANT_ID_PATTERN.match(tenant_id) or tenant_id in RESERVED_TENANT_IDS:
+            raise ValueError(f"{tenants_file}: 店舗ID '{tenant_id}' は使えません (英小文字・数字・-・_ の32文字まで)")
+        if any(tenant.tenant_id == tenant_id for tenant in tenants):
+            raise ValueError(f"{tenants_file}: 店舗ID '{tenant_id}' が重複しています")
+        tenants.append(Tenant(tenant_id, entry.get('settings'), entry.get('hosts', ()), duration_minutes,
+                              connect_calendar))
+        if entry.get('default'):
+            default_tenant_id = tenant_id
+    if not tenants:
+        raise ValueError(f"{tenants_file}: 店舗が1つも書かれていません")
+    print(f"★★★ {len(tenants)}店舗の設定を {tenants_file} から読み込みました ★★★")
+    return TenantRegistry(tenants, default_tenant_id)
@@ -0,0 +1,38 @@
+# tests/conftest.py (テストの共通設定)
+#
+# yoyaku のモジュールはフォルダー直下で import される前提 (python app.py など) なので、
+# どこから pytest を実行しても同じように import できるようにします。
+# 実行例: python -m pytest -q yoyaku/tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import importlib
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def reservation_app():
+    """
+    偽物のカレンダー (CALENDAR_BACKEND=fake) につないだ予約フォーム (app.py)。
+    アプリはテスト全体で1つなので、テストごとに別の日付を使ってください。
+    """
+    saved = {name: os.environ.get(name)
+             for name in ('CALENDAR_BACKEND', 'WAITLIST_SYNC_SECONDS', 'WAITLIST_DB_FILE', 'TENANTS_FILE')}
+    os.environ['CALENDAR_BACKEND'] = 'fake'
+    os.environ['WAITLIST_SYNC_SECONDS'] = '0'
+    os.environ['WAITLIST_DB_FILE'] = ':memory:' # キャンセル待ちをファイルに残さない
+    os.environ.pop('TENANTS_FILE', None)
+    try:
+        module = importlib.import_module('app')
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    module.app.config['TESTING'] = True
+    return module
@@ -0,0 +1,162 @@
+# test_breaker.py (サーキットブレーカーの状態の移り変わりのテスト - 時計を差し替えて経過時間を進めます)
+
+import pytest
+
+from core.breaker import CircuitBreaker, CircuitOpenError
+from core.calendar_client import CALENDAR_ERRORS, CalendarClient
+from core.fake_calendar import FakeCalendarService
+from core.jst_time import jst_epoch_minute
+from core.occupancy import OccupancyBoard
+from core.vacancy import StalePolicy, calculate_vacancy
+
+CLOSED, OPEN, HALF_OPEN = CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Boom(Exception):
+    pass
+
+
+def fail():
+    raise Boom("calendar down")
+
+
+def ok():
+    return 'ok'
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def transitions():
+    return []
+
+
+@pytest.fixture
+def breaker(clock, transitions):
+    return CircuitBreaker('test', failure_threshold=3, reset_timeout=30.0, failure_exceptions=(Boom,),
+                          on_transition=lambda name, old, new: transitions.append((old, new)), clock=clock)
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(Boom):
+            breaker.call(fail)
+
+
+def test_stays_closed_below_threshold(breaker):
+    for _ in range(2):
+        with pytest.raises(Boom):
+            breaker.call(fail)
+    assert breaker.state == CLOSED
+    assert breaker.call(ok) == 'ok'
+    assert breaker.snapshot()['consecutive_failures'] == 0
+
+
+def test_success_resets_the_consecutive_count(breaker):
+    for _ in range(2):
+        with pytest.raises(Boom):
+            breaker.call(fail)
+    breaker.call(ok)
+    for _ in range(2):
+        with pytest.raises(Boom):
+            breaker.call(fail)
+    assert breaker.state == CLOSED
+
+
+def test_opens_at_threshold_and_short_circuits(breaker, clock, transitions):
+    trip(breaker)
+    assert breaker.state == OPEN
+    assert transitions == [(CLOSED, OPEN)]
+    called = []
+    clock.now = 29.9
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: called.append(1))
+    assert called == []
+    snapshot = breaker.snapshot()
+    assert snapshot['retry_in_seconds'] == pytest.approx(0.1)
+    assert snapshot['counts']['short_circuited'] == 1
+    assert snapshot['last_error'] == "Boom: calendar down"
+
+
+def test_half_open_trial_success_closes(breaker, clock, transitions):
+    trip(breaker)
+    clock.now = 30.0
+    assert breaker.call(ok) == 'ok'
+    assert breaker.state == CLOSED
+    assert transitions == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+
+
+def test_half_open_trial_failure_reopens_and_restarts_the_timer(breaker, clock, transitions):
+    trip(breaker)
+    clock.now = 31.0
+    with pytest.raises(Boom):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+    assert transitions == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, OPEN)]
+    clock.now = 60.0
+    with pytest.raises(CircuitOpenError):
+        breaker.call(ok)
+    clock.now = 61.0
+    assert breaker.call(ok) == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_only_one_trial_at_a_time(breaker, clock):
+    trip(breaker)
+    clock.now = 30.0
+
+    def trial():
+        # 試行中にもう1件来ても、カレンダーは呼ばずにすぐ失敗させる
+        with pytest.raises(CircuitOpenError):
+            breaker.call(ok)
+        return 'trial'
+
+    assert breaker.call(trial) == 'trial'
+    assert breaker.state == CLOSED
+
+
+def test_uncounted_exception_releases_the_trial(breaker, clock):
+    trip(breaker)
+    clock.now = 30.0
+    with pytest.raises(KeyError):
+        breaker.call(lambda: {}['missing'])
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(ok) == 'ok'
+    assert breaker.state == CLOSED
+
+
+# --- カレンダーのクライアント越し: 遮断中は保存済みの情報から見積もる ---
+
+def test_open_breaker_falls_back_to_the_board(clock):
+    fake = FakeCalendarService()
+    breaker = CircuitBreaker('calendar', failure_threshold=2, reset_timeout=30.0,
+                             failure_exceptions=CALENDAR_ERRORS, clock=clock)
+    client = CalendarClient(fake, 'shop', breaker=breaker, backend='fake')
+    board = OccupancyBoard(11, 2, [], None)
+    start, end = jst_epoch_minute('2099-07-02', 19 * 60), jst_epoch_minute('2099-07-02', 21 * 60)
+    policy = StalePolicy(counter_margin=1, table_margin=0)
+
+    assert calculate_vacancy(client, start, end, 11, 2, board=board, stale_policy=policy) == (11, 2, False)
+    fake.fail_next(2)
+    for _ in range(2):
+        assert calculate_vacancy(client, start, end, 11, 2, board=board, stale_policy=policy) == (10, 2, True)
+    assert breaker.state == OPEN
+
+    calls = fake.calls
+    assert calculate_vacancy(client, start, end, 11, 2, board=board, stale_policy=policy) == (10, 2, True)
+    assert fake.calls == calls # 遮断中はカレンダーを呼ばない
+
+    clock.now = 30.0
+    assert calculate_vacancy(client, start, end, 11, 2, board=board, stale_policy=policy) == (11, 2, False)
+    assert breaker.state == CLOSED
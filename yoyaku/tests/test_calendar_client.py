@@ -0,0 +1,27 @@
+# test_calendar_client.py (Calendar API のサービスの組み立てのテスト - 通信はしません)
+
+import threading
+
+from google.auth.credentials import AnonymousCredentials
+
+from core.calendar_client import build_calendar_service
+
+
+def request_http(service):
+    return service.events().list(calendarId='shop').http
+
+
+def test_each_thread_gets_its_own_http_with_shared_credentials():
+    credentials = AnonymousCredentials()
+    service = build_calendar_service(credentials, timeout_seconds=3)
+    main_http = request_http(service)
+    assert request_http(service) is main_http # 同じスレッドでは使い回す
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(request_http(service)))
+    thread.start()
+    thread.join()
+
+    assert other[0] is not main_http
+    assert other[0].credentials is main_http.credentials is credentials
+    assert other[0].http.timeout == main_http.http.timeout == 3
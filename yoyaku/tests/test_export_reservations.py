@@ -0,0 +1,54 @@
+# test_export_reservations.py (予約の書き出しのチェックポイントのテスト - 偽物のカレンダーを使います)
+
+import pytest
+
+from core.calendar_client import CalendarClient
+from core.fake_calendar import FakeCalendarService
+from core.jst_time import jst_datetime, jst_epoch_minute
+from export_reservations import export_reservations
+
+
+@pytest.fixture
+def client():
+    fake = FakeCalendarService()
+    for day in range(1, 6):
+        start = jst_epoch_minute(f'2099-07-0{day}', 19 * 60)
+        fake.add_event('shop', jst_datetime(start), jst_datetime(start + 120),
+                       {'seat_type': 'カウンター', 'seats_used': 2, 'reservist_name': f'客{day}'})
+    return CalendarClient(fake, 'shop', backend='fake')
+
+
+def export(client, tmp_path, **options):
+    return export_reservations(client, '2099-07-01', '2099-07-05', str(tmp_path / 'out.jsonl'), 'jsonl',
+                               str(tmp_path / 'checkpoint.json'), **options)
+
+
+def test_finished_export_is_not_repeated(client, tmp_path):
+    assert export(client, tmp_path, page_size=2)['records_written'] == 5
+    assert export(client, tmp_path, page_size=2)['finished']
+    assert len((tmp_path / 'out.jsonl').read_text(encoding='utf-8').splitlines()) == 5
+
+
+@pytest.mark.parametrize('changed', [{'page_size': 3}, {'page_size': 2, 'include_cancelled': True}])
+def test_checkpoint_from_other_fetch_options_is_not_resumed(client, tmp_path, changed):
+    export(client, tmp_path, page_size=2)
+    with pytest.raises(SystemExit, match='別の条件'):
+        export(client, tmp_path, **changed)
+
+
+def test_timeout_keeps_the_checkpoint_and_resumes(client, tmp_path, monkeypatch, capsys):
+    fake = client.service
+    inject_faults = fake._inject_faults
+
+    def time_out_on_the_second_page():
+        if fake.calls == 1:
+            fake.fail_next(1, 'timeout')
+        inject_faults()
+
+    monkeypatch.setattr(fake, '_inject_faults', time_out_on_the_second_page)
+    with pytest.raises(TimeoutError):
+        export(client, tmp_path, page_size=2)
+    assert '最後のチェックポイントから再開します' in capsys.readouterr().out
+
+    assert export(client, tmp_path, page_size=2)['records_written'] == 5
+    assert len((tmp_path / 'out.jsonl').read_text(encoding='utf-8').splitlines()) == 5
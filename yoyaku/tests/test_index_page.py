@@ -0,0 +1,39 @@
+# test_index_page.py (予約フォームのページのキャッシュと ETag のテスト)
+
+import datetime
+
+from core.jst_time import jst_today
+
+
+def get_index(reservation_app, etag=None):
+    headers = {'If-None-Match': f'"{etag}"'} if etag else {}
+    return reservation_app.app.test_client().get('/', headers=headers)
+
+
+def test_matching_etag_returns_not_modified(reservation_app):
+    first = get_index(reservation_app)
+    etag = first.get_etag()[0]
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    cached = get_index(reservation_app, etag)
+    assert cached.status_code == 304
+    assert cached.get_data() == b''
+    assert get_index(reservation_app, 'other').status_code == 200
+    assert get_index(reservation_app).get_etag()[0] == etag # 同じ日付なら作り直さない
+
+
+def test_page_changes_on_the_next_day(reservation_app, monkeypatch):
+    today = jst_today()
+    monkeypatch.setattr(reservation_app, 'jst_today', lambda: today)
+    first = get_index(reservation_app)
+    etag = first.get_etag()[0]
+    assert (today + datetime.timedelta(days=1)).isoformat() in first.get_data(as_text=True) # 選べる最初の日
+
+    tomorrow = today + datetime.timedelta(days=1)
+    monkeypatch.setattr(reservation_app, 'jst_today', lambda: tomorrow)
+    second = get_index(reservation_app, etag)
+    assert second.status_code == 200 # 前の日のページの ETag では 304 にしない
+    assert second.get_etag()[0] != etag
+    assert second.get_data() != first.get_data()
+    assert (tomorrow + datetime.timedelta(days=1)).isoformat() in second.get_data(as_text=True)
@@ -0,0 +1,94 @@
+# test_kuuseki_check.py (空席チェックのツールが、店舗ごとの席数と残しておく席数で答えることのテスト)
+
+import datetime
+
+import pytest
+
+import kuuseki_check
+from core.calendar_client import CalendarClient
+from core.fake_calendar import FakeCalendarService
+from core.jst_time import jst_datetime, jst_epoch_minute
+from core.seat_policy import COUNTER
+from kuuseki_check import answer, create_board, parse_query
+from tenants import Tenant
+
+
+def make_tenant(**settings):
+    return Tenant('shop', dict({'CALENDAR_BACKEND': 'fake'}, **settings), connect_calendar=False)
+
+
+def book_counter(board, query, seats):
+    board.record_window(query.date, query.start - 60, query.end + 60, [])
+    board.record_booking(query.date, 'booked', query.start, query.end, seats, 0)
+
+
+def test_answer_uses_the_tenants_reserved_seats():
+    query = parse_query(['2099-07-02', '19:00', '3', COUNTER])
+    strict = make_tenant()                                # 5席は残しておく (既定)
+    relaxed = make_tenant(COUNTER_RESERVED_SEATS='0')
+    boards = {}
+    for tenant in (strict, relaxed):
+        boards[tenant] = create_board(tenant)
+        book_counter(boards[tenant], query, 4)            # 11席中4席使用 → 空き7席
+    assert answer(strict, boards[strict], query, set()) == (7, 2, 2, '△ 要電話')
+    assert answer(relaxed, boards[relaxed], query, set()) == (7, 2, 4, '○ 予約可')
+
+
+def test_answer_uses_the_tenants_seat_totals():
+    query = parse_query(['2099-07-02', '19:00', '2', COUNTER])
+    tenant = make_tenant(TOTAL_COUNTER_SEATS='4', COUNTER_RESERVED_SEATS='0')
+    board = create_board(tenant)
+    book_counter(board, query, 0)
+    assert answer(tenant, board, query, set())[:3] == (4, 2, 4)
+
+
+def test_tenant_without_calendar_connection():
+    assert make_tenant().calendar_client is None
+
+
+def test_failed_or_unread_dates_are_not_answered():
+    query = parse_query(['2099-07-02', '19:00', '2', COUNTER])
+    tenant = make_tenant()
+    board = create_board(tenant)
+    assert answer(tenant, board, query, set())[3] == '取得失敗'
+    book_counter(board, query, 0)
+    assert answer(tenant, board, query, {'2099-07-02'})[3] == '取得失敗'
+
+
+# --- コマンドとして実行 ---
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeCalendarService()
+    monkeypatch.setenv('CALENDAR_BACKEND', 'fake')
+    monkeypatch.delenv('TENANTS_FILE', raising=False)
+    monkeypatch.setattr(kuuseki_check, 'load_dotenv', lambda: None)
+    monkeypatch.setattr(kuuseki_check, 'create_calendar_client',
+                        lambda *args, **kwargs: CalendarClient(fake, 'shop', backend='fake'))
+    return fake
+
+
+def run(monkeypatch, queries):
+    monkeypatch.setattr(kuuseki_check.sys, 'argv', ['kuuseki_check.py'] + queries)
+    kuuseki_check.main()
+
+
+def test_every_date_is_answered_even_beyond_the_forms_date_limit(fake, monkeypatch, capsys):
+    dates = [(datetime.date(2099, 1, 1) + datetime.timedelta(days=offset)).isoformat() for offset in range(100)]
+    last = dates[-1]
+    fake.add_event('shop', jst_datetime(jst_epoch_minute(last, 19 * 60)), jst_datetime(jst_epoch_minute(last, 21 * 60)),
+                   {'seat_type': COUNTER, 'seats_used': 11})
+    run(monkeypatch, [f'{date_str},19:00,2,カウンター' for date_str in dates])
+    output = capsys.readouterr().out
+    assert '取得失敗' not in output
+    assert output.count('○ 予約可') == 99 and output.count('× 満席') == 1
+    assert fake.calls == 100 # 日付ごとに1回だけ読む
+
+
+def test_unanswered_queries_fail_the_command(fake, monkeypatch, capsys):
+    fake.fail_next(1, 'timeout')
+    with pytest.raises(SystemExit) as excinfo:
+        run(monkeypatch, ['2099-07-01,19:00,2,カウンター', '2099-07-01,20:00,2,カウンター', '2099-07-02,19:00,2,カウンター'])
+    assert excinfo.value.code != 0
+    assert '2件の問い合わせに答えられませんでした' in str(excinfo.value.code)
+    assert capsys.readouterr().out.count('取得失敗') == 2
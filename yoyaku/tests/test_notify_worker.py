@@ -0,0 +1,185 @@
+# test_notify_worker.py (お知らせの送信済み台帳・送り直し・リマインドの読み込みのテスト - 偽物のカレンダーと StubSender を使います)
+
+import datetime
+import io
+import urllib.error
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+import notify_worker
+from core.calendar_client import CalendarClient
+from core.fake_calendar import FakeCalendarService
+from core.jst_time import epoch_minute, jst_datetime, jst_epoch_minute, jst_today
+from notify_worker import (
+    REMINDER, DeliveryError, LinePushSender, Notification, NotifyWorker, SentLedger, StubSender, deliver,
+)
+from tenants import Tenant
+
+KEY = ('shop', 'event1', REMINDER, 1000)
+
+
+def notification(retry_key='key'):
+    return Notification(*KEY[:3], KEY[3], 'U' + '0' * 32, 'テスト', retry_key)
+
+
+class FlakySender(StubSender):
+    """最初の failures 回は DeliveryError を起こし、その後は StubSender と同じく送ったことにする"""
+
+    def __init__(self, failures, retryable=True):
+        super().__init__()
+        self.failures = failures
+        self.retryable = retryable
+        self.attempts = 0
+
+    def send(self, notification):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise DeliveryError("temporarily unavailable", retryable=self.retryable)
+        super().send(notification)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(notify_worker, 'time', SimpleNamespace(sleep=sleeps.append))
+    monkeypatch.setattr(notify_worker.random, 'random', lambda: 0.5) # 揺らぎをなくす
+    return sleeps
+
+
+# --- 送信済み台帳 ---
+
+def test_claim_returns_the_same_retry_key_after_a_crash(tmp_path):
+    path = str(tmp_path / 'ledger.sqlite3')
+    retry_key = SentLedger(path).claim(*KEY)
+    assert retry_key
+
+    ledger = SentLedger(path) # 送る前に止まって再起動した
+    assert ledger.claim(*KEY) == retry_key
+    ledger.record([(notification(retry_key), 'sent', 1, None)])
+    assert ledger.claim(*KEY) is None
+    assert ledger.claim(*KEY[:3], KEY[3] + 60) not in (None, retry_key) # 予約の日時が変わったら別のお知らせ
+
+
+def test_pending_becomes_failed_after_max_attempts(tmp_path):
+    ledger = SentLedger(str(tmp_path / 'ledger.sqlite3'), max_attempts=3)
+    retry_key = ledger.claim(*KEY)
+    ledger.record([(notification(retry_key), 'pending', 2, 'timeout')])
+    assert ledger.claim(*KEY) == retry_key
+    assert ledger.counts() == {'pending': 1}
+
+    ledger.record([(notification(retry_key), 'pending', 1, 'timeout')])
+    assert ledger.counts() == {'failed': 1}
+    assert ledger.claim(*KEY) is None
+
+
+# --- 送り直し ---
+
+def test_deliver_backs_off_between_retries(sleeps):
+    sender = FlakySender(failures=2)
+    assert deliver(sender, notification(), retries=3, backoff_seconds=1.0) == ('sent', 3, None)
+    assert sleeps == [1.0, 2.0]
+    assert sender.sent == [notification()]
+
+
+def test_deliver_leaves_it_pending_when_retries_run_out(sleeps):
+    assert deliver(FlakySender(failures=5), notification(), retries=2, backoff_seconds=1.0) \
+        == ('pending', 3, "temporarily unavailable")
+    assert sleeps == [1.0, 2.0]
+
+
+def test_deliver_does_not_retry_a_non_retryable_error(sleeps):
+    sender = FlakySender(failures=1, retryable=False)
+    assert deliver(sender, notification(), retries=3, backoff_seconds=1.0) == ('failed', 1, "temporarily unavailable")
+    assert sleeps == [] and sender.attempts == 1
+
+
+@pytest.mark.parametrize('status, state', [
+    (409, 'sent'),     # 同じ X-Line-Retry-Key で受付済み (前回届いていた)
+    (400, 'failed'),   # 宛先の誤りなどは送り直さない
+    (429, 'pending'),
+    (500, 'pending'),
+])
+def test_line_push_status_codes(monkeypatch, sleeps, status, state):
+    requests = []
+
+    def urlopen(request, timeout):
+        requests.append(request)
+        raise urllib.error.HTTPError(request.full_url, status, 'error', {}, io.BytesIO(b'{}'))
+
+    monkeypatch.setattr(notify_worker.urllib.request, 'urlopen', urlopen)
+    outcome = deliver(LinePushSender('token'), notification('retry-1'), retries=0, backoff_seconds=1.0)
+    assert outcome[:2] == (state, 1)
+    assert (outcome[2] is None) == (status == 409)
+    assert requests[0].get_header('X-line-retry-key') == 'retry-1'
+
+
+# --- リマインド ---
+
+@pytest.fixture
+def fake():
+    return FakeCalendarService()
+
+
+@pytest.fixture
+def tenant(fake):
+    tenant = Tenant('shop', {'CALENDAR_BACKEND': 'fake'}, connect_calendar=False)
+    tenant.calendar_client = CalendarClient(fake, 'shop', backend='fake')
+    return tenant
+
+
+@pytest.fixture
+def make_worker(tmp_path):
+    workers = []
+
+    def make_worker(tenant, sender):
+        worker = NotifyWorker([tenant], {tenant.tenant_id: sender}, SentLedger(str(tmp_path / 'ledger.sqlite3')),
+                              reminder_time=0, retries=0, backoff_seconds=0)
+        workers.append(worker)
+        return worker
+    yield make_worker
+    for worker in workers:
+        worker.pool.shutdown()
+
+
+def add_reservation(fake, date_str, hour, line_user_id):
+    start = jst_epoch_minute(date_str, hour * 60)
+    fake.add_event('shop', jst_datetime(start), jst_datetime(start + 120), {
+        'seat_type': 'カウンター', 'seats_used': 2, 'reservist_name': 'テスト', 'number_of_guests': 2,
+        'line_user_id': line_user_id,
+    })
+
+
+def run_reminders(worker, tenant):
+    stats = Counter()
+    worker._reminders(tenant, worker.senders[tenant.tenant_id], epoch_minute(datetime.datetime.now(datetime.timezone.utc)),
+                      stats)
+    return stats
+
+
+def test_reminders_read_tomorrow_with_one_query(fake, tenant, make_worker):
+    tomorrow = (jst_today() + datetime.timedelta(days=1)).isoformat()
+    for hour in (18, 19, 20):
+        add_reservation(fake, tomorrow, hour, f'U{hour:032d}')
+    add_reservation(fake, (jst_today() + datetime.timedelta(days=2)).isoformat(), 19, 'U' + '9' * 32)
+    sender = StubSender()
+    worker = make_worker(tenant, sender)
+
+    assert run_reminders(worker, tenant)['sent'] == 3
+    assert fake.calls == 1
+    assert sorted(notification.to for notification in sender.sent) == [f'U{hour:032d}' for hour in (18, 19, 20)]
+    assert run_reminders(worker, tenant) == Counter() # 送り終えた日は読み直さない
+    assert fake.calls == 1
+
+
+def test_reminders_are_read_again_while_some_are_pending(fake, tenant, make_worker):
+    add_reservation(fake, (jst_today() + datetime.timedelta(days=1)).isoformat(), 19, 'U' + '1' * 32)
+    sender = FlakySender(failures=1)
+    worker = make_worker(tenant, sender)
+
+    assert run_reminders(worker, tenant)['pending'] == 1
+    assert run_reminders(worker, tenant)['sent'] == 1 # 送り直し待ちが残っていたので、もう一度読んで送る
+    assert fake.calls == 2
+    assert run_reminders(worker, tenant) == Counter()
+    assert fake.calls == 2 and len(sender.sent) == 1
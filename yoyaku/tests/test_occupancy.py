@@ -0,0 +1,193 @@
+# test_occupancy.py (空席状況ボードの日付の追い出しと、SSE 配信中の日付の扱いのテスト)
+
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from core import occupancy
+from core.jst_time import jst_datetime, jst_epoch_minute, jst_today
+from core.occupancy import OccupancyBoard
+from core.seat_policy import TABLE
+from validation import compile_validator
+
+
+def make_board(max_dates=2):
+    return OccupancyBoard(11, 2, [19 * 60], lambda counter, tables: {'counter': counter, 'table': tables},
+                          max_dates=max_dates)
+
+
+def booking(board, date_str, booking_id='a'):
+    start = jst_epoch_minute(date_str, 19 * 60)
+    board.record_booking(date_str, booking_id, start, start + 120, 0, 1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(occupancy, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_least_recently_used_date_is_forgotten():
+    board = make_board()
+    for date_str in ('2099-07-01', '2099-07-02', '2099-07-03'):
+        booking(board, date_str)
+    assert board.date_count() == 2
+    assert board.window_availability('2099-07-01', 0, 1) is None
+    assert board.availability('2099-07-01')[19 * 60] == (11, 2) # 予約を忘れている
+
+
+def test_subscribed_date_is_kept_until_unsubscribed():
+    board = make_board()
+    board.subscribe('2099-07-01')
+    booking(board, '2099-07-01')
+    for date_str in ('2099-07-02', '2099-07-03', '2099-07-04'):
+        booking(board, date_str)
+    assert board.availability('2099-07-01')[19 * 60] == (11, 1)
+
+    board.unsubscribe('2099-07-01')
+    booking(board, '2099-07-05')
+    booking(board, '2099-07-06')
+    assert board.availability('2099-07-01')[19 * 60] == (11, 2)
+
+
+def test_unsubscribe_trims_back_to_max_dates():
+    board = make_board(max_dates=1)
+    board.subscribe('2099-07-01')
+    board.subscribe('2099-07-02')
+    assert board.date_count() == 2
+    board.unsubscribe('2099-07-01')
+    assert board.date_count() == 1
+
+
+def test_event_ids_are_unique_across_dates_and_recreation():
+    board = make_board(max_dates=1)
+    version, payload = board.wait_for_update('2099-07-01', -1, 0)
+    assert payload.startswith(f"id: {version}\n".encode('utf-8'))
+    booking(board, '2099-07-02') # 07-01 を忘れる
+
+    # 作り直した 07-01 の最初の配信は、前の接続が覚えている id とは違う番号になる
+    assert board.claim_day_load('2099-07-01', 0, 1, 300) is True
+    new_version, new_payload = board.wait_for_update('2099-07-01', version, 0)
+    assert new_payload is not None
+    assert new_version > version
+
+
+def test_day_load_is_claimed_again_once_the_read_is_old(clock):
+    board = make_board()
+    start, end = jst_epoch_minute('2099-07-01', 17 * 60), jst_epoch_minute('2099-07-01', 24 * 60)
+    assert board.claim_day_load('2099-07-01', start, end, 300) is True
+    assert board.claim_day_load('2099-07-01', start, end, 300) is False # 読み込み中は他に任せない
+    board.record_window('2099-07-01', start, end, [])
+    board.release_day_load('2099-07-01')
+
+    assert board.claim_day_load('2099-07-01', start, end, 300) is False
+    clock.now += 300
+    assert board.claim_day_load('2099-07-01', start, end, 300) is True
+
+
+def test_failed_day_load_is_retried():
+    board = make_board()
+    assert board.claim_day_load('2099-07-01', 0, 1, 300) is True
+    board.release_day_load('2099-07-01') # 読めなかった (範囲は記録されない)
+    assert board.claim_day_load('2099-07-01', 0, 1, 300) is True
+
+
+def test_wait_for_update_returns_nothing_new_on_timeout():
+    board = make_board()
+    version, _ = board.wait_for_update('2099-07-01', -1, 0)
+    assert board.wait_for_update('2099-07-01', version, 0) == (version, None)
+    booking(board, '2099-07-01')
+    assert board.wait_for_update('2099-07-01', version, 0)[0] > version
+
+
+# --- 予約フォームの SSE 配信 ---
+
+def test_stream_pins_the_date_and_reloads_after_recreation(reservation_app, monkeypatch):
+    tenant = reservation_app.tenants.default
+    board = tenant.occupancy_board
+    monkeypatch.setattr(board, 'max_dates', 1)
+    date_str = (jst_today() + datetime.timedelta(days=40)).isoformat()
+    other_date = (jst_today() + datetime.timedelta(days=41)).isoformat()
+    tenant.calendar_client.service.add_event(
+        tenant.calendar_client.calendar_id, jst_datetime(jst_epoch_minute(date_str, 19 * 60)),
+        jst_datetime(jst_epoch_minute(date_str, 21 * 60)), {'seat_type': TABLE, 'tables_used': 2})
+
+    client = reservation_app.app.test_client()
+    response = client.get(f'/availability_stream?date={date_str}', buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks) == b"retry: 5000\n\n"
+    first = next(chunks).decode('utf-8')
+    assert '"19:00"' in first
+    assert board.availability(date_str)[19 * 60][1] == 0
+
+    board.availability(other_date) # 配信中の日付は追い出されない
+    assert board.availability(date_str)[19 * 60][1] == 0
+
+    response.close() # 接続が閉じられると押さえを外し、次に使った日付で追い出される
+    board.availability(other_date)
+    assert board.date_count() == 1
+
+    # 作り直された日付は、新しい接続でカレンダーから読み直す (前の id を送ってきても最新を配信する)
+    old_id = first.split('\n', 1)[0].split(': ', 1)[1]
+    response = client.get(f'/availability_stream?date={date_str}', headers={'Last-Event-ID': old_id},
+                          buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    second = next(chunks).decode('utf-8')
+    assert not second.startswith(f"id: {old_id}\n")
+    assert board.availability(date_str)[19 * 60][1] == 0
+    response.close()
+
+
+def first_payload(client, date_str):
+    response = client.get(f'/availability_stream?date={date_str}', buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    payload = next(chunks).decode('utf-8')
+    response.close()
+    return payload
+
+
+def test_new_subscriber_sees_a_booking_cancelled_in_the_calendar(reservation_app, clock):
+    tenant = reservation_app.tenants.default
+    service, calendar_id = tenant.calendar_client.service, tenant.calendar_client.calendar_id
+    date_str = (jst_today() + datetime.timedelta(days=42)).isoformat()
+    event = service.add_event(calendar_id, jst_datetime(jst_epoch_minute(date_str, 19 * 60)),
+                              jst_datetime(jst_epoch_minute(date_str, 21 * 60)), {'seat_type': TABLE, 'tables_used': 2})
+    client = reservation_app.app.test_client()
+    assert '"19:00":{"counter":4,"table":0}' in first_payload(client, date_str)
+
+    service.events().delete(calendarId=calendar_id, eventId=event['id']).execute() # お店の方がカレンダーで取り消した
+    assert tenant.occupancy_board.availability(date_str)[19 * 60] == (11, 0)   # まだ読み直していない
+    clock.now += tenant.occupancy_refresh_seconds
+    assert '"19:00":{"counter":4,"table":8}' in first_payload(client, date_str)
+    assert tenant.occupancy_board.availability(date_str)[19 * 60] == (11, 2)
+
+
+@pytest.mark.parametrize('days_ahead', [0, -1, 61, 3650])
+def test_stream_rejects_dates_that_cannot_be_booked(reservation_app, days_ahead):
+    board = reservation_app.tenants.default.occupancy_board
+    date_count = board.date_count()
+    date_str = (jst_today() + datetime.timedelta(days=days_ahead)).isoformat()
+    response = reservation_app.app.test_client().get(f'/availability_stream?date={date_str}')
+    assert response.status_code == 400
+    assert board.date_count() == date_count # ボードに日付を増やさない
+
+
+def test_stream_rejects_closed_days(reservation_app, monkeypatch):
+    tenant = reservation_app.tenants.default
+    monkeypatch.setattr(tenant, 'validate', compile_validator("毎週月曜日", max_days_ahead=60))
+    monday = jst_today() + datetime.timedelta(days=7 - jst_today().weekday())
+    response = reservation_app.app.test_client().get(f'/availability_stream?date={monday.isoformat()}')
+    assert response.status_code == 400
+    assert '定休日' in response.get_data(as_text=True)
@@ -0,0 +1,25 @@
+# test_tenants.py (店舗ごとの設定がページに反映されることのテスト)
+
+from flask import render_template
+
+from core.jst_time import jst_today
+from tenants import Tenant
+
+
+def test_form_is_titled_with_each_shops_name(reservation_app):
+    ekimae = Tenant('ekimae', {'CALENDAR_BACKEND': 'fake', 'SHOP_NAME': '駅前店'}, connect_calendar=False)
+    with reservation_app.app.test_request_context('/'):
+        page = render_template('reservation_form.html', **reservation_app.build_index_context(ekimae, jst_today()))
+    assert '<title>駅前店 予約フォーム</title>' in page
+    assert '<h1>駅前店 ご予約</h1>' in page
+    assert '笑わ家' not in page
+
+    # 名前だけが違っても、キャッシュしたページを使い回さない
+    renamed = Tenant('ekimae', {'CALENDAR_BACKEND': 'fake', 'SHOP_NAME': '駅前本店'}, connect_calendar=False)
+    assert renamed.settings_fingerprint != ekimae.settings_fingerprint
+
+
+def test_result_page_is_titled_with_the_shops_name(reservation_app, monkeypatch):
+    monkeypatch.setattr(reservation_app.tenants.default, 'shop_name', '駅前店')
+    page = reservation_app.app.test_client().get('/reservation_result').get_data(as_text=True)
+    assert '<title>ご予約結果 - 駅前店</title>' in page
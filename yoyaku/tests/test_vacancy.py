@@ -0,0 +1,167 @@
+# test_vacancy.py (空席計算と、カレンダーを読めない時の見積もりのテスト - 障害を起こせる偽物のカレンダーを使います)
+
+import datetime
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from core import occupancy
+from core.calendar_client import CalendarClient
+from core.fake_calendar import FakeCalendarService
+from core.jst_time import jst_datetime, jst_epoch_minute, jst_today
+from core.occupancy import OccupancyBoard
+from core.seat_policy import TABLE
+from core.vacancy import StalePolicy, calculate_vacancy
+
+DATE = '2099-07-02'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(occupancy, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def fake():
+    return FakeCalendarService()
+
+
+@pytest.fixture
+def client(fake):
+    return CalendarClient(fake, 'shop', backend='fake')
+
+
+@pytest.fixture
+def board():
+    return OccupancyBoard(11, 2, [17 * 60 + 30, 19 * 60, 21 * 60 + 30], lambda c, t: None)
+
+
+def minute(hhmm):
+    hour, minute_ = map(int, hhmm.split(':'))
+    return jst_epoch_minute(DATE, hour * 60 + minute_)
+
+
+def add_booking(fake, start, seat_type=TABLE, units=1):
+    details = {'seat_type': seat_type, 'tables_used' if seat_type == TABLE else 'seats_used': units}
+    fake.add_event('shop', jst_datetime(minute(start)), jst_datetime(minute(start) + 120), details)
+
+
+def vacancy(client, board, start, end, policy=None):
+    return calculate_vacancy(client, minute(start), minute(end), 11, 2, board=board,
+                             stale_policy=policy or StalePolicy(counter_margin=2, table_margin=1))
+
+
+def test_fresh_read(client, board, fake):
+    add_booking(fake, '19:00')
+    assert vacancy(client, board, '19:00', '21:00') == (11, 1, False)
+
+
+def test_stale_estimate_for_a_window_that_was_read(client, board, fake, clock):
+    add_booking(fake, '19:00')
+    vacancy(client, board, '17:00', '23:00')
+    fake.fail_next(1)
+    assert vacancy(client, board, '19:00', '21:00') == (9, 0, True) # 余裕の分 (2席・1卓) を差し引く
+
+
+def test_window_assembled_from_several_reads(client, board, fake, clock):
+    vacancy(client, board, '17:30', '19:30')
+    vacancy(client, board, '19:30', '21:30')
+    fake.fail_next(1)
+    assert vacancy(client, board, '18:00', '21:00') == (9, 1, True)
+
+
+@pytest.mark.parametrize('start, end', [('21:30', '23:30'), ('18:30', '20:30'), ('17:00', '19:00')])
+def test_no_estimate_for_a_window_that_was_not_fully_read(client, board, fake, clock, start, end):
+    add_booking(fake, '21:30')
+    add_booking(fake, '21:30')
+    vacancy(client, board, '17:30', '19:30') # 21:30 の予約はボードに入らない
+    fake.fail_next(1)
+    assert vacancy(client, board, start, end) == (-1, -1, True)
+
+
+def test_no_estimate_when_the_read_is_too_old(client, board, fake, clock):
+    vacancy(client, board, '17:00', '23:00')
+    policy = StalePolicy(max_age_seconds=600)
+    clock.now += 601
+    fake.fail_next(1)
+    assert vacancy(client, board, '19:00', '21:00', policy) == (-1, -1, True)
+    clock.now -= 2
+    fake.fail_next(1)
+    assert vacancy(client, board, '19:00', '21:00', policy)[2] is True
+    assert vacancy(client, board, '19:00', '21:00', policy) == (11, 2, False)
+
+
+def test_age_is_taken_from_the_oldest_part_of_the_window(client, board, fake, clock):
+    vacancy(client, board, '17:30', '19:30')
+    clock.now += 500
+    vacancy(client, board, '19:30', '21:30')
+    assert board.window_availability(DATE, minute('18:00'), minute('21:00'))[2] == 500
+    assert board.window_availability(DATE, minute('19:30'), minute('21:30'))[2] == 0
+    vacancy(client, board, '17:00', '23:00') # 読み直すと全体が新しくなる
+    assert board.window_availability(DATE, minute('18:00'), minute('21:00'))[2] == 0
+
+
+def test_no_estimate_without_a_board_or_policy(client, fake):
+    fake.fail_next(2)
+    assert calculate_vacancy(client, minute('19:00'), minute('21:00'), 11, 2) == (-1, -1, True)
+    assert calculate_vacancy(client, minute('19:00'), minute('21:00'), 11, 2, board=OccupancyBoard(11, 2, [], None)) \
+        == (-1, -1, True)
+
+
+# --- 予約フォーム: 見積もりの空きでは予約を確定しない ---
+
+def submit(reservation_app, date_str, time_str, guests='3', seat_type=TABLE):
+    response = reservation_app.app.test_client().post('/submit_reservation', data={
+        'reservation_date': date_str, 'reservation_time': time_str, 'num_guests': guests,
+        'seat_type': seat_type, 'reservist_name': 'テスト', 'phone_number': '09000000000',
+    }, follow_redirects=True)
+    return response.get_data(as_text=True)
+
+
+def table_bookings_at(service, calendar_id, date_str, time_str):
+    hour, minute_ = map(int, time_str.split(':'))
+    start = jst_epoch_minute(date_str, hour * 60 + minute_)
+    events = service.events().list(calendarId=calendar_id).execute()['items']
+    return sum(json.loads(event['description']).get('tables_used', 0) for event in events
+               if jst_datetime(start).isoformat() == event['start']['dateTime'])
+
+
+def test_unread_bookings_are_not_overbooked(reservation_app):
+    tenant = reservation_app.tenants.default
+    service = tenant.calendar_client.service
+    date_str = (jst_today() + datetime.timedelta(days=30)).isoformat()
+    for _ in range(2): # ボードがまだ読んでいない 21:30 の予約で、テーブルが埋まっている
+        service.add_event(tenant.calendar_client.calendar_id,
+                          jst_datetime(jst_epoch_minute(date_str, 21 * 60 + 30)),
+                          jst_datetime(jst_epoch_minute(date_str, 23 * 60 + 30)),
+                          {'seat_type': TABLE, 'tables_used': 1})
+
+    assert 'ご予約を承りました' in submit(reservation_app, date_str, '17:30')
+    service.fail_next(1)
+    assert 'ご予約を承りました' not in submit(reservation_app, date_str, '21:30')
+    assert table_bookings_at(service, tenant.calendar_client.calendar_id, date_str, '21:30') == 2
+
+
+def test_stale_estimate_does_not_create_a_booking(reservation_app, monkeypatch):
+    tenant = reservation_app.tenants.default
+    service = tenant.calendar_client.service
+    monkeypatch.setattr(tenant.stale_policy, 'table_margin', 0) # 見積もりでも空きがあることにする
+    date_str = (jst_today() + datetime.timedelta(days=31)).isoformat()
+
+    assert 'ご予約を承りました' in submit(reservation_app, date_str, '19:00')
+    service.fail_next(1)
+    page = submit(reservation_app, date_str, '19:00')
+    assert '最新の空席状況を確認できないため、ご予約を確定できませんでした' in page
+    assert 'キャンセル待ち' not in page
+    assert table_bookings_at(service, tenant.calendar_client.calendar_id, date_str, '19:00') == 1
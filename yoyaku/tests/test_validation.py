@@ -0,0 +1,294 @@
+# test_validation.py (予約フォームの入力チェックのテスト - 受付可・受付不可のすべての分岐)
+
+import datetime
+
+import pytest
+from flask import render_template
+
+from core.jst_time import jst_today
+from core.seat_policy import COUNTER, TABLE
+from tenants import Tenant
+from validation import (
+    FORMAT_ERROR_MESSAGE, NAME_MISSING_MESSAGE, PAST_DATE_MESSAGE, PHONE_MISSING_MESSAGE,
+    ReservationRejected, ReservationRequest, compile_validator, sign_line_user_id, verify_line_user_id,
+)
+
+TODAY = datetime.date(2025, 7, 1) # 火曜日
+
+BASE_FORM = {
+    'reservation_date': '2025-07-02', 'reservation_time': '19:00', 'num_guests': '3',
+    'seat_type': COUNTER, 'reservist_name': 'テスト', 'phone_number': '',
+}
+
+
+def form(**overrides):
+    return dict(BASE_FORM, **overrides)
+
+
+def rejection(validate, **overrides):
+    """受付不可になることを確かめ、そのメッセージを返す"""
+    with pytest.raises(ReservationRejected) as excinfo:
+        validate(form(**overrides), TODAY)
+    return str(excinfo.value)
+
+
+@pytest.fixture
+def validate():
+    return compile_validator("毎週日曜日、年末年始、祝日")
+
+
+# --- 受付可 ---
+
+def test_accepts_counter_reservation(validate):
+    assert validate(form(), TODAY) == ReservationRequest(
+        datetime.date(2025, 7, 2), 19, 0, 3, COUNTER, 3, 'テスト', '', '')
+
+
+def test_accepts_table_reservation_and_counts_tables(validate):
+    result = validate(form(seat_type=TABLE, num_guests='5', phone_number='09000000000'), TODAY)
+    assert (result.seat_type, result.guests, result.units, result.phone) == (TABLE, 5, 2, '09000000000')
+    assert validate(form(seat_type=TABLE, num_guests='4', phone_number='0900'), TODAY).units == 1
+
+
+def test_strips_surrounding_whitespace(validate):
+    result = validate(form(reservist_name='  山田  ', reservation_time=' 17:30 '), TODAY)
+    assert (result.name, result.hour, result.minute) == ('山田', 17, 30)
+
+
+def test_first_and_last_slot_are_bookable(validate):
+    assert validate(form(reservation_time='17:30'), TODAY).hour == 17
+    assert validate(form(reservation_time='22:00'), TODAY).hour == 22
+
+
+# --- 項目の形式 (スキーマ) ---
+
+@pytest.mark.parametrize('field', ['reservation_date', 'reservation_time', 'num_guests', 'seat_type'])
+def test_required_field_missing(validate, field):
+    assert rejection(validate, **{field: ''}) == FORMAT_ERROR_MESSAGE
+    assert rejection(validate, **{field: '   '}) == FORMAT_ERROR_MESSAGE
+
+
+def test_required_field_absent_from_form(validate):
+    incomplete = form()
+    del incomplete['num_guests']
+    with pytest.raises(ReservationRejected, match=FORMAT_ERROR_MESSAGE):
+        validate(incomplete, TODAY)
+
+
+@pytest.mark.parametrize('field, max_length', [
+    ('reservation_date', 10), ('reservation_time', 5), ('num_guests', 1), ('seat_type', 10),
+    ('reservist_name', 50), ('phone_number', 20),
+])
+def test_field_too_long(validate, field, max_length):
+    assert rejection(validate, **{field: 'x' * (max_length + 1)}) == FORMAT_ERROR_MESSAGE
+
+
+def test_name_and_phone_at_max_length_are_accepted(validate):
+    result = validate(form(reservist_name='名' * 50, phone_number='0' * 20), TODAY)
+    assert (len(result.name), len(result.phone)) == (50, 20)
+
+
+@pytest.mark.parametrize('guests', ['0', '9', 'x', '-'])
+def test_guests_format(validate, guests):
+    assert rejection(validate, num_guests=guests) == FORMAT_ERROR_MESSAGE
+
+
+@pytest.mark.parametrize('date_str', ['2025/07/02', '2025-7-2', '20250702', 'tomorrow'])
+def test_date_format(validate, date_str):
+    assert rejection(validate, reservation_date=date_str) == FORMAT_ERROR_MESSAGE
+
+
+@pytest.mark.parametrize('date_str', ['2025-02-30', '2025-13-01', '2025-04-31'])
+def test_nonexistent_date(validate, date_str):
+    assert rejection(validate, reservation_date=date_str) == FORMAT_ERROR_MESSAGE
+
+
+# --- 日付 ---
+
+@pytest.mark.parametrize('date_str', ['2025-07-01', '2025-06-30'])
+def test_today_and_past_dates(validate, date_str):
+    assert rejection(validate, reservation_date=date_str) == PAST_DATE_MESSAGE
+
+
+def test_dates_beyond_the_booking_window():
+    validate = compile_validator("", max_days_ahead=60)
+    assert validate(form(reservation_date='2025-08-30'), TODAY) # 60日後
+    assert '60日先まで' in rejection(validate, reservation_date='2025-08-31')
+
+
+def test_booking_window_is_open_ended_unless_configured(validate):
+    assert validate(form(reservation_date='2027-07-01'), TODAY)
+
+
+def test_check_date_applies_the_same_date_rules():
+    check_date = compile_validator("毎週日曜日", max_days_ahead=60).check_date
+    assert check_date(datetime.date(2025, 7, 2), TODAY) is None
+    for date_obj, message in [(datetime.date(2025, 7, 1), PAST_DATE_MESSAGE), (datetime.date(2025, 7, 6), '定休日'),
+                              (datetime.date(2025, 9, 1), '60日先まで')]:
+        with pytest.raises(ReservationRejected, match=message):
+            check_date(date_obj, TODAY)
+
+
+def test_weekly_closed_day():
+    validate = compile_validator("毎週水曜日")
+    message = rejection(validate, reservation_date='2025-07-02')
+    assert '2025年07月02日（水曜日）は、毎週水曜日のため定休日' in message
+    assert validate(form(reservation_date='2025-07-03'), TODAY).date == datetime.date(2025, 7, 3)
+
+
+def test_several_weekly_closed_days():
+    validate = compile_validator("毎週火曜日・毎週水曜日")
+    assert '毎週火曜日のため' in rejection(validate, reservation_date='2025-07-08')
+    assert '毎週水曜日のため' in rejection(validate, reservation_date='2025-07-02')
+    assert validate(form(reservation_date='2025-07-03'), TODAY)
+
+
+@pytest.mark.parametrize('date_str', ['2025-12-29', '2025-12-31', '2026-01-01', '2026-01-03'])
+def test_year_end_closure_across_december_and_january(date_str):
+    validate = compile_validator("年末年始")
+    assert '年末年始の休業期間のため' in rejection(validate, reservation_date=date_str)
+
+
+@pytest.mark.parametrize('date_str', ['2025-12-28', '2026-01-04'])
+def test_days_just_outside_year_end_closure(date_str):
+    validate = compile_validator("年末年始")
+    assert validate(form(reservation_date=date_str), TODAY).date.isoformat() == date_str
+
+
+def test_year_end_closure_follows_configured_period():
+    validate = compile_validator("年末年始", nenmatsu_start='12-30', nenshi_end='01-05')
+    assert validate(form(reservation_date='2025-12-29'), TODAY)
+    assert '年末年始' in rejection(validate, reservation_date='2025-12-30')
+    assert '年末年始' in rejection(validate, reservation_date='2026-01-05')
+    assert validate(form(reservation_date='2026-01-06'), TODAY)
+
+
+def test_year_end_closure_is_off_unless_configured():
+    assert compile_validator("毎週日曜日")(form(reservation_date='2025-12-30'), TODAY)
+
+
+def test_closed_on_every_holiday():
+    validate = compile_validator("祝日")
+    assert '祝日のため' in rejection(validate, reservation_date='2025-07-21') # 海の日 (月曜日)
+    assert '祝日のため' in rejection(validate, reservation_date='2025-09-23') # 秋分の日 (火曜日)
+
+
+def test_closed_only_on_holiday_mondays():
+    validate = compile_validator("祝日の月曜日")
+    assert '祝日のため' in rejection(validate, reservation_date='2025-07-21') # 海の日 (月曜日)
+    assert validate(form(reservation_date='2025-09-23'), TODAY)               # 秋分の日 (火曜日)
+    assert validate(form(reservation_date='2025-07-28'), TODAY)               # 祝日ではない月曜日
+
+
+def test_weekly_monday_closure_takes_precedence_over_holiday_mondays():
+    validate = compile_validator("毎週月曜日、祝日の月曜日")
+    assert '毎週月曜日のため' in rejection(validate, reservation_date='2025-07-21')
+    assert validate(form(reservation_date='2025-09-23'), TODAY)
+
+
+def test_no_closed_days():
+    validate = compile_validator("")
+    assert validate(form(reservation_date='2025-07-21'), TODAY)
+    assert validate(form(reservation_date='2025-12-31'), TODAY)
+
+
+# --- 時刻・お名前・電話番号・席タイプ ---
+
+@pytest.mark.parametrize('time_str', ['17:00', '22:30', '23:00', '19:15', '7:30'])
+def test_out_of_hours(validate, time_str):
+    assert rejection(validate, reservation_time=time_str) == \
+        "ご希望のお時間は受付時間外でございます。\n17:30～22:00 の間でお選びください。"
+
+
+def test_slots_follow_configuration():
+    validate = compile_validator("", first_slot='18:00', last_slot='21:00', slot_interval_minutes=60)
+    assert validate(form(reservation_time='20:00'), TODAY).hour == 20
+    assert '18:00～21:00' in rejection(validate, reservation_time='19:30')
+
+
+def test_missing_name(validate):
+    assert rejection(validate, reservist_name='') == NAME_MISSING_MESSAGE
+    assert rejection(validate, reservist_name='  ') == NAME_MISSING_MESSAGE
+
+
+def test_phone_required_from_four_guests(validate):
+    assert rejection(validate, num_guests='4') == PHONE_MISSING_MESSAGE
+    assert rejection(validate, seat_type=TABLE, num_guests='8') == PHONE_MISSING_MESSAGE
+    assert validate(form(num_guests='3'), TODAY).phone == ''
+    assert validate(form(num_guests='4', phone_number='09000000000'), TODAY).guests == 4
+
+
+def test_unknown_seat_type(validate):
+    assert rejection(validate, seat_type='座敷') == "テスト様、ご希望の席タイプを正しくお選びください。"
+
+
+def test_counter_party_too_large(validate):
+    assert rejection(validate, num_guests='5', phone_number='0900') == \
+        "テスト様、申し訳ありません。カウンター席は1～4名様でのご案内でございます。"
+
+
+def test_table_party_too_small(validate):
+    assert rejection(validate, seat_type=TABLE, num_guests='2') == \
+        "テスト様、申し訳ありません。テーブル席は3名様からのご案内でございます。"
+
+
+def test_table_party_too_large():
+    # フォームの人数は8名までなので、人数の上限を広げた設定で確かめる
+    validate = compile_validator("", max_guests=9)
+    assert '8名様を超えるご予約はお受けできません' in rejection(
+        validate, seat_type=TABLE, num_guests='9', phone_number='0900')
+
+
+# --- LINE のID ---
+
+SECRET = 'channel-secret'
+LINE_USER_ID = 'U' + '0123456789abcdef' * 2
+
+
+@pytest.fixture
+def line_validate():
+    return compile_validator("", line_channel_secret=SECRET)
+
+
+def test_signed_line_user_id_is_kept(line_validate):
+    signed = sign_line_user_id(LINE_USER_ID, SECRET)
+    assert len(signed) <= 100
+    assert line_validate(form(line_user_id=signed), TODAY).line_user_id == LINE_USER_ID
+
+
+@pytest.mark.parametrize('value', [
+    '', LINE_USER_ID, LINE_USER_ID + '.', LINE_USER_ID + '.' + '0' * 64,
+    sign_line_user_id(LINE_USER_ID, 'other-secret'),
+    sign_line_user_id('U' + 'f' * 32, SECRET).replace('U' + 'f' * 32, LINE_USER_ID), # 別のIDの署名
+    sign_line_user_id('U' + 'A' * 32, SECRET), sign_line_user_id('U123', SECRET),
+])
+def test_unsigned_or_forged_line_user_id_is_dropped_without_rejecting(line_validate, value):
+    assert line_validate(form(line_user_id=value), TODAY).line_user_id == ''
+
+
+def test_line_user_id_is_never_used_without_a_channel_secret(validate):
+    signed = sign_line_user_id(LINE_USER_ID, '')
+    assert validate(form(line_user_id=signed), TODAY).line_user_id == ''
+    assert verify_line_user_id(signed, None) == ''
+
+
+def test_overlong_line_user_id_is_a_format_error(line_validate):
+    assert rejection(line_validate, line_user_id='U' * 101) == FORMAT_ERROR_MESSAGE
+
+
+# --- 予約フォームのページ: 時刻の選択肢は入力チェックと同じ設定から作る ---
+
+def test_form_offers_exactly_the_times_the_validator_accepts(reservation_app):
+    settings = {'CALENDAR_BACKEND': 'fake', 'RESERVATION_FIRST_SLOT': '11:00', 'RESERVATION_LAST_SLOT': '13:00',
+                'RESERVATION_SLOT_MINUTES': '60'}
+    tenant = Tenant('lunch', settings, connect_calendar=False)
+    with reservation_app.app.test_request_context('/'):
+        page = render_template('reservation_form.html', **reservation_app.build_index_context(tenant, jst_today()))
+    assert '<option value="11:00">11:00</option>' in page
+    assert '<option value="13:00">13:00 (最終)</option>' in page
+    assert 'value="17:30"' not in page and 'value="12:30"' not in page
+    assert tenant.validate(form(reservation_time='12:00', reservation_date='2025-07-02'), TODAY)
+
+    # 時刻の設定だけが違っても、キャッシュしたページを使い回さない
+    tenant_every_30_minutes = Tenant('lunch', dict(settings, RESERVATION_SLOT_MINUTES='30'), connect_calendar=False)
+    assert tenant_every_30_minutes.settings_fingerprint != tenant.settings_fingerprint
@@ -0,0 +1,156 @@
+# test_waitlist.py (キャンセル待ちのご案内と、お店の方による確定・取り下げのテスト)
+
+import datetime
+
+import pytest
+
+from core.jst_time import jst_epoch_minute, jst_today
+from core.occupancy import OccupancyBoard
+from core.seat_policy import TABLE
+from core.waitlist import Waitlist
+from tenants import Tenant
+
+DATE = '2099-07-02'
+START = jst_epoch_minute(DATE, 19 * 60)
+END = START + 120
+NO_RESERVE = {'カウンター': 0, TABLE: 0}
+
+
+@pytest.fixture
+def board():
+    board = OccupancyBoard(11, 2, [], None)
+    board.record_window(DATE, jst_epoch_minute(DATE, 0), jst_epoch_minute(DATE, 24 * 60), [])
+    board.record_booking(DATE, 'a', START, END, 0, 1)
+    board.record_booking(DATE, 'b', START, END, 0, 1)
+    return board
+
+
+@pytest.fixture
+def waitlist():
+    return Waitlist(reserved_units=NO_RESERVE)
+
+
+def test_offer_holds_the_seats_until_staff_act(board, waitlist):
+    first = waitlist.add(DATE, START, TABLE, 4, '山田', '090')
+    second = waitlist.add(DATE, START, TABLE, 4, '佐藤', '080')
+
+    board.record_window(DATE, START, END, []) # 2卓とも空く
+    assert waitlist.match_released(board, DATE, [(START, END, 0, 2)]) == [first, second]
+    assert [entry for entry, _ in waitlist.offered()] == [first, second]
+    assert len(waitlist) == 0
+
+    third = waitlist.add(DATE, START, TABLE, 3, '鈴木', '070')
+    # ご案内中の2卓は押さえてあるので、同じ空きをもう一度ご案内しない
+    assert waitlist.match_released(board, DATE, [(START, END, 0, 2)]) == []
+    assert waitlist.release_offer(second.entry_id) == second
+    assert waitlist.match_released(board, DATE, [(START, END, 0, 1)]) == [third]
+    assert waitlist.confirm_offer(first.entry_id) == first
+    assert [entry for entry, _ in waitlist.offered()] == [third]
+
+
+def test_offered_customer_is_not_registered_twice(board, waitlist):
+    entry = waitlist.add(DATE, START, TABLE, 3, '山田', '090')
+    board.record_window(DATE, START, END, [])
+    waitlist.match_released(board, DATE, [(START, END, 0, 2)])
+    assert waitlist.add(DATE, START, TABLE, 3, '山田', '090') == entry
+    waitlist.confirm_offer(entry.entry_id)
+    assert waitlist.add(DATE, START, TABLE, 3, '山田', '090') != entry
+
+
+def test_unknown_offer(waitlist):
+    assert waitlist.confirm_offer(99) is None
+    assert waitlist.release_offer(99) is None
+
+
+def test_purge_removes_past_offers(board, waitlist):
+    entry = waitlist.add(DATE, START, TABLE, 3, '山田', '090')
+    board.record_window(DATE, START, END, [])
+    waitlist.match_released(board, DATE, [(START, END, 0, 2)])
+    assert waitlist.purge_before('2099-07-03') == 1
+    assert waitlist.offered() == []
+    assert waitlist.confirm_offer(entry.entry_id) is None
+
+
+def test_entries_and_offers_survive_a_restart(board, tmp_path):
+    path = str(tmp_path / 'waitlist.sqlite3')
+    waitlist = Waitlist(reserved_units=NO_RESERVE, path=path, tenant_id='shop')
+    offered = waitlist.add(DATE, START, TABLE, 8, '山田', '090')
+    waiting = waitlist.add(DATE, START, TABLE, 4, '佐藤', '080') # 2卓とも山田様にご案内する
+    board.record_window(DATE, START, END, [])
+    assert waitlist.match_released(board, DATE, [(START, END, 0, 2)]) == [offered]
+
+    restarted = Waitlist(reserved_units=NO_RESERVE, path=path, tenant_id='shop')
+    assert [entry for entry, _ in restarted.offered()] == [offered]
+    assert len(restarted) == 1 and restarted.dates() == [DATE]
+    assert restarted.add(DATE, START, TABLE, 4, '佐藤', '080') == waiting # 索引も作り直されている
+    assert restarted.add(DATE, START, TABLE, 8, '山田', '090') == offered
+    assert restarted.add(DATE, START, TABLE, 3, '鈴木', '070').entry_id > waiting.entry_id
+    assert Waitlist(path=path, tenant_id='other').offered() == [] # 店舗ごとに分かれている
+
+
+def test_workers_sharing_the_file_see_the_same_offers(board, tmp_path):
+    path = str(tmp_path / 'waitlist.sqlite3')
+    first = Waitlist(reserved_units=NO_RESERVE, path=path)
+    entry = first.add(DATE, START, TABLE, 4, '山田', '090')
+    second = Waitlist(reserved_units=NO_RESERVE, path=path) # 後から起動したワーカー (同じご希望を読み込む)
+    board.record_window(DATE, START, END, [])
+
+    assert first.match_released(board, DATE, [(START, END, 0, 2)]) == [entry]
+    assert second.match_released(board, DATE, [(START, END, 0, 2)]) == [] # 同じご希望を2回ご案内しない
+    assert [offer for offer, _ in second.offered()] == [entry]
+    assert second.confirm_offer(entry.entry_id) == entry # お店の方の操作がどのワーカーに届いてもよい
+    assert first.offered() == [] and first.release_offer(entry.entry_id) is None
+
+
+def test_tenant_release_offers_the_seats_to_the_next_customer():
+    tenant = Tenant('shop', {'CALENDAR_BACKEND': 'fake', 'TOTAL_TABLE_UNITS': '1'}, connect_calendar=False)
+    board = tenant.occupancy_board
+    board.record_window(DATE, jst_epoch_minute(DATE, 0), jst_epoch_minute(DATE, 24 * 60), [])
+    board.record_booking(DATE, 'a', START, END, 0, 1)
+    first = tenant.waitlist.add(DATE, START, TABLE, 3, '山田', '090')
+    second = tenant.waitlist.add(DATE, START, TABLE, 3, '佐藤', '080')
+
+    board.record_window(DATE, START, END, []) # 予約 a がキャンセルされた (on_release でご案内)
+    assert [entry for entry, _ in tenant.waitlist.offered()] == [first]
+    assert tenant.release_offer(first.entry_id) == first
+    assert [entry for entry, _ in tenant.waitlist.offered()] == [second]
+
+
+# --- お店の方のページ ---
+
+def test_staff_pages_need_the_token(reservation_app, monkeypatch):
+    client = reservation_app.app.test_client()
+    tenant = reservation_app.tenants.default
+    assert client.get('/staff/waitlist').status_code == 403 # 合言葉が設定されていない
+    monkeypatch.setattr(tenant, 'staff_api_token', 'secret')
+    assert client.get('/staff/waitlist').status_code == 403
+    assert client.get('/staff/waitlist', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.post('/staff/waitlist/1/confirm').status_code == 403
+    assert client.get('/staff/waitlist', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_staff_confirm_and_release(reservation_app, monkeypatch):
+    client = reservation_app.app.test_client()
+    tenant = reservation_app.tenants.default
+    monkeypatch.setattr(tenant, 'staff_api_token', 'secret')
+    auth = {'Authorization': 'Bearer secret'}
+    date_str = (jst_today() + datetime.timedelta(days=50)).isoformat()
+    start = jst_epoch_minute(date_str, 19 * 60)
+    board = tenant.occupancy_board
+    board.record_window(date_str, jst_epoch_minute(date_str, 0), jst_epoch_minute(date_str, 24 * 60), [])
+    for booking_id in ('x', 'y'):
+        board.record_booking(date_str, booking_id, start, start + 120, 0, 1)
+    first = tenant.waitlist.add(date_str, start, TABLE, 3, '山田', '090')
+    second = tenant.waitlist.add(date_str, start, TABLE, 3, '佐藤', '080')
+    board.record_window(date_str, start, start + 120, []) # 2件ともキャンセル
+
+    listing = client.get('/staff/waitlist', headers=auth).get_json()
+    assert [offer['entry_id'] for offer in listing['offered']] == [first.entry_id, second.entry_id]
+    assert listing['offered'][0]['time'] == '19:00' and listing['offered'][0]['name'] == '山田'
+    assert client.get('/health/calendar').get_json()['waitlist']['offered'] == 2
+
+    assert client.post(f'/staff/waitlist/{first.entry_id}/confirm', headers=auth).get_json()['name'] == '山田'
+    assert client.post(f'/staff/waitlist/{first.entry_id}/confirm', headers=auth).status_code == 404
+    assert client.post(f'/staff/waitlist/{second.entry_id}/other', headers=auth).status_code == 404
+    assert client.post(f'/staff/waitlist/{second.entry_id}/release', headers=auth).status_code == 200
+    assert client.get('/staff/waitlist', headers=auth).get_json()['offered'] == []
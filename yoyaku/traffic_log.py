@@ -0,0 +1,172 @@
+# traffic_log.py (予約フォームへのアクセスの記録 - 負荷試験で再生するため)
+#
+# .env の TRAFFIC_LOG_FILE にファイル名を書くと、予約フォームのページ (/) と予約の送信 (/submit_reservation) への
+# アクセスを1行1件の JSON で追記します (店舗ごとの /<店舗ID>/ のページも含みます)。
+# 記録したファイルは replay_traffic.py で、偽物のカレンダーにつないだアプリへ同じ間隔 (または10倍・100倍速) で送り直せます。
+#
+# お名前・電話番号・LINE のIDはそのまま残さず、TRAFFIC_LOG_SALT を鍵にしたハッシュから作った別の値に置き換えます
+# (同じお客様は同じ値になるので、二重登録やキャンセル待ちの動きは再現されます)。
+# TRAFFIC_LOG_SALT がなければ起動のたびに鍵を作るため、再起動をまたぐと同じお客様でも別の値になります。
+# 置き換えた LINE のIDには bot の署名がないため、再生した予約に LINE のIDは付きません。
+#
+# 1行の例:
+#   {"t":1751619600.123,"m":"POST","h":"showaya.example.jp","p":"/submit_reservation",
+#    "f":{"reservation_date":"2025-07-05","reservation_time":"19:00","num_guests":"2","seat_type":"カウンター",
+#         "reservist_name":"客3f2a9c01","phone_number":"08012345678"},"s":302,"o":"booked","ms":48.2}
+#   {"t":1751619600.456,"m":"GET","h":"showaya.example.jp","p":"/","c":1,"s":304,"o":"304","ms":0.4}
+# t: 受け付けた時刻 (UNIX 秒)、f: 送信された項目、c: ブラウザのキャッシュ確認 (If-None-Match) 付き、
+# s: ステータスコード、o: 結果 (予約の送信は下の OUTCOMES のどれか、ページはステータスコード)、ms: 処理時間
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import zlib
+
+from flask import g, request, session
+from flask.json.tag import TaggedJSONSerializer
+
+# 記録するページ (ブループリント内の名前)
+RECORDED_VIEWS = ('index', 'submit_reservation')
+
+# 記録するフォームの項目 (validation.py の FORM_SCHEMA と同じ。これ以外の項目は残しません)
+RECORDED_FIELDS = ('reservation_date', 'reservation_time', 'num_guests', 'seat_type', 'reservist_name', 'phone_number',
+                   'line_user_id')
+# 別の値に置き換える項目
+ANONYMIZED_FIELDS = ('reservist_name', 'phone_number', 'line_user_id')
+
+# 予約の送信の結果と、その見分け方 (結果ページに出すメッセージの一部)。上から順に調べます
+OUTCOMES = {
+    'booked': "ご予約を承りました",
+    'waitlisted': "キャンセル待ちとして承りました",
+    'breaker_open': "ご予約はまだ確定しておりません",
+    'vacancy_unknown': "空席状況を確認できませんでした",
+    'stale_only': "最新の空席状況を確認できないため",
+    'write_failed': "システムで一時的な問題が発生",
+    'no_calendar': "予約システムをご利用いただけません",
+    'full': "満席",
+    'not_enough': "ご用意できません",
+}
+OUTCOME_LABELS = {
+    'booked': "予約完了",
+    'waitlisted': "満席 (キャンセル待ち登録)",
+    'breaker_open': "カレンダー遮断中",
+    'vacancy_unknown': "空席確認できず",
+    'stale_only': "見積もりの空きのみ (未確定)",
+    'write_failed': "カレンダー書き込み失敗",
+    'no_calendar': "カレンダー未接続",
+    'full': "満席",
+    'not_enough': "人数分の空きなし",
+    'rejected': "入力チェックで受付不可",
+}
+
+
+def classify_outcome(category, message):
+    """結果ページに出すメッセージ (flash の種類と本文) から、予約の送信の結果を OUTCOMES の名前で返す"""
+    if category == 'success':
+        return 'booked'
+    for outcome, marker in OUTCOMES.items():
+        if outcome != 'booked' and marker in message:
+            return outcome
+    return 'rejected'
+
+
+def flashes_from_cookie(cookie_value):
+    """
+    Flask のセッション Cookie の値から、flash されたメッセージの一覧 [(種類, 本文), ...] を取り出す。
+    署名は確かめません (自分が受け取った Cookie の中身を見るためだけに使います)。読めなければ空の一覧です。
+    """
+    try:
+        compressed = cookie_value.startswith('.')
+        payload = cookie_value.lstrip('.').split('.')[0]
+        data = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+        if compressed:
+            data = zlib.decompress(data)
+        return [tuple(item) for item in TaggedJSONSerializer().loads(data.decode('utf-8')).get('_flashes', [])]
+    except (ValueError, TypeError, AttributeError, zlib.error):
+        return []
+
+
+class TrafficRecorder:
+    """アクセスを1行1件の JSON でファイルに追記する。Flask の before_request / after_request から呼びます"""
+
+    def __init__(self, path, salt=None):
+        self.path = path
+        self._salt = (salt or os.urandom(16).hex()).encode('utf-8')
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8', buffering=1) # 1行ごとに書き出す
+        self.recorded = 0
+
+    def install(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        print(f"★★★ アクセスを {self.path} に記録します ★★★")
+
+    def anonymize(self, field_name, value):
+        """お名前・電話番号・LINE のIDを、同じ値なら同じになる別の値に置き換える (空欄は空欄のまま)"""
+        if not value:
+            return value
+        digest = hmac.new(self._salt, f"{field_name}:{value}".encode('utf-8'), hashlib.sha256).hexdigest()
+        if field_name == 'phone_number':
+            return '0' + str(int(digest[:16], 16))[-10:].zfill(10)
+        if field_name == 'line_user_id':
+            return 'U' + digest[:32]
+        return '客' + digest[:8]
+
+    def _before_request(self):
+        if request.endpoint and request.endpoint.rsplit('.', 1)[-1] in RECORDED_VIEWS:
+            g.traffic_started = (time.time(), time.perf_counter())
+
+    def _after_request(self, response):
+        started = g.pop('traffic_started', None)
+        if started is None:
+            return response
+        record = {
+            't': round(started[0], 3),
+            'm': request.method,
+            'h': request.host,
+            'p': request.path,
+        }
+        if request.method == 'POST':
+            record['f'] = {
+                name: self.anonymize(name, request.form.get(name, '')) if name in ANONYMIZED_FIELDS
+                else request.form.get(name, '')
+                for name in RECORDED_FIELDS if name in request.form
+            }
+        if request.if_none_match:
+            record['c'] = 1
+        record['s'] = response.status_code
+        flashes = session.get('_flashes') if request.method == 'POST' else None
+        record['o'] = classify_outcome(*flashes[-1]) if flashes else str(response.status_code)
+        record['ms'] = round((time.perf_counter() - started[1]) * 1000, 1)
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            with self._lock:
+                self._file.write(line)
+                self.recorded += 1
+        except OSError as error: # 記録に失敗しても、お客様への応答は止めない
+            print(f"◆◆◆ アクセスの記録に失敗しました: {error} ◆◆◆")
+        return response
+
+
+def read_traffic_log(path):
+    """記録したファイルを読み、時刻順の一覧にして返す。読めない行は飛ばします"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                record['t'] = float(record['t'])
+                if not isinstance(record.get('p'), str):
+                    raise ValueError(line)
+            except (ValueError, KeyError, TypeError):
+                print(f"◆◆◆ {path}:{line_number} を読み取れないため飛ばします ◆◆◆")
+                continue
+            records.append(record)
+    records.sort(key=lambda record: record['t'])
+    return records
@@ -0,0 +1,241 @@
+# validation.py (予約フォームの入力チェック - Google API を呼ぶ前に不可能な予約を弾く)
+
+import datetime
+import hashlib
+import hmac
+import re
+from collections import namedtuple
+
+import holidays
+
+# 席タイプと人数のルールは core/seat_policy.py にまとめてあります
+from core.seat_policy import party_size_error, units_for
+
+
+class ReservationRejected(ValueError):
+    """入力内容の時点で予約をお受けできない場合の例外。str(e) がお客様向けメッセージです。"""
+
+
+# 入力チェックを通過した予約リクエスト (以降の処理はこの値だけを使います)
+ReservationRequest = namedtuple(
+    'ReservationRequest',
+    ['date', 'hour', 'minute', 'guests', 'seat_type', 'units', 'name', 'phone', 'line_user_id'],
+)
+# units: カウンターなら使用席数、テーブルなら使用卓数
+# line_user_id: LINE から開いた場合のお客様のID (なければ空文字。リマインドの送信に使います)
+#   フォームには LINE の bot が署名した値 (sign_line_user_id) が届き、署名が正しい時だけ使います。
+
+
+# --- 入力エラー時のメッセージ ---
+FORMAT_ERROR_MESSAGE = "入力された人数、日付、または時刻の形式に誤りがあります。もう一度ご確認ください。"
+PAST_DATE_MESSAGE = "ご予約は明日以降の日付で承っております。\n恐れ入りますが、日付をご確認の上、再度ご入力ください。"
+NAME_MISSING_MESSAGE = "お名前が入力されていません。恐れ入りますが、お名前をご入力ください。"
+PHONE_MISSING_MESSAGE = "4名様以上でご予約の場合は、お電話番号のご入力をお願いいたします。"
+
+JAPANESE_WEEKDAYS = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
+
+# --- フォーム項目の定義 (スキーマ) ---
+# (項目名, 必須かどうか, 最大文字数)
+FORM_SCHEMA = (
+    ('reservation_date', True, 10),
+    ('reservation_time', True, 5),
+    ('num_guests', True, 1),
+    ('seat_type', True, 10),
+    ('reservist_name', False, 50),
+    ('phone_number', False, 20),
+    ('line_user_id', False, 100),
+)
+
+_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}\Z')
+_LINE_USER_ID_PATTERN = re.compile(r'U[0-9a-f]{32}\Z')
+
+
+def sign_line_user_id(line_user_id, channel_secret):
+    """
+    予約フォームの URL (?uid=) に付ける、署名付きの LINE のID "<ID>.<署名>" を作る。
+    署名はチャネルシークレットを鍵にした HMAC-SHA256 (16進数) です。bot の側でも同じ方法で作ってください。
+    """
+    signature = hmac.new(channel_secret.encode('utf-8'), line_user_id.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"{line_user_id}.{signature}"
+
+
+def verify_line_user_id(signed_value, channel_secret):
+    """署名付きの LINE のIDを確かめ、正しければ ID を、そうでなければ空文字を返す"""
+    line_user_id, _, signature = signed_value.partition('.')
+    if not channel_secret or not _LINE_USER_ID_PATTERN.match(line_user_id):
+        return ''
+    expected = sign_line_user_id(line_user_id, channel_secret).partition('.')[2]
+    return line_user_id if hmac.compare_digest(signature, expected) else ''
+
+
+def slot_times(first_slot, last_slot, interval_minutes):
+    """受付可能な時刻 ("HH:MM") → (時, 分) の辞書を作る"""
+    first_hour, first_minute = map(int, first_slot.split(':'))
+    last_hour, last_minute = map(int, last_slot.split(':'))
+    slots = {}
+    for minute_of_day in range(first_hour * 60 + first_minute, last_hour * 60 + last_minute + 1, interval_minutes):
+        hour, minute = divmod(minute_of_day, 60)
+        slots[f"{hour:02d}:{minute:02d}"] = (hour, minute)
+    return slots
+
+
+def _closed_day_rules(shop_holidays, nenmatsu_start, nenshi_end):
+    """SHOP_HOLIDAYS の文字列から、定休日判定に使う値を一度だけ取り出す"""
+    shop_holidays = shop_holidays or ""
+    # 「毎週日曜日」「毎週水曜日」などの指定 (Pythonのweekday(): 月曜=0 ... 日曜=6)
+    closed_weekdays = frozenset(
+        JAPANESE_WEEKDAYS.index(day + "曜日") for day in re.findall(r'毎週(.)曜日', shop_holidays)
+        if day + "曜日" in JAPANESE_WEEKDAYS
+    )
+
+    closed_month_days = frozenset()
+    if "年末年始" in shop_holidays:
+        nenmatsu_m, nenmatsu_d = map(int, nenmatsu_start.split('-'))
+        nenshi_m, nenshi_d = map(int, nenshi_end.split('-'))
+        closed_month_days = frozenset(
+            [(nenmatsu_m, d) for d in range(nenmatsu_d, 32)] +
+            [(nenshi_m, d) for d in range(1, nenshi_d + 1)]
+        )
+
+    close_on_holidays = "祝日" in shop_holidays and "祝日の月曜日" not in shop_holidays
+    close_on_holiday_mondays = "祝日の月曜日" in shop_holidays and 0 not in closed_weekdays
+    return closed_weekdays, closed_month_days, close_on_holidays, close_on_holiday_mondays
+
+
+def compile_validator(shop_holidays, first_slot='17:30', last_slot='22:00', slot_interval_minutes=30,
+                      nenmatsu_start='12-29', nenshi_end='01-03', max_guests=8, max_days_ahead=None,
+                      line_channel_secret=None):
+    """
+    設定値から予約フォームの検証関数を作る。
+    文字列の解析や定休日ルールの組み立ては、ここで一度だけ行います。
+    返す関数 validate(form, today) は、成功すると ReservationRequest を返し、
+    予約できない内容なら ReservationRejected を投げます (通信は一切行いません)。
+    日付だけを確かめる validate.check_date(date_obj, today) も使えます (予約を受け付ける日付なら何もしません)。
+    max_days_ahead を指定すると、今日からその日数先までの日付だけを受け付けます。
+    LINE のIDは line_channel_secret で署名を確かめられたものだけを使います (なければ使いません)。
+    """
+    slots = slot_times(first_slot, last_slot, slot_interval_minutes)
+    guest_counts = {str(n): n for n in range(1, max_guests + 1)}
+    closed_weekdays, closed_month_days, close_on_holidays, close_on_holiday_mondays = \
+        _closed_day_rules(shop_holidays, nenmatsu_start, nenshi_end)
+    jp_holidays = holidays.JP() if (close_on_holidays or close_on_holiday_mondays) else None
+    out_of_hours_message = (
+        f"ご希望のお時間は受付時間外でございます。\n{first_slot}～{last_slot} の間でお選びください。"
+    )
+    too_far_message = (
+        f"ご予約は{max_days_ahead}日先までの日付で承っております。\n恐れ入りますが、日付をご確認の上、再度ご入力ください。"
+    )
+
+    def closed_reason(date_obj, weekday):
+        if weekday in closed_weekdays:
+            return f"毎週{JAPANESE_WEEKDAYS[weekday]}のため"
+        if (date_obj.month, date_obj.day) in closed_month_days:
+            return "年末年始の休業期間のため"
+        if jp_holidays is not None and date_obj in jp_holidays:
+            if close_on_holidays or weekday == 0:
+                return "祝日のため"
+        return None
+
+    def check_date(date_obj, today):
+        if date_obj <= today:
+            raise ReservationRejected(PAST_DATE_MESSAGE)
+        if max_days_ahead is not None and (date_obj - today).days > max_days_ahead:
+            raise ReservationRejected(too_far_message)
+
+        weekday = date_obj.weekday()
+        reason = closed_reason(date_obj, weekday)
+        if reason:
+            raise ReservationRejected(
+                f"申し訳ございません。{date_obj.strftime('%Y年%m月%d日')}（{JAPANESE_WEEKDAYS[weekday]}）は、{reason}定休日でございます。\n"
+                f"恐れ入りますが、別の日付をご選択ください。"
+            )
+
+    def validate(form, today):
+        values = {}
+        for field_name, required, max_length in FORM_SCHEMA:
+            value = (form.get(field_name) or '').strip()
+            if len(value) > max_length or (required and not value):
+                raise ReservationRejected(FORMAT_ERROR_MESSAGE)
+            values[field_name] = value
+
+        guests = guest_counts.get(values['num_guests'])
+        hour_minute = slots.get(values['reservation_time'])
+        date_str = values['reservation_date']
+        if guests is None or not _DATE_PATTERN.match(date_str):
+            raise ReservationRejected(FORMAT_ERROR_MESSAGE)
+        try:
+            date_obj = datetime.date.fromisoformat(date_str)
+        except ValueError:
+            raise ReservationRejected(FORMAT_ERROR_MESSAGE)
+
+        check_date(date_obj, today)
+
+        if hour_minute is None:
+            raise ReservationRejected(out_of_hours_message)
+
+        name = values['reservist_name']
+        phone = values['phone_number']
+        if not name:
+            raise ReservationRejected(NAME_MISSING_MESSAGE)
+        if guests >= 4 and not phone:
+            raise ReservationRejected(PHONE_MISSING_MESSAGE)
+
+        seat_type = values['seat_type']
+        seat_error = party_size_error(seat_type, guests)
+        if seat_error:
+            raise ReservationRejected(seat_error.format(name=name))
+
+        # LINE のIDは署名が正しくなければ使わないだけで、予約はお受けする (お客様には見えない項目のため)。
+        # 署名がないと、他人のIDを URL に入れてその人にお知らせを送らせることができてしまいます
+        line_user_id = verify_line_user_id(values['line_user_id'], line_channel_secret)
+
+        return ReservationRequest(date_obj, hour_minute[0], hour_minute[1], guests, seat_type,
+                                  units_for(seat_type, guests), name, phone, line_user_id)
+
+    validate.check_date = check_date
+    return validate
+
+
+if __name__ == '__main__':
+    # 簡易ベンチマーク: 各分岐を通る入力を用意して、1回あたりの検証時間を測ります。
+    # 使い方: python validation.py
+    import timeit
+
+    today = datetime.date(2025, 7, 1)
+    validate = compile_validator("毎週日曜日、年末年始、祝日")
+    base = {
+        'reservation_date': '2025-07-02', 'reservation_time': '19:00', 'num_guests': '3',
+        'seat_type': 'カウンター', 'reservist_name': 'テスト', 'phone_number': '',
+    }
+    cases = [
+        ("受付OK (カウンター)", {}),
+        ("受付OK (テーブル5名)", {'seat_type': 'テーブル', 'num_guests': '5', 'phone_number': '09000000000'}),
+        ("必須項目なし", {'reservation_date': ''}),
+        ("人数の形式エラー", {'num_guests': 'x'}),
+        ("日付の形式エラー", {'reservation_date': '2025/07/02'}),
+        ("存在しない日付", {'reservation_date': '2025-02-30'}),
+        ("過去の日付", {'reservation_date': '2025-07-01'}),
+        ("定休日 (日曜日)", {'reservation_date': '2025-07-06'}),
+        ("定休日 (年末年始)", {'reservation_date': '2025-12-30'}),
+        ("定休日 (祝日)", {'reservation_date': '2025-07-21'}),
+        ("受付時間外", {'reservation_time': '23:00'}),
+        ("お名前なし", {'reservist_name': ''}),
+        ("電話番号なし (4名以上)", {'num_guests': '4'}),
+        ("席タイプ不正", {'seat_type': '座敷'}),
+        ("カウンター5名", {'num_guests': '5', 'phone_number': '09000000000'}),
+        ("テーブル2名", {'seat_type': 'テーブル', 'num_guests': '2'}),
+    ]
+    for label, overrides in cases:
+        form = dict(base, **overrides)
+
+        def run():
+            try:
+                return validate(form, today)
+            except ReservationRejected as e:
+                return e
+
+        outcome = run()
+        loops = 20000
+        per_call_us = timeit.timeit(run, number=loops) / loops * 1e6
+        result = "OK" if isinstance(outcome, ReservationRequest) else str(outcome).splitlines()[0]
+        print(f"{label:<24} {per_call_us:6.2f} µs  -> {result}")